@@ -56,8 +56,9 @@ async def bridge_search(q: str, k: int = 5) -> list[dict]:
     """
     url = f"{BRIDGE_BASE_URL}/search"
     async with httpx.AsyncClient(timeout=20.0) as client:
-        # Bridge search is a GET endpoint with q and k
-        r = await client.get(url, params={"q": q, "k": k})
+        # Bridge search is a GET endpoint with q and k; hybrid mode covers
+        # keyword and semantic matches in one round-trip
+        r = await client.get(url, params={"q": q, "k": k, "mode": "hybrid"})
         r.raise_for_status()
         data = r.json()
         hits = data.get("hits") or data.get("results") or []
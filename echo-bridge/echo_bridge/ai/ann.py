@@ -0,0 +1,600 @@
+"""Approximate nearest-neighbour index over the stored chunk embeddings.
+
+The index is an inverted file (IVF): vectors are bucketed under the nearest
+of ``nlist`` k-means centroids and a query only scores the ``nprobe`` closest
+buckets. Below ``exact_below`` vectors it stays untrained and every query is
+an exact scan. Bucket membership and centroids are persisted next to the
+database (``<db>.ann.json``); vectors themselves always come from the
+``embeddings`` table.
+
+Loading, training, reconciling deletes and saving run on the
+``ann-maintainer`` thread. A lookup only applies vectors stored since the
+previous one (new ids above the watermark, plus ids whose vector was
+replaced, as recorded after each commit) and then probes the lists.
+
+No lock is held across database reads, training or scoring: ``_LOCK`` only
+guards the module state (which index is current), each index briefly locks
+its lists to apply changes or snapshot them, and searches score the
+snapshots unlocked, so lookups run in parallel with each other and with
+maintenance.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import math
+import threading
+import time
+from array import array
+from pathlib import Path
+from typing import Any, Iterable, Sequence
+
+from ..db import connection, get_pool
+from .cluster import kmeans_vectors
+from .embedder import EMBEDDER_VERSION, Dim, add_store_listener, generation, np, top_k
+
+
+logger = logging.getLogger("echo_bridge.ann")
+
+
+def _vec(blob: bytes) -> Any:
+    if np is not None:
+        return np.frombuffer(blob, dtype=np.float32)
+    out = array("f")
+    out.frombytes(blob)
+    return out
+
+
+class _PostingList:
+    """Members of one IVF list: chunk ids and their vectors as one float32 matrix.
+
+    Rows stay contiguous (a removal moves the last row into the gap) and the
+    matrix grows by doubling. ``view()`` hands out an immutable snapshot that
+    is reused until the next change; the first change after a snapshot copies
+    the matrix, so readers score it with no lock held. Without NumPy the rows
+    are ``array('f')``.
+    """
+
+    __slots__ = ("ids", "_pos", "_mat", "_snap")
+
+    def __init__(self) -> None:
+        self.ids: list[int] = []
+        self._pos: dict[int, int] = {}
+        self._mat: Any = np.zeros((0, Dim), dtype=np.float32) if np is not None else []
+        self._snap: tuple[list[int], Any] | None = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _own(self) -> None:
+        # copy-on-write: a handed-out snapshot may still share the buffer
+        if self._snap is not None:
+            self._snap = None
+            if np is not None:
+                self._mat = self._mat.copy()
+
+    def add(self, cid: int, vec: Sequence[float]) -> None:
+        self._own()
+        pos = self._pos.get(cid)
+        if pos is None:
+            pos = len(self.ids)
+            self.ids.append(cid)
+            self._pos[cid] = pos
+            if np is None:
+                self._mat.append(None)
+            elif pos >= len(self._mat):
+                grown = np.zeros((max(16, 2 * len(self._mat)), Dim), dtype=np.float32)
+                grown[:pos] = self._mat[:pos]
+                self._mat = grown
+        self._mat[pos] = vec if np is not None else array("f", vec)
+
+    def remove(self, cid: int) -> None:
+        pos = self._pos.pop(cid, None)
+        if pos is None:
+            return
+        self._own()
+        last = len(self.ids) - 1
+        if pos != last:
+            moved = self.ids[last]
+            self.ids[pos] = moved
+            self._pos[moved] = pos
+            self._mat[pos] = self._mat[last]
+        self.ids.pop()
+        if np is None:
+            self._mat.pop()
+
+    def position(self, cid: int) -> int | None:
+        return self._pos.get(cid)
+
+    def vector(self, cid: int) -> Any:
+        pos = self._pos.get(cid)
+        if pos is None:
+            return None
+        return self._mat[pos].copy() if np is not None else self._mat[pos].tolist()
+
+    def view(self) -> tuple[list[int], Any]:
+        snap = self._snap
+        if snap is None:
+            n = len(self.ids)
+            snap = self._snap = (list(self.ids), self._mat[:n] if np is not None else list(self._mat))
+        return snap
+
+
+class IVFIndex:
+    """IVF lists plus centroids.
+
+    Every method is safe to call from any thread: changes hold the index's own
+    lock only while they touch the lists, and ``search`` takes it just long
+    enough to snapshot the probed lists before scoring them unlocked.
+    """
+
+    def __init__(self, nprobe: int = 8, exact_below: int = 2000, sample_size: int = 20000) -> None:
+        self.nprobe = max(1, int(nprobe))
+        self.exact_below = max(0, int(exact_below))
+        self.sample_size = sample_size
+        self.centroids: list[list[float]] = []
+        self.trained_n = 0
+        self.watermark = 0
+        # list number -> members; one list (0) while untrained
+        self._lists: dict[int, _PostingList] = {0: _PostingList()}
+        self._where: dict[int, int] = {}
+        self._centroid_mat: Any = None
+        self._lock = threading.Lock()
+
+    # Size/state
+    def __len__(self) -> int:
+        return len(self._where)
+
+    @property
+    def trained(self) -> bool:
+        return bool(self.centroids)
+
+    def ids(self) -> set[int]:
+        with self._lock:
+            return set(self._where)
+
+    # Maintenance
+    def _nearest_list(self, vec: Sequence[float]) -> int:
+        if not self.trained:
+            return 0
+        best = top_k(vec, list(range(len(self.centroids))), self._centroids(), 1)
+        return best[0][0] if best else 0
+
+    def _centroids(self) -> Any:
+        mat = self._centroid_mat
+        if mat is None:
+            if np is not None:
+                mat = np.asarray(self.centroids, dtype=np.float32).reshape(len(self.centroids), Dim)
+            else:
+                mat = self.centroids
+            self._centroid_mat = mat
+        return mat
+
+    def _put(self, cid: int, vec: Sequence[float], lst: int) -> None:
+        members = self._lists.get(lst)
+        if members is None:
+            members = self._lists[lst] = _PostingList()
+        members.add(cid, vec)
+        self._where[cid] = lst
+        self.watermark = max(self.watermark, cid)
+
+    def _remove(self, cid: int) -> None:
+        lst = self._where.pop(cid, None)
+        if lst is not None:
+            self._lists[lst].remove(cid)
+
+    def add(self, items: Iterable[tuple[int, Sequence[float]]]) -> int:
+        # centroids never change while the index is shared, so lists are picked unlocked
+        placed = [(cid, vec, self._nearest_list(vec)) for cid, vec in items]
+        with self._lock:
+            for cid, vec, lst in placed:
+                self._remove(cid)
+                self._put(cid, vec, lst)
+        return len(placed)
+
+    def remove(self, ids: Iterable[int]) -> None:
+        with self._lock:
+            for cid in ids:
+                self._remove(cid)
+
+    def items(self) -> list[tuple[int, Any]]:
+        """Copy of every (chunk_id, vector), e.g. to train a replacement index."""
+        with self._lock:
+            views = [members.view() for members in self._lists.values()]
+        out: list[tuple[int, Any]] = []
+        for ids, mat in views:
+            out.extend(zip(ids, list(mat.copy() if np is not None else mat)))
+        return out
+
+    def train(self, items: list[tuple[int, Any]], nlist: int | None = None, seed: int = 42) -> None:
+        """Build centroids from a sample of ``items`` and assign all of them (replaces the contents).
+
+        Meant for an index no other thread can see yet.
+        """
+        self._lists = {0: _PostingList()}
+        self._where = {}
+        self.centroids = []
+        self._centroid_mat = None
+        if not items:
+            return
+        nlist = nlist or max(8, min(1024, int(math.sqrt(len(items)))))
+        allv = dict(items)
+        ids = sorted(allv)
+        if len(ids) > self.sample_size:
+            step = len(ids) / self.sample_size
+            ids = [ids[int(i * step)] for i in range(self.sample_size)]
+        _, self.centroids = kmeans_vectors({cid: allv[cid] for cid in ids}, k=min(nlist, len(ids)), iters=8, seed=seed)
+        self._centroid_mat = None
+        self.trained_n = len(items)
+        if np is None:
+            self.add(items)
+            return
+        cents = self._centroids()
+        for i in range(0, len(items), 4096):
+            block = items[i : i + 4096]
+            # argmax keeps the first of tied centroids, as top_k does
+            labels = np.argmax(np.stack([v for _, v in block]) @ cents.T, axis=1)
+            for (cid, vec), lst in zip(block, labels.tolist()):
+                self._put(cid, vec, lst)
+
+    def needs_training(self) -> bool:
+        n = len(self)
+        return n >= self.exact_below and (not self.trained or n >= 4 * max(1, self.trained_n))
+
+    # Query
+    def vector(self, chunk_id: int) -> Sequence[float] | None:
+        with self._lock:
+            lst = self._where.get(chunk_id)
+            return None if lst is None else self._lists[lst].vector(chunk_id)
+
+    def search(
+        self,
+        query: Sequence[float],
+        k: int,
+        threshold: float | None = None,
+        exclude_id: int | None = None,
+        nprobe: int | None = None,
+    ) -> list[tuple[int, float]]:
+        probe = max(1, nprobe or self.nprobe)
+        lists: list[int] | None = None
+        if self.trained and probe < len(self.centroids):
+            ranked = top_k(query, list(range(len(self.centroids))), self._centroids(), probe)
+            lists = [lst for lst, _ in ranked]
+        probed: list[tuple[list[int], Any, int | None]] = []
+        with self._lock:
+            for lst in lists if lists is not None else list(self._lists):
+                members = self._lists.get(lst)
+                if members:
+                    exclude = members.position(exclude_id) if exclude_id is not None else None
+                    probed.append((*members.view(), exclude))
+        hits: list[tuple[int, float]] = []
+        for ids, mat, exclude in probed:
+            # each list's best k, including ties with its k-th; merged below
+            hits.extend(top_k(query, ids, mat, k, threshold=threshold, exclude=exclude))
+        hits.sort(key=lambda x: (-x[1], x[0]))
+        return hits[:k]
+
+    # Persistence
+    def to_json(self) -> dict[str, Any]:
+        with self._lock:
+            lists = {lst: list(members.ids) for lst, members in self._lists.items() if members}
+        return {
+            "version": EMBEDDER_VERSION,
+            "centroids": self.centroids,
+            "trained_n": self.trained_n,
+            "watermark": self.watermark,
+            "lists": {str(lst): sorted(ids) for lst, ids in lists.items()},
+        }
+
+    def save(self, path: Path) -> None:
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(json.dumps(self.to_json()), encoding="utf-8")
+        tmp.replace(path)
+
+    def load_layout(self, data: dict[str, Any]) -> dict[int, int]:
+        """Restore centroids from saved JSON; returns chunk_id -> list for the saved layout."""
+        if data.get("version") != EMBEDDER_VERSION:
+            return {}
+        self.centroids = [list(map(float, c)) for c in data.get("centroids") or []]
+        self._centroid_mat = None
+        self.trained_n = int(data.get("trained_n") or 0)
+        layout: dict[int, int] = {}
+        for lst, ids in (data.get("lists") or {}).items():
+            for cid in ids:
+                layout[int(cid)] = int(lst)
+        return layout
+
+    def place(self, items: Iterable[tuple[int, Sequence[float]]], layout: dict[int, int]) -> None:
+        """Bulk insert using a saved layout where available (no centroid scoring)."""
+        for cid, vec in items:
+            lst = layout.get(cid)
+            if lst is None or lst >= max(1, len(self.centroids)):
+                self.add([(cid, vec)])
+            else:
+                with self._lock:
+                    self._put(cid, vec, lst)
+
+
+# -----------------------------
+# Process-wide index bound to the current database
+# -----------------------------
+_CONFIG: dict[str, Any] = {"enabled": True, "nprobe": 8, "exact_below": 2000}
+_LOCK = threading.RLock()
+_INDEX: IVFIndex | None = None
+_INDEX_DB: Path | None = None
+_SYNCED = -1  # embedder generation the index was last synced at
+_LAST_SAVE = 0.0
+_DIRTY = False
+_SAVE_EVERY_SECS = 30.0
+# Ids at or below the watermark whose vector was replaced; filled after each commit
+_CHANGED: set[int] = set()
+_LOADING = False
+# While a replacement index trains: changed ids already applied to the old one
+_REPLAY: set[int] | None = None
+_MAINTAIN_LOCK = threading.Lock()
+_WAKE = threading.Event()
+_MAINTAINER: threading.Thread | None = None
+_MAINTAIN_START = threading.Lock()
+
+
+def configure(enabled: bool | None = None, nprobe: int | None = None, exact_below: int | None = None) -> None:
+    """Set the recall/latency knobs; a higher nprobe scores more buckets per query."""
+    global _INDEX
+    with _LOCK:
+        if enabled is not None:
+            _CONFIG["enabled"] = bool(enabled)
+        if nprobe is not None:
+            _CONFIG["nprobe"] = max(1, int(nprobe))
+        if exact_below is not None:
+            _CONFIG["exact_below"] = max(0, int(exact_below))
+        if _INDEX is not None:
+            _INDEX.nprobe = _CONFIG["nprobe"]
+            _INDEX.exact_below = _CONFIG["exact_below"]
+
+
+def enabled() -> bool:
+    return bool(_CONFIG["enabled"])
+
+
+def index_path(db_path: Path) -> Path:
+    return db_path.with_name(db_path.name + ".ann.json")
+
+
+def _fetch(where: str = "", params: tuple[Any, ...] = ()) -> list[tuple[int, Any]]:
+    with connection() as conn:
+        rows = conn.execute(
+            f"SELECT chunk_id, vec FROM embeddings WHERE version = ? {where} ORDER BY chunk_id",
+            (EMBEDDER_VERSION, *params),
+        ).fetchall()
+    return [(row["chunk_id"], _vec(row["vec"])) for row in rows]
+
+
+def _fetch_ids(ids: list[int]) -> list[tuple[int, Any]]:
+    out: list[tuple[int, Any]] = []
+    for i in range(0, len(ids), 500):
+        part = ids[i : i + 500]
+        out.extend(_fetch(f"AND chunk_id IN ({','.join('?' * len(part))})", tuple(part)))
+    return out
+
+
+def _sync(index: IVFIndex) -> bool:
+    """Apply vectors stored since the last sync: new ids above the watermark and replaced ones.
+
+    The reads run with no lock held; ``_LOCK`` is only taken to claim and
+    hand back the replaced ids.
+    """
+    with _LOCK:
+        if _INDEX is not index:
+            return False
+        ids = sorted(_CHANGED)
+        _CHANGED.difference_update(ids)
+    try:
+        rows = _fetch("AND chunk_id > ?", (index.watermark,))
+        if ids:
+            # a replaced id's row may be gone again (deleted); _reconcile() drops it
+            rows += _fetch_ids(ids)
+        changed = index.add(rows) > 0
+    except BaseException:
+        _CHANGED.update(ids)
+        raise
+    if ids:
+        with _LOCK:
+            if _INDEX is not index:
+                _CHANGED.update(ids)  # swapped meanwhile: the new index re-reads them
+            elif _REPLAY is not None:
+                _REPLAY.update(ids)  # applied after the training snapshot may have been taken
+    return changed
+
+
+def _reconcile(index: IVFIndex) -> bool:
+    """Drop deleted ids and add rows the watermark missed; a full id scan, so maintainer only."""
+    # ids first: anything synced during the scan is then not mistaken for deleted
+    have = index.ids()
+    with connection() as conn:
+        stored = {r[0] for r in conn.execute("SELECT chunk_id FROM embeddings WHERE version = ?", (EMBEDDER_VERSION,))}
+    gone = have - stored
+    missing = sorted(stored - have)
+    if not gone and not missing:
+        return False
+    index.remove(gone)
+    if missing:
+        index.add(_fetch_ids(missing))
+    return True
+
+
+def _load(db_path: Path) -> IVFIndex:
+    index = IVFIndex(nprobe=_CONFIG["nprobe"], exact_below=_CONFIG["exact_below"])
+    layout: dict[int, int] = {}
+    path = index_path(db_path)
+    if path.exists():
+        try:
+            layout = index.load_layout(json.loads(path.read_text(encoding="utf-8")))
+        except Exception as e:
+            logger.warning("ignoring unreadable ANN index %s: %s", path, e)
+    index.place(_fetch(), layout)
+    return index
+
+
+def get_index() -> IVFIndex | None:
+    """Return the index for the current database, or None until the maintainer has loaded it.
+
+    Only applies what was stored since the previous lookup; loading, training
+    and delete reconciliation are left to the maintainer thread.
+    """
+    global _SYNCED, _DIRTY
+    if not enabled():
+        return None
+    db_path = get_pool().path
+    with _LOCK:
+        index = _INDEX
+        if index is None or _INDEX_DB != db_path:
+            request_maintenance()
+            return None
+        gen = generation()
+        if gen == _SYNCED:
+            return index
+    changed = _sync(index)
+    with _LOCK:
+        if _INDEX is index:
+            _SYNCED = max(_SYNCED, gen)
+            _DIRTY = _DIRTY or changed
+    if changed and index.needs_training():
+        request_maintenance()
+    return index
+
+
+def maintain() -> None:
+    """Load the index if needed, reconcile deletes, retrain when due and persist it.
+
+    Runs on the ``ann-maintainer`` thread. Database reads and training run
+    with no lock held; a retrained index is built as a copy and swapped in,
+    so lookups keep being served by the current one meanwhile.
+    """
+    global _INDEX, _INDEX_DB, _SYNCED, _DIRTY, _LOADING, _REPLAY
+    if not enabled():
+        return
+    with _MAINTAIN_LOCK:
+        db_path = get_pool().path
+        with _LOCK:
+            loaded = _INDEX is not None and _INDEX_DB == db_path
+        if not loaded:
+            _LOADING = True
+            try:
+                index = _load(db_path)
+            finally:
+                _LOADING = False
+            with _LOCK:
+                _INDEX, _INDEX_DB, _SYNCED, _DIRTY = index, db_path, -1, True
+        with _LOCK:
+            index, gen = _INDEX, generation()
+        changed = _sync(index) | _reconcile(index)
+        with _LOCK:
+            if _INDEX is index:
+                _SYNCED = max(_SYNCED, gen)
+                _DIRTY = _DIRTY or changed
+            retrain = _INDEX is index and index.needs_training()
+            if retrain:
+                _REPLAY = set()
+        if retrain:
+            fresh = IVFIndex(nprobe=index.nprobe, exact_below=index.exact_below, sample_size=index.sample_size)
+            trained = False
+            try:
+                fresh.train(index.items())
+                trained = True
+            finally:
+                with _LOCK:
+                    replay, _REPLAY = _REPLAY or set(), None
+                    swap = trained and _INDEX is index
+                    if swap:
+                        _CHANGED.update(replay)
+                        _INDEX, _SYNCED, _DIRTY = fresh, -1, True
+            if swap:
+                _sync(fresh)
+                _reconcile(fresh)
+        _maybe_save()
+
+
+def _run_maintainer() -> None:
+    while True:
+        _WAKE.wait(_SAVE_EVERY_SECS)
+        _WAKE.clear()
+        try:
+            maintain()
+        except Exception:  # noqa: BLE001 - e.g. no database yet; retried on the next wake
+            logger.exception("ANN maintenance failed")
+
+
+def request_maintenance() -> None:
+    """Wake the maintainer thread, starting it on first use."""
+    global _MAINTAINER
+    with _MAINTAIN_START:
+        if _MAINTAINER is None or not _MAINTAINER.is_alive():
+            _MAINTAINER = threading.Thread(target=_run_maintainer, name="ann-maintainer", daemon=True)
+            _MAINTAINER.start()
+    _WAKE.set()
+
+
+def _maybe_save(force: bool = False) -> None:
+    global _LAST_SAVE, _DIRTY
+    with _LOCK:
+        index, db_path = _INDEX, _INDEX_DB
+        if index is None or db_path is None or not _DIRTY:
+            return
+        now = time.monotonic()
+        if not force and now - _LAST_SAVE < _SAVE_EVERY_SECS:
+            return
+        _LAST_SAVE, _DIRTY = now, False
+    try:
+        index.save(index_path(db_path))
+    except Exception as e:
+        with _LOCK:
+            _DIRTY = True
+        logger.warning("failed to persist ANN index: %s", e)
+
+
+def save_index() -> None:
+    """Persist the current index layout (called on shutdown)."""
+    _maybe_save(force=True)
+
+
+def reset() -> None:
+    global _INDEX, _INDEX_DB, _SYNCED
+    with _LOCK:
+        _INDEX = None
+        _INDEX_DB = None
+        _SYNCED = -1
+        _CHANGED.clear()
+
+
+def _on_vectors_stored(ids: list[int]) -> None:
+    # Runs on the writer after commit. New ids are found through the watermark;
+    # only record replacements of ids the index may already hold.
+    index = _INDEX
+    if _LOADING:
+        _CHANGED.update(ids)
+    elif index is not None:
+        mark = index.watermark
+        _CHANGED.update(cid for cid in ids if cid <= mark)
+
+
+add_store_listener(_on_vectors_stored)
+
+
+def similar(chunk_id: int, k: int = 5, threshold: float | None = None, nprobe: int | None = None) -> list[tuple[int, float]] | None:
+    """ANN lookup for ``embedder.similar``; None when the index is disabled or not loaded yet."""
+    index = get_index()
+    if index is None:
+        return None
+    vec = index.vector(chunk_id)
+    if vec is None:
+        return []
+    return index.search(vec, k, threshold=threshold, exclude_id=chunk_id, nprobe=nprobe)
+
+
+def nearest(query: Sequence[float], k: int = 5, threshold: float | None = None, nprobe: int | None = None) -> list[tuple[int, float]] | None:
+    """ANN lookup for an arbitrary query vector; None when the index is disabled or not loaded yet."""
+    index = get_index()
+    if index is None:
+        return None
+    return index.search(query, k, threshold=threshold, nprobe=nprobe)
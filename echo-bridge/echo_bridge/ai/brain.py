@@ -1,16 +1,19 @@
 from __future__ import annotations
 
-import json
 import time
 from dataclasses import dataclass
 from typing import Any, cast
 
-from ..db import get_conn
+from ..services import audit_service
+from ..telemetry import AI_SECONDS, bounded
 from ..soul.state import get_soul
 from . import reflexes
 from .embedder import similar as s2_similar
 
 
+TASKS = ("journal.summarize", "memory.auto_tag", "game.describe", "lesson.plan")
+
+
 @dataclass
 class Policy:
     s1: bool = True
@@ -26,23 +29,17 @@ class TierPolicy:
 
 
 def _audit_ai(task: str, payload: dict[str, Any], result: dict[str, Any], duration_ms: int, chosen: str) -> None:
-    conn = get_conn()
-    cur = conn.cursor()
     mood = ""
     try:
         mood = get_soul().get_mood()
     except Exception:
         mood = ""
-    cur.execute(
-        "INSERT INTO audits(action, payload_json, result_json, soul_mood) VALUES (?,?,?,?)",
-        (
-            f"ai.{task}:{chosen}",
-            json.dumps({"payload": payload, "duration_ms": duration_ms}, ensure_ascii=False),
-            json.dumps(result, ensure_ascii=False),
-            mood,
-        ),
+    audit_service.record(
+        f"ai.{task}:{chosen}",
+        {"payload": payload, "duration_ms": duration_ms},
+        result,
+        mood,
     )
-    conn.commit()
 
 
 def apply(task: str, payload: dict[str, Any], policy: Policy | None = None) -> dict[str, Any]:
@@ -62,7 +59,7 @@ def apply(task: str, payload: dict[str, Any], policy: Policy | None = None) -> d
     if task == "journal.summarize":
         text: str = payload.get("text", "")
         max_sents: int = int(payload.get("max_sents", 3))
-        sents = reflexes.summary(text, max_sents=max_sents)
+        sents = reflexes.summary(reflexes.analyze(text), max_sents=max_sents)
         result = {"summary": " ".join(sents)}
         chosen = "s1"
     elif task == "memory.auto_tag":
@@ -92,8 +89,9 @@ def apply(task: str, payload: dict[str, Any], policy: Policy | None = None) -> d
     else:
         raise ValueError("Unknown AI task")
 
-    duration_ms = int((time.perf_counter() - start) * 1000)
-    _audit_ai(task, payload, result, duration_ms, chosen)
+    elapsed = time.perf_counter() - start
+    AI_SECONDS.observe(elapsed, task, chosen)
+    _audit_ai(task, payload, result, int(elapsed * 1000), chosen)
     return result
 
 
@@ -113,10 +111,11 @@ def pipeline(task: str, payload: dict[str, Any], tiers_cfg: dict[str, dict[str,
         if not cfg.get("under", {}).get("enabled", True):
             return {}
         if task == "journal.summarize":
-            text: str = payload.get("text", "")
+            # One analysis feeds both summary and keywords
+            doc = reflexes.analyze(payload.get("text", ""))
             return {
-                "summary": " ".join(reflexes.summary(text, max_sents=int(payload.get("max_sents", 3)))) or "",
-                "keywords": reflexes.keywords(text, k=int(payload.get("k", 8))),
+                "summary": " ".join(reflexes.summary(doc, max_sents=int(payload.get("max_sents", 3)))) or "",
+                "keywords": reflexes.keywords(doc, k=int(payload.get("k", 8))),
             }
         if task == "memory.auto_tag":
             text: str = payload.get("text", "")
@@ -156,7 +155,11 @@ def pipeline(task: str, payload: dict[str, Any], tiers_cfg: dict[str, dict[str,
         out_over: dict[str, Any] = {**c, "notes": ["checked_by_over"]}
         return out_over
 
-    u = _under()
-    c = _core(u)
-    o = _over(c)
+    label = bounded(task, TASKS)
+    with AI_SECONDS.time(label, "under"):
+        u = _under()
+    with AI_SECONDS.time(label, "core"):
+        c = _core(u)
+    with AI_SECONDS.time(label, "over"):
+        o = _over(c)
     return {"under": u, "core": c, "over": o}
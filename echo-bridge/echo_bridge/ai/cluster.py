@@ -2,9 +2,9 @@ from __future__ import annotations
 
 import math
 import random
-from typing import Dict, List, Tuple
+from typing import Dict, List, Sequence, Tuple
 
-from .embedder import embed
+from .embedder import embed, np
 
 
 def _cosine(a: list[float], b: list[float]) -> float:
@@ -23,14 +23,24 @@ def _closest(centroids: list[list[float]], v: list[float]) -> int:
 
 
 def kmeans_texts(chunks: dict[int, str], k: int = 3, iters: int = 10, seed: int = 42) -> dict[int, int]:
-    ids = list(chunks.keys())
-    vecs = {cid: embed(chunks[cid]) for cid in ids}
+    vecs = {cid: embed(chunks[cid]) for cid in chunks}
+    labels, _ = kmeans_vectors(vecs, k=k, iters=iters, seed=seed)
+    return labels
+
+
+def kmeans_vectors(
+    vecs: dict[int, Sequence[float]], k: int = 3, iters: int = 10, seed: int = 42
+) -> tuple[dict[int, int], list[list[float]]]:
+    """Spherical k-means over unit vectors; returns (labels, centroids)."""
+    ids = list(vecs.keys())
     random.seed(seed)
     init_ids = random.sample(ids, min(k, len(ids)))
-    centroids = [vecs[i][:] for i in init_ids]
+    centroids = [list(vecs[i]) for i in init_ids]
     if len(centroids) < k:
         # pad duplicates if not enough
         centroids += [centroids[0][:] for _ in range(k - len(centroids))]
+    if np is not None:
+        return _kmeans_numpy(ids, vecs, centroids, k, iters)
     labels: dict[int, int] = {cid: i % k for i, cid in enumerate(ids)}
     for _ in range(max(1, iters)):
         # Assign
@@ -52,4 +62,27 @@ def kmeans_texts(chunks: dict[int, str], k: int = 3, iters: int = 10, seed: int
         for i in range(k):
             norm = math.sqrt(sum(x * x for x in centroids[i])) or 1.0
             centroids[i] = [x / norm for x in centroids[i]]
-    return labels
+    return labels, centroids
+
+
+def _kmeans_numpy(
+    ids: list[int], vecs: dict[int, Sequence[float]], centroids: list[list[float]], k: int, iters: int
+) -> tuple[dict[int, int], list[list[float]]]:
+    """Same algorithm as kmeans_vectors with assignment and update as matrix ops."""
+    X = np.asarray([vecs[cid] for cid in ids], dtype=np.float32)
+    C = np.asarray(centroids, dtype=np.float32)
+    labels = np.arange(len(ids)) % k
+    for _ in range(max(1, iters)):
+        # Assign: argmax picks the first best centroid, matching _closest
+        labels = np.argmax(X @ C.T, axis=1)
+        # Update
+        sums = np.zeros_like(C)
+        np.add.at(sums, labels, X)
+        counts = np.bincount(labels, minlength=k)
+        filled = counts > 0
+        C[filled] = sums[filled] / counts[filled][:, None]
+        # Re-normalize to unit length for cosine
+        norms = np.linalg.norm(C, axis=1)
+        norms[norms == 0] = 1.0
+        C = C / norms[:, None]
+    return {cid: int(lab) for cid, lab in zip(ids, labels.tolist())}, C.tolist()
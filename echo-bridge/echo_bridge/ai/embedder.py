@@ -1,15 +1,28 @@
 from __future__ import annotations
 
 import hashlib
+import logging
 import math
-from collections import Counter
-from typing import Iterable, List, Tuple
+import sqlite3
+import threading
+from array import array
+from typing import Any, Callable, Iterable, List, Sequence, Tuple
 
-from ..db import get_conn
-from .reflexes import _tokens, _STOPWORDS
+try:
+    # Optional vectorized backend; the pure-Python path below is the fallback
+    import numpy as np  # type: ignore
+except Exception:
+    np = None  # type: ignore
+
+from ..db import after_commit, connection, get_pool, write
+from .reflexes import analyze
+
+logger = logging.getLogger("echo_bridge.ai.embedder")
 
 
 Dim = 256
+# Bump whenever embed() changes so stored vectors are recomputed
+EMBEDDER_VERSION = f"hash{Dim}-v1"
 
 
 def _hash_token(t: str) -> int:
@@ -18,11 +31,10 @@ def _hash_token(t: str) -> int:
 
 
 def embed(text: str) -> list[float] | None:
-    toks = [t for t in _tokens(text) if t not in _STOPWORDS]
-    if not toks:
+    tf = analyze(text).tf
+    if not tf:
         return [0.0] * Dim
     vec = [0.0] * Dim
-    tf = Counter(toks)
     for term, count in tf.items():
         idx = _hash_token(term)
         vec[idx] += float(count)
@@ -35,26 +47,212 @@ def _cosine_vec(a: list[float], b: list[float]) -> float:
     return sum(x * y for x, y in zip(a, b))
 
 
+def _pack(vec: list[float]) -> bytes:
+    return array("f", vec).tobytes()
+
+
+def _unpack(blob: bytes) -> list[float]:
+    out = array("f")
+    out.frombytes(blob)
+    return out.tolist()
+
+
+# Bumped after every commit that stores vectors; load_matrix() caches on it
+_GENERATION = 0
+_MATRIX: tuple[int, Any, list[int], Any] | None = None  # (generation, pool, ids, matrix)
+_BACKFILL: threading.Thread | None = None
+
+
+def generation() -> int:
+    return _GENERATION
+
+
+def invalidate() -> None:
+    """Drop the cached matrix; call after deleting chunks or rewriting their text."""
+    global _GENERATION
+    _GENERATION += 1
+
+
+_store_listeners: list[Callable[[list[int]], None]] = []
+
+
+def add_store_listener(fn: Callable[[list[int]], None]) -> None:
+    """Register a callback receiving the chunk ids of stored vectors, once their write has committed."""
+    _store_listeners.append(fn)
+
+
+def _stored(ids: list[int]) -> None:
+    invalidate()
+    for fn in _store_listeners:
+        fn(ids)
+
+
+def embed_all(texts: Iterable[str]) -> list[list[float]]:
+    return [embed(text) or [0.0] * Dim for text in texts]
+
+
+def store_embeddings(cur: sqlite3.Cursor, items: Iterable[tuple[int, str]]) -> int:
+    """Embed and persist (chunk_id, text) pairs inside the caller's transaction."""
+    pairs = list(items)
+    return store_vectors(cur, list(zip((cid for cid, _ in pairs), embed_all(text for _, text in pairs))))
+
+
+def store_vectors(cur: sqlite3.Cursor, vecs: list[tuple[int, list[float]]]) -> int:
+    """Persist precomputed (chunk_id, vector) pairs inside the caller's transaction."""
+    if vecs:
+        cur.executemany(
+            "INSERT OR REPLACE INTO embeddings(chunk_id, version, vec) VALUES (?,?,?)",
+            [(cid, EMBEDDER_VERSION, _pack(v)) for cid, v in vecs],
+        )
+        ids = [cid for cid, _ in vecs]
+        after_commit(lambda: _stored(ids))
+    return len(vecs)
+
+
+def backfill_embeddings(batch_size: int = 500) -> int:
+    """Embed chunks that have no vector for the current embedder version."""
+    total = 0
+    while True:
+        with connection() as conn:
+            rows = conn.execute(
+                """
+                SELECT c.id, c.text FROM chunks c
+                LEFT JOIN embeddings e ON e.chunk_id = c.id AND e.version = ?
+                WHERE e.chunk_id IS NULL
+                LIMIT ?
+                """,
+                (EMBEDDER_VERSION, batch_size),
+            ).fetchall()
+        if not rows:
+            break
+        # Embed on this thread; the writer only inserts
+        vecs = list(zip((r["id"] for r in rows), embed_all(r["text"] for r in rows)))
+        total += write(lambda conn: store_vectors(conn.cursor(), vecs))
+    return total
+
+
+def start_backfill() -> None:
+    """Run ``backfill_embeddings`` on a daemon thread (at startup, after an embedder version bump)."""
+    global _BACKFILL
+
+    def _run() -> None:
+        try:
+            n = backfill_embeddings()
+        except Exception:  # noqa: BLE001
+            logger.exception("embedding backfill failed")
+            return
+        if n:
+            logger.info("embedding backfill: stored %d vectors", n)
+
+    if _BACKFILL is not None and _BACKFILL.is_alive():
+        return
+    _BACKFILL = threading.Thread(target=_run, name="embed-backfill", daemon=True)
+    _BACKFILL.start()
+
+
+def load_vectors() -> dict[int, list[float]]:
+    """Return every stored vector for the current embedder version."""
+    ids, mat = load_matrix()
+    rows = mat.tolist() if not isinstance(mat, list) else [list(row) for row in mat]
+    return dict(zip(ids, rows))
+
+
+def load_matrix() -> tuple[list[int], Any]:
+    """Return (ids, matrix) for all stored vectors.
+
+    With NumPy the matrix is one contiguous (n, Dim) float32 array built
+    straight from the stored blobs; otherwise a list of float lists. The
+    result is cached until the next commit that stores vectors, so callers
+    must not modify it. Chunks without a vector are not embedded here; see
+    ``backfill_embeddings``.
+    """
+    global _MATRIX
+    gen, pool = _GENERATION, get_pool()
+    cached = _MATRIX
+    if cached is not None and cached[0] == gen and cached[1] is pool:
+        return cached[2], cached[3]
+    with connection() as conn:
+        rows = conn.execute(
+            "SELECT chunk_id, vec FROM embeddings WHERE version = ? ORDER BY chunk_id", (EMBEDDER_VERSION,)
+        ).fetchall()
+    ids = [row["chunk_id"] for row in rows]
+    if np is not None:
+        if not rows:
+            mat = np.zeros((0, Dim), dtype=np.float32)
+        else:
+            mat = np.frombuffer(b"".join(row["vec"] for row in rows), dtype=np.float32).reshape(len(rows), Dim)
+    else:
+        mat = [_unpack(row["vec"]) for row in rows]
+    _MATRIX = (gen, pool, ids, mat)
+    return ids, mat
+
+
+def top_k(
+    query: Sequence[float],
+    ids: list[int],
+    mat: Any,
+    k: int,
+    threshold: float | None = None,
+    exclude: int | None = None,
+) -> list[tuple[int, float]]:
+    """Score every row of ``mat`` against ``query`` and return the best k (id, score).
+
+    ``exclude`` is a row position to skip. Ties are broken by ascending id on
+    both backends.
+    """
+    if k <= 0 or not ids:
+        return []
+    if np is not None and not isinstance(mat, list):
+        scores = mat @ np.asarray(query, dtype=np.float32)
+        keep = np.ones(len(ids), dtype=bool)
+        if exclude is not None:
+            keep[exclude] = False
+        if threshold is not None:
+            keep &= scores >= threshold
+        cand = np.nonzero(keep)[0]
+        if len(cand) > k:
+            # argpartition finds the k-th best score; keep everything tied with it
+            kth = scores[cand[np.argpartition(-scores[cand], k - 1)[k - 1]]]
+            cand = cand[scores[cand] >= kth]
+        pairs = [(ids[i], float(scores[i])) for i in cand.tolist()]
+    else:
+        pairs = []
+        q = list(query)
+        for pos, (cid, v) in enumerate(zip(ids, mat)):
+            if pos == exclude:
+                continue
+            score = _cosine_vec(q, v)
+            if threshold is None or score >= threshold:
+                pairs.append((cid, float(score)))
+    pairs.sort(key=lambda x: (-x[1], x[0]))
+    return pairs[:k]
+
+
 def similar(chunk_id: int, k: int = 5, threshold: float | None = None) -> list[tuple[int, float]]:
     """Return top-k most similar chunk ids with cosine score.
 
-    Brute-force over all chunks in DB using normalized embeddings.
+    Served by the ANN index when enabled (exact while the corpus is small),
+    otherwise an exact scan over the stored, normalized embeddings.
     """
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT id, text FROM chunks")
-    rows = cur.fetchall()
-    texts = {row["id"]: row["text"] for row in rows}
-    if chunk_id not in texts:
+    from . import ann
+
+    hits = ann.similar(chunk_id, k=k, threshold=threshold)
+    if hits is not None:
+        return hits
+    ids, mat = load_matrix()
+    try:
+        pos = ids.index(chunk_id)
+    except ValueError:
         return []
-    vecs: dict[int, list[float]] = {cid: embed(txt) for cid, txt in texts.items()}
-    target = vecs[chunk_id]
-    scores: list[tuple[int, float]] = []
-    for cid, v in vecs.items():
-        if cid == chunk_id:
-            continue
-        score = _cosine_vec(target, v)
-        if threshold is None or score >= threshold:
-            scores.append((cid, float(score)))
-    scores.sort(key=lambda x: (-x[1], x[0]))
-    return scores[:k]
+    return top_k(mat[pos], ids, mat, k, threshold=threshold, exclude=pos)
+
+
+def nearest(query: Sequence[float], k: int = 5, threshold: float | None = None) -> list[tuple[int, float]]:
+    """Return the top-k stored chunks closest to an arbitrary (normalized) query vector."""
+    from . import ann
+
+    hits = ann.nearest(query, k=k, threshold=threshold)
+    if hits is not None:
+        return hits
+    ids, mat = load_matrix()
+    return top_k(query, ids, mat, k, threshold=threshold)
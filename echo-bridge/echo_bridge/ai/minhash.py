@@ -0,0 +1,223 @@
+"""Near-duplicate detection with random-hyperplane signatures and LSH banding.
+
+Duplicates are defined by the count-weighted bag-of-words cosine used by
+``reflexes.dedupe``, so the hash family is one for cosine (SimHash): each
+signature bit is the sign of the bag projected onto a pseudo-random +-1
+hyperplane, and two bags agree on a bit with probability 1 - angle/pi. Bits
+are cut into ``bands`` bands of ``rows`` bits and two texts become candidates
+when any band matches. Candidates are then verified with the exact cosine, so
+LSH only decides which pairs are compared, never whether they are duplicates.
+
+The default 64 bands x 12 bits make pairs with cosine >= 0.9 candidates with
+probability > 0.9999 (>= 0.98 at cosine 0.8), while unrelated texts (cosine
+near 0) collide in about 1.5% of pairs.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from functools import lru_cache
+from typing import Any, Callable, Hashable, Mapping, Sequence
+
+from ..db import connection, write
+from .embedder import np
+from .reflexes import _cosine, analyze
+
+
+logger = logging.getLogger("echo_bridge.minhash")
+
+
+@lru_cache(maxsize=65536)
+def _term_bits(term: str, nbytes: int, seed: bytes) -> bytes:
+    """The term's hyperplane signs (bit set = +1), one bit per signature bit."""
+    return hashlib.shake_128(seed + term.encode("utf-8")).digest(nbytes)
+
+
+class SimHashLSH:
+    """Random-hyperplane (SimHash) signer plus banded LSH buckets of inserted keys."""
+
+    def __init__(self, bands: int = 64, rows: int = 12, seed: int = 1) -> None:
+        if not 1 <= rows <= 62:
+            raise ValueError("rows must be between 1 and 62")
+        self.bands = bands
+        self.rows = rows
+        self.nbits = bands * rows
+        self._nbytes = (self.nbits + 7) // 8
+        self._seed = seed.to_bytes(8, "little")
+        self._buckets: list[dict[int, list[Hashable]]] = [defaultdict(list) for _ in range(bands)]
+        self.size = 0
+
+    def signature(self, bag: Mapping[str, float]) -> list[int]:
+        """One integer per band; empty for an empty bag (never a candidate)."""
+        terms = [(t, w) for t, w in bag.items() if w]
+        if not terms:
+            return []
+        nbits, rows = self.nbits, self.rows
+        if np is not None:
+            raw = np.frombuffer(b"".join(_term_bits(t, self._nbytes, self._seed) for t, _ in terms), dtype=np.uint8)
+            bits = np.unpackbits(raw.reshape(len(terms), self._nbytes), axis=1, bitorder="little")[:, :nbits]
+            weights = np.asarray([w for _, w in terms], dtype=np.float64)
+            # sum of w * (+1 | -1) > 0  <=>  2 * (weight on set bits) > total weight
+            positive = 2 * (weights @ bits) > weights.sum()
+            return (positive.reshape(self.bands, rows) @ (1 << np.arange(rows, dtype=np.int64))).tolist()
+        acc = [0.0] * nbits
+        total = 0.0
+        for t, w in terms:
+            x = int.from_bytes(_term_bits(t, self._nbytes, self._seed), "little")
+            total += w
+            for j in range(nbits):
+                if x >> j & 1:
+                    acc[j] += w
+        sig = 0
+        for j in range(nbits):
+            if 2 * acc[j] > total:
+                sig |= 1 << j
+        mask = (1 << rows) - 1
+        return [(sig >> (band * rows)) & mask for band in range(self.bands)]
+
+    def candidates(self, sig: Sequence[int]) -> set[Hashable]:
+        out: set[Hashable] = set()
+        for band, key in enumerate(sig):
+            hit = self._buckets[band].get(key)
+            if hit:
+                out.update(hit)
+        return out
+
+    def insert(self, key: Hashable, sig: Sequence[int]) -> None:
+        if not sig:
+            return
+        for band, bkey in enumerate(sig):
+            self._buckets[band][bkey].append(key)
+        self.size += 1
+
+
+def find_duplicates(bags: Sequence[Counter[str]], threshold: float = 0.9) -> list[int | None]:
+    """For each bag-of-words return the index of the earliest earlier master it duplicates.
+
+    Items are visited in order and an item matching no master (cosine >=
+    threshold) becomes a master itself, as in an all-pairs scan. Only LSH
+    candidates are compared, so at thresholds well below 0.8 some matches can
+    be missed; see the module docstring.
+    """
+    lsh = SimHashLSH()
+    out: list[int | None] = []
+    for i, bag in enumerate(bags):
+        sig = lsh.signature(bag)
+        dup: int | None = None
+        for j in sorted(lsh.candidates(sig)):  # type: ignore[type-var]
+            if _cosine(bag, bags[j]) >= threshold:
+                dup = j
+                break
+        if dup is None:
+            lsh.insert(i, sig)
+        out.append(dup)
+    return out
+
+
+def dedupe_corpus(
+    threshold: float = 0.9,
+    batch_size: int = 1000,
+    progress: Callable[[int, int], None] | None = None,
+) -> dict[str, int]:
+    """Scan ``chunks`` in id order and record ``dup_of`` in meta_json of near-duplicates.
+
+    Only signatures of masters are held in memory; candidate texts are read
+    back from the table for verification. Chunks already carrying ``dup_of``
+    are left alone, so the job can be re-run after further ingests.
+    """
+    lsh = SimHashLSH()
+    scanned = duplicates = 0
+    last_id = 0
+    while True:
+        # short checkouts only: hashing and verification run with no connection held
+        with connection() as conn:
+            rows = conn.execute(
+                "SELECT id, text, meta_json FROM chunks WHERE id > ? ORDER BY id LIMIT ?",
+                (last_id, batch_size),
+            ).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1]["id"]
+        batch_texts = {row["id"]: row["text"] for row in rows}
+        updates: list[tuple[str, int]] = []
+        for row in rows:
+            scanned += 1
+            try:
+                meta = json.loads(row["meta_json"]) if row["meta_json"] else {}
+            except Exception:
+                meta = {}
+            if not isinstance(meta, dict) or meta.get("dup_of") is not None:
+                continue
+            bag = analyze(row["text"]).tf
+            sig = lsh.signature(bag)
+            cands = sorted(lsh.candidates(sig))  # type: ignore[type-var]
+            dup: int | None = None
+            if cands:
+                texts = {cid: batch_texts[cid] for cid in cands if cid in batch_texts}
+                earlier = [cid for cid in cands if cid not in texts]
+                if earlier:
+                    with connection() as conn:
+                        texts.update(
+                            (r["id"], r["text"])
+                            for r in conn.execute(
+                                f"SELECT id, text FROM chunks WHERE id IN ({','.join('?' * len(earlier))})", earlier
+                            ).fetchall()
+                        )
+                for cid in cands:
+                    if cid in texts and _cosine(bag, analyze(texts[cid]).tf) >= threshold:
+                        dup = int(cid)
+                        break
+            if dup is None:
+                lsh.insert(row["id"], sig)
+            else:
+                meta["dup_of"] = dup
+                updates.append((json.dumps(meta, ensure_ascii=False), row["id"]))
+        if updates:
+            write(lambda w: w.executemany("UPDATE chunks SET meta_json=? WHERE id=?", updates))
+            duplicates += len(updates)
+        if progress is not None:
+            progress(scanned, duplicates)
+    return {"scanned": scanned, "duplicates": duplicates, "masters": lsh.size}
+
+
+# -----------------------------
+# Background job
+# -----------------------------
+_JOB_LOCK = threading.Lock()
+_JOB: dict[str, Any] = {"state": "idle"}
+
+
+def job_status() -> dict[str, Any]:
+    with _JOB_LOCK:
+        return dict(_JOB)
+
+
+def start_dedupe_job(threshold: float = 0.9, batch_size: int = 1000) -> dict[str, Any]:
+    """Run dedupe_corpus on a daemon thread; returns the status, unchanged if one is already running."""
+    global _JOB
+    with _JOB_LOCK:
+        if _JOB.get("state") == "running":
+            return dict(_JOB)
+        _JOB = {"state": "running", "threshold": threshold, "started": time.time(), "scanned": 0, "duplicates": 0}
+
+    def _progress(scanned: int, duplicates: int) -> None:
+        with _JOB_LOCK:
+            _JOB.update(scanned=scanned, duplicates=duplicates)
+
+    def _run() -> None:
+        try:
+            res = dedupe_corpus(threshold=threshold, batch_size=batch_size, progress=_progress)
+            with _JOB_LOCK:
+                _JOB.update(res, state="done", finished=time.time())
+        except Exception as e:
+            logger.exception("dedupe job failed")
+            with _JOB_LOCK:
+                _JOB.update(state="failed", error=str(e), finished=time.time())
+
+    threading.Thread(target=_run, name="dedupe-job", daemon=True).start()
+    return job_status()
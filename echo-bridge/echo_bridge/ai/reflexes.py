@@ -3,12 +3,10 @@ from __future__ import annotations
 import math
 import re
 from collections import Counter, defaultdict
+from functools import lru_cache
 from typing import Any, Iterable, Literal, TypedDict
 
 
-_SENT_SPLIT = re.compile(r"(?<=[.!?])\s+")
-
-
 # Minimal multilingual stopwords (en/de), can be extended safely
 _STOPWORDS = {
     # English
@@ -25,24 +23,29 @@ class SimpleChunk(TypedDict, total=False):
     dup_of: int
 
 
+# Precompiled once; every S1 function goes through analyze() below
+_SENT_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+# Simplified pattern to avoid regex property support issues on Windows Python
+_TOKEN_RE = re.compile(r"[A-Za-zÄÖÜäöüß0-9]+")
+
+
 def _sentences(text: str) -> list[str]:
     text = text.strip()
     if not text:
         return []
     # Robust sentence split: fallback to newline/period split
-    sents = re.split(r"(?<=[.!?])\s+|\n+", text)
+    sents = _SENT_RE.split(text)
     sents = [s.strip() for s in sents if s.strip()]
     return sents
 
 
 def _tokens(text: str) -> list[str]:
     # Keep letters and numbers, lowercase
-    # Simplified pattern to avoid regex property support issues on Windows Python
-    toks = re.findall(r"[A-Za-zÄÖÜäöüß0-9]+", text.lower())
-    return toks
+    return _TOKEN_RE.findall(text.lower())
 
 
-def _idf_from_sentences(sent_tokens: list[list[str]]) -> dict[str, float]:
+def _idf_from_sentences(sent_tokens: Iterable[Iterable[str]]) -> dict[str, float]:
+    sent_tokens = list(sent_tokens)
     N = max(1, len(sent_tokens))
     df: Counter[str] = Counter()
     for toks in sent_tokens:
@@ -53,16 +56,62 @@ def _idf_from_sentences(sent_tokens: list[list[str]]) -> dict[str, float]:
     return idf
 
 
-def summary(text: str, max_sents: int = 3) -> list[str]:
-    sents = _sentences(text)
+class AnalyzedText:
+    """Sentences, stopword-filtered tokens, TF and IDF of one text, computed once.
+
+    Instances are shared through the analyze() cache, so treat them as
+    read-only.
+    """
+
+    __slots__ = ("text", "sentences", "sent_terms", "tf", "_idf")
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self.sentences: tuple[str, ...] = tuple(_sentences(text))
+        self.sent_terms: tuple[tuple[str, ...], ...] = tuple(
+            tuple(t for t in _tokens(s) if t not in _STOPWORDS) for s in self.sentences
+        )
+        self.tf: Counter[str] = Counter(t for terms in self.sent_terms for t in terms)
+        self._idf: dict[str, float] | None = None
+
+    @property
+    def terms(self) -> list[str]:
+        return [t for terms in self.sent_terms for t in terms]
+
+    @property
+    def idf(self) -> dict[str, float]:
+        if self._idf is None:
+            self._idf = _idf_from_sentences(self.sent_terms)
+        return self._idf
+
+
+@lru_cache(maxsize=512)
+def _analyze_cached(text: str) -> AnalyzedText:
+    return AnalyzedText(text)
+
+
+def analyze(text: str | AnalyzedText) -> AnalyzedText:
+    """Return the (cached) analysis of ``text``; passes AnalyzedText through."""
+    if isinstance(text, AnalyzedText):
+        return text
+    return _analyze_cached(text or "")
+
+
+def analysis_cache_info() -> dict[str, int]:
+    info = _analyze_cached.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "maxsize": info.maxsize or 0}
+
+
+def summary(text: str | AnalyzedText, max_sents: int = 3) -> list[str]:
+    doc = analyze(text)
+    sents = doc.sentences
     if not sents:
         return []
-    sent_tokens = [_tokens(s) for s in sents]
-    idf = _idf_from_sentences(sent_tokens)
+    idf = doc.idf
     scores: list[float] = []
     N = len(sents)
-    for idx, toks in enumerate(sent_tokens):
-        tf = Counter(t for t in toks if t not in _STOPWORDS)
+    for idx, terms in enumerate(doc.sent_terms):
+        tf = Counter(terms)
         tfidf = sum(tf[t] * idf.get(t, 0.0) for t in tf)
         # Position bonus: earlier sentences get a slight boost
         pos_bonus = 1.0 + 0.25 * (1.0 - (idx / max(1, N - 1))) if N > 1 else 1.0
@@ -78,17 +127,13 @@ def summary(text: str, max_sents: int = 3) -> list[str]:
     return [sents[i] for i in range(N) if i in chosen]
 
 
-def keywords(text: str, k: int = 8) -> list[str]:
-    sents = _sentences(text)
-    if not sents:
+def keywords(text: str | AnalyzedText, k: int = 8) -> list[str]:
+    doc = analyze(text)
+    if not doc.sentences:
         return []
-    sent_tokens = [_tokens(s) for s in sents]
-    idf = _idf_from_sentences(sent_tokens)
-    tf_total: Counter[str] = Counter()
-    for toks in sent_tokens:
-        tf_total.update(t for t in toks if t not in _STOPWORDS)
+    idf = doc.idf
     scores: dict[str, float] = {}
-    for term, tf in tf_total.items():
+    for term, tf in doc.tf.items():
         scores[term] = tf * idf.get(term, 0.0)
     top = sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))[:k]
     return [t for t, _ in top]
@@ -106,27 +151,24 @@ def _cosine(a: Counter[str], b: Counter[str]) -> float:
 
 
 def dedupe(chunks: list[SimpleChunk], threshold: float = 0.9) -> list[SimpleChunk]:
-    # Mark duplicates by adding dup_of to later items matching earlier ones
-    bow = []
-    for ch in chunks:
-        toks = _tokens(ch.get("text", ""))
-        bow.append(Counter(t for t in toks if t not in _STOPWORDS))
-    masters: list[int] = []
+    # Mark duplicates by adding dup_of to later items matching earlier ones.
+    # SimHash/LSH picks candidate pairs; each is verified with exact cosine.
+    from .minhash import find_duplicates
+
+    bow = [analyze(ch.get("text", "")).tf for ch in chunks]
+    matches = find_duplicates(bow, threshold=threshold)
     out: list[SimpleChunk] = []
     for i, ch in enumerate(chunks):
         dup_of: int | None = None
-        for j in masters:
-            if _cosine(bow[i], bow[j]) >= threshold:
-                # mark as duplicate of earliest master
-                base_id = chunks[j].get("id") if chunks[j].get("id") is not None else j
-                dup_of = int(base_id)
-                break
+        j = matches[i]
+        if j is not None:
+            # mark as duplicate of earliest master
+            base_id = chunks[j].get("id") if chunks[j].get("id") is not None else j
+            dup_of = int(base_id)
         cp: SimpleChunk = {"id": ch.get("id", i), "text": ch.get("text", "")}
         if ch.get("meta") is not None:
             cp["meta"] = dict(ch.get("meta", {}))
-        if dup_of is None:
-            masters.append(i)
-        else:
+        if dup_of is not None:
             cp["dup_of"] = dup_of
             # also mark in meta for visibility
             m = cp.setdefault("meta", {})
@@ -1,27 +1,555 @@
 from __future__ import annotations
 
-import json
+import logging
+import queue
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
 from sqlite3 import Row
+from typing import Any, Callable, Iterator, TypeVar
 
+from .telemetry import DB_COMMIT_SECONDS, DB_POOL_WAIT_SECONDS, DB_WRITE_GROUP_SIZE, DB_WRITE_JOB_SECONDS
+
+
+logger = logging.getLogger("echo_bridge.db")
+
+T = TypeVar("T")
 
 _DB_PATH: Path | None = None
+_POOL: "ConnectionPool | None" = None
+_WRITER: "DBWriter | None" = None
+_LOCAL = threading.local()
 
+# Applied to every connection the bridge opens (WAL itself is persistent and set in init_db)
+_PRAGMAS: tuple[str, ...] = (
+    "PRAGMA foreign_keys=ON;",
+    "PRAGMA synchronous=NORMAL;",
+    "PRAGMA temp_store=MEMORY;",
+    "PRAGMA cache_size=-16000;",  # ~16 MiB page cache per connection
+    "PRAGMA mmap_size=134217728;",  # 128 MiB memory-mapped reads
+    "PRAGMA busy_timeout=5000;",
+)
 
-def get_conn() -> sqlite3.Connection:
-    if _DB_PATH is None:
-        raise RuntimeError("Database not initialized. Call init_db(path) first.")
-    conn = sqlite3.connect(str(_DB_PATH), check_same_thread=False)
+
+# Kept separate so bulk ingest can drop it and populate chunks_fts in one pass
+CHUNKS_FTS_INSERT_TRIGGER = """
+        CREATE TRIGGER IF NOT EXISTS chunks_ai AFTER INSERT ON chunks BEGIN
+            INSERT INTO chunks_fts(rowid, text, doc_title) VALUES (new.id, new.text, new.doc_title);
+        END;
+"""
+
+# Indexed columns of chunks_fts; bm25() weights are given in this order
+FTS_COLUMNS = ("text", "doc_title")
+
+
+class PoolTimeout(RuntimeError):
+    pass
+
+
+class PooledConnection(sqlite3.Connection):
+    """Connection owned by a ConnectionPool.
+
+    Legacy callers that call ``close()`` do not tear the connection down:
+    pending work is rolled back and the connection stays available for reuse.
+    """
+
+    _pool: "ConnectionPool | None" = None
+
+    def close(self) -> None:  # type: ignore[override]
+        if self._pool is None or self._pool.closed:
+            super().close()
+            return
+        if self.in_transaction:
+            self.rollback()
+
+    def _really_close(self) -> None:
+        super().close()
+
+
+class WriterConnection(sqlite3.Connection):
+    """The writer thread's connection; the only one allowed to modify the database.
+
+    The writer issues BEGIN/COMMIT itself. While a job runs, ``commit()`` is a
+    no-op (the job's work is committed with its group) and ``rollback()`` only
+    undoes the job's savepoint.
+    """
+
+    _savepoint: str | None = None
+
+    def commit(self) -> None:  # type: ignore[override]
+        if self._savepoint is None:
+            super().commit()
+
+    def rollback(self) -> None:  # type: ignore[override]
+        if self._savepoint is None:
+            super().rollback()
+        else:
+            self.execute(f"ROLLBACK TO {self._savepoint}")
+
+
+def _connect(path: Path, readonly: bool = False, factory: type[sqlite3.Connection] = PooledConnection) -> Any:
+    if readonly:
+        conn = sqlite3.connect(path.resolve().as_uri() + "?mode=ro", uri=True, check_same_thread=False, factory=factory)
+    else:
+        conn = sqlite3.connect(str(path), check_same_thread=False, factory=factory)
     conn.row_factory = Row
+    cur = conn.cursor()
+    for pragma in _PRAGMAS:
+        cur.execute(pragma)
+    if readonly:
+        cur.execute("PRAGMA query_only=ON;")
+    cur.close()
     return conn
 
 
-def init_db(path: str | Path) -> None:
-    global _DB_PATH
+class ConnectionPool:
+    """Bounded pool of SQLite connections with per-thread re-entrant checkout.
+
+    ``connection()`` checks a connection out for the duration of a ``with``
+    block; nested blocks on the same thread reuse the outer connection so a
+    service calling another service never waits on itself. Checkouts held
+    longer than ``leak_after`` seconds are reported as leaks. With ``readonly``
+    connections are opened ``mode=ro`` with ``query_only`` set; writes then go
+    through the ``DBWriter``.
+    """
+
+    def __init__(
+        self, path: Path, size: int = 8, timeout: float = 10.0, leak_after: float = 30.0, readonly: bool = False
+    ) -> None:
+        self.path = path
+        self.size = max(1, int(size))
+        self.readonly = readonly
+        self.timeout = timeout
+        self.leak_after = leak_after
+        self.closed = False
+        self._idle: queue.LifoQueue[PooledConnection] = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._checked_out: dict[int, tuple[float, str]] = {}
+        self._reported_leaks: set[int] = set()
+        self._checkouts = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._leaks = 0
+
+    def _new_conn(self) -> PooledConnection:
+        conn = _connect(self.path, readonly=self.readonly)
+        conn._pool = self
+        return conn
+
+    def acquire(self) -> PooledConnection:
+        if self.closed:
+            raise RuntimeError("Connection pool is closed")
+        conn: PooledConnection | None = None
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                if self._created < self.size:
+                    self._created += 1
+                    create = True
+                else:
+                    create = False
+                    self._waits += 1
+            if create:
+                try:
+                    conn = self._new_conn()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                self._detect_leaks()
+                waited = time.perf_counter()
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    with self._lock:
+                        self._timeouts += 1
+                    raise PoolTimeout(f"No database connection available after {self.timeout}s (pool size {self.size})")
+                finally:
+                    DB_POOL_WAIT_SECONDS.observe(time.perf_counter() - waited)
+        with self._lock:
+            self._checkouts += 1
+            self._checked_out[id(conn)] = (time.monotonic(), threading.current_thread().name)
+        return conn
+
+    def release(self, conn: PooledConnection) -> None:
+        with self._lock:
+            self._checked_out.pop(id(conn), None)
+            self._reported_leaks.discard(id(conn))
+        try:
+            if conn.in_transaction:
+                logger.warning("connection returned to pool with an open transaction; rolling back")
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        if self.closed:
+            conn._really_close()
+            return
+        self._idle.put(conn)
+
+    def _discard(self, conn: PooledConnection) -> None:
+        with self._lock:
+            self._created -= 1
+        try:
+            conn._really_close()
+        except Exception:
+            pass
+
+    def _detect_leaks(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            for cid, (since, thread_name) in self._checked_out.items():
+                if cid in self._reported_leaks or now - since < self.leak_after:
+                    continue
+                self._reported_leaks.add(cid)
+                self._leaks += 1
+                logger.warning("possible connection leak: held by %s for %.1fs", thread_name, now - since)
+
+    @contextmanager
+    def connection(self) -> Iterator[PooledConnection]:
+        held: tuple[ConnectionPool, PooledConnection, int] | None = getattr(_LOCAL, "held", None)
+        if held is not None and held[0] is self:
+            _LOCAL.held = (self, held[1], held[2] + 1)
+            try:
+                yield held[1]
+            finally:
+                cur_held = _LOCAL.held
+                _LOCAL.held = (self, cur_held[1], cur_held[2] - 1)
+            return
+        conn = self.acquire()
+        _LOCAL.held = (self, conn, 1)
+        try:
+            yield conn
+        finally:
+            _LOCAL.held = None
+            self.release(conn)
+
+    def stats(self) -> dict[str, Any]:
+        self._detect_leaks()
+        with self._lock:
+            in_use = len(self._checked_out)
+            return {
+                "size": self.size,
+                "created": self._created,
+                "idle": self._idle.qsize(),
+                "in_use": in_use,
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "timeouts": self._timeouts,
+                "leaks": self._leaks,
+                "readonly": self.readonly,
+            }
+
+    def close(self) -> None:
+        self.closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                conn._really_close()
+            except Exception:
+                pass
+
+
+class TransactionLost(sqlite3.OperationalError):
+    """A write job's transaction was ended by another job before it committed."""
+
+
+class _WriteJob:
+    __slots__ = ("fn", "done", "result", "error")
+
+    def __init__(self, fn: Callable[[sqlite3.Connection], Any]) -> None:
+        self.fn = fn
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+
+
+class DBWriter:
+    """Single thread that owns the only read-write connection.
+
+    ``submit(fn)`` queues ``fn(conn)`` and blocks until the transaction that ran
+    it has committed. Each time the writer wakes it takes every job already
+    queued, up to ``max_batch``, and runs them all in one ``BEGIN IMMEDIATE ...
+    COMMIT``. With ``group_ms`` it also waits that long for more jobs. Each job
+    runs under its own SAVEPOINT, so a job that raises is rolled back alone and
+    its caller gets the exception while the rest of the group still commits.
+    If a job ends the transaction instead (a ROLLBACK, or an error such as
+    SQLITE_FULL that makes SQLite abort it), every job run in that transaction
+    fails with ``TransactionLost`` and the rest of the group continues in a
+    new one.
+    Jobs submitted from inside a job run inline, nested in the current one.
+    Callbacks registered with ``after_commit`` from inside a job run on the
+    writer thread once its transaction commits, and are dropped if it doesn't.
+    """
+
+    def __init__(self, path: Path, pool: ConnectionPool | None = None, max_batch: int = 64, group_ms: float = 0.0) -> None:
+        self.path = path
+        self.pool = pool
+        self.max_batch = max(1, int(max_batch))
+        self.group_ms = max(0.0, float(group_ms))
+        self._conn: WriterConnection = _connect(path, factory=WriterConnection)
+        self._conn.isolation_level = None  # transactions are issued explicitly
+        self._queue: queue.Queue[_WriteJob | None] = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self._depth = 0
+        self._committer: int | None = None  # thread running _commit
+        self._hooks: list[Callable[[], None]] = []
+        self.jobs = 0
+        self.groups = 0
+        self.max_group = 0
+        self.errors = 0
+        self.commit_ms = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        with self._lock:
+            if not self.running:
+                self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Commit every queued job, stop the thread and close the connection."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout)
+        self._conn.close()
+
+    def submit(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        if threading.current_thread() is self._thread:
+            return self._run_job(fn)
+        self.start()
+        job = _WriteJob(fn)
+        self._queue.put(job)
+        job.done.wait()
+        if job.error is not None:
+            raise job.error
+        return job.result
+
+    def after_commit(self, fn: Callable[[], None]) -> None:
+        if threading.get_ident() != self._committer:
+            fn()
+            return
+        self._hooks.append(fn)
+
+    def _run_job(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        conn = self._conn
+        outer = conn._savepoint
+        self._depth += 1
+        hooks = len(self._hooks)
+        sp = f"job_{self._depth}"
+        conn.execute(f"SAVEPOINT {sp}")
+        conn._savepoint = sp
+        try:
+            result = fn(conn)
+        except BaseException:
+            del self._hooks[hooks:]
+            conn._savepoint = None
+            if conn.in_transaction:
+                conn.execute(f"ROLLBACK TO {sp}")
+                conn.execute(f"RELEASE {sp}")
+            raise
+        else:
+            conn.execute(f"RELEASE {sp}")
+            return result
+        finally:
+            conn._savepoint = outer
+            self._depth -= 1
+
+    def _run(self) -> None:
+        # Nested connection() calls inside a job read through the writer connection
+        _LOCAL.held = (self.pool, self._conn, 1)
+        stop = False
+        while not stop:
+            job = self._queue.get()
+            if job is None:
+                break
+            group = [job]
+            deadline = time.monotonic() + self.group_ms / 1000.0
+            while len(group) < self.max_batch:
+                try:
+                    if self.group_ms:
+                        item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                    else:
+                        item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                group.append(item)
+            self._commit(group)
+        # Jobs that raced the stop marker still get written
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                self._commit([item])
+
+    def _commit(self, group: list[_WriteJob]) -> None:
+        conn = self._conn
+        start = time.perf_counter()
+        self._committer = threading.get_ident()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            pending: list[_WriteJob] = []  # jobs run in the open transaction
+            for job in group:
+                if not conn.in_transaction:
+                    conn.execute("BEGIN IMMEDIATE")
+                with DB_WRITE_JOB_SECONDS.time():
+                    try:
+                        job.result = self._run_job(job.fn)
+                    except BaseException as e:  # noqa: BLE001 - handed back to the submitting thread
+                        job.error = e
+                pending.append(job)
+                if not conn.in_transaction:
+                    # this job ended the transaction: nothing run in it is known to be committed
+                    lost = TransactionLost("write transaction was ended by another job in its group; not committed")
+                    for done in pending:
+                        if done.error is None:
+                            done.result, done.error = None, lost
+                    pending = []
+                    self._hooks.clear()
+            if conn.in_transaction:
+                conn.execute("COMMIT")
+        except Exception as e:  # noqa: BLE001
+            logger.exception("db writer: group of %d jobs failed to commit", len(group))
+            self._hooks.clear()
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for job in group:
+                if job.error is None:
+                    job.error = e
+        finally:
+            self._committer = None
+        hooks, self._hooks = self._hooks, []
+        for hook in hooks:
+            try:
+                hook()
+            except Exception:  # noqa: BLE001
+                logger.exception("db writer: after-commit hook failed")
+        elapsed = time.perf_counter() - start
+        DB_COMMIT_SECONDS.observe(elapsed)
+        DB_WRITE_GROUP_SIZE.observe(len(group))
+        self.jobs += len(group)
+        self.groups += 1
+        self.max_group = max(self.max_group, len(group))
+        self.errors += sum(1 for job in group if job.error is not None)
+        self.commit_ms += elapsed * 1000
+        for job in group:
+            job.done.set()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "running": self.running,
+            "queue_depth": self._queue.qsize(),
+            "jobs": self.jobs,
+            "groups": self.groups,
+            "avg_group": round(self.jobs / self.groups, 2) if self.groups else 0.0,
+            "max_group": self.max_group,
+            "errors": self.errors,
+            "commit_ms": round(self.commit_ms, 2),
+        }
+
+
+def get_pool() -> ConnectionPool:
+    if _POOL is None:
+        raise RuntimeError("Database not initialized. Call init_db(path) first.")
+    return _POOL
+
+
+@contextmanager
+def connection() -> Iterator[sqlite3.Connection]:
+    """Check a pooled connection out for the duration of the block."""
+    with get_pool().connection() as conn:
+        yield conn
+
+
+def write(fn: Callable[[sqlite3.Connection], T]) -> T:
+    """Run ``fn(conn)`` on the writer thread and return once it is committed.
+
+    Pooled connections are read-only; every mutation goes through here. ``fn``
+    must not hold on to ``conn`` after it returns.
+    """
+    if _WRITER is None:
+        raise RuntimeError("Database not initialized. Call init_db(path) first.")
+    return _WRITER.submit(fn)
+
+
+def after_commit(fn: Callable[[], None]) -> None:
+    """Call ``fn()`` once the write job running on this thread has committed.
+
+    Dropped if the job is rolled back. Outside a write job ``fn`` runs at once.
+    """
+    if _WRITER is None:
+        fn()
+        return
+    _WRITER.after_commit(fn)
+
+
+def pool_stats() -> dict[str, Any]:
+    if _POOL is None:
+        return {}
+    return _POOL.stats()
+
+
+def writer_stats() -> dict[str, Any]:
+    if _WRITER is None:
+        return {}
+    return _WRITER.stats()
+
+
+def close_db() -> None:
+    global _POOL, _WRITER
+    if _WRITER is not None:
+        _WRITER.stop()
+        _WRITER = None
+    if _POOL is not None:
+        _POOL.close()
+        _POOL = None
+
+
+def _drop_outdated_fts(cur: sqlite3.Cursor) -> bool:
+    """Drop chunks_fts and its triggers if built before doc_title was indexed; returns True if dropped."""
+    row = cur.execute("SELECT sql FROM sqlite_master WHERE name='chunks_fts'").fetchone()
+    if row is None or "doc_title" in (row[0] or ""):
+        return False
+    cur.executescript(
+        """
+        DROP TRIGGER IF EXISTS chunks_ai;
+        DROP TRIGGER IF EXISTS chunks_au;
+        DROP TRIGGER IF EXISTS chunks_ad;
+        DROP TABLE chunks_fts;
+        """
+    )
+    return True
+
+
+def init_db(path: str | Path, pool_size: int = 8, writer: dict[str, Any] | None = None) -> None:
+    """Create the schema, then a pool of read-only connections and the writer.
+
+    ``writer`` takes DBWriter options (``max_batch``, ``group_ms``).
+    """
+    global _DB_PATH, _POOL, _WRITER
     db_path = Path(path)
     db_path.parent.mkdir(parents=True, exist_ok=True)
     first_time = not db_path.exists()
+    close_db()
     _DB_PATH = db_path
 
     conn = sqlite3.connect(str(db_path), check_same_thread=False)
@@ -31,7 +559,7 @@ def init_db(path: str | Path) -> None:
     cur.execute("PRAGMA journal_mode=WAL;")
     cur.execute("PRAGMA foreign_keys=ON;")
     cur.execute("PRAGMA synchronous=NORMAL;")
-
+    rebuild_fts = _drop_outdated_fts(cur)
     # Core tables
     cur.executescript(
         """
@@ -45,18 +573,31 @@ def init_db(path: str | Path) -> None:
         );
 
         CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
-            text, content='chunks', content_rowid='id'
+            text, doc_title, content='chunks', content_rowid='id'
         );
 
-        CREATE TRIGGER IF NOT EXISTS chunks_ai AFTER INSERT ON chunks BEGIN
-            INSERT INTO chunks_fts(rowid, text) VALUES (new.id, new.text);
-        END;
-        CREATE TRIGGER IF NOT EXISTS chunks_au AFTER UPDATE ON chunks BEGIN
-            INSERT INTO chunks_fts(chunks_fts, rowid, text) VALUES ('delete', old.id, old.text);
-            INSERT INTO chunks_fts(rowid, text) VALUES (new.id, new.text);
+        """
+        + CHUNKS_FTS_INSERT_TRIGGER
+        + """
+        CREATE TRIGGER IF NOT EXISTS chunks_au AFTER UPDATE OF text, doc_title ON chunks BEGIN
+            INSERT INTO chunks_fts(chunks_fts, rowid, text, doc_title) VALUES ('delete', old.id, old.text, old.doc_title);
+            INSERT INTO chunks_fts(rowid, text, doc_title) VALUES (new.id, new.text, new.doc_title);
         END;
         CREATE TRIGGER IF NOT EXISTS chunks_ad AFTER DELETE ON chunks BEGIN
-            INSERT INTO chunks_fts(chunks_fts, rowid, text) VALUES ('delete', old.id, old.text);
+            INSERT INTO chunks_fts(chunks_fts, rowid, text, doc_title) VALUES ('delete', old.id, old.text, old.doc_title);
+        END;
+
+        CREATE TABLE IF NOT EXISTS embeddings (
+            chunk_id INTEGER PRIMARY KEY,
+            version TEXT NOT NULL,
+            vec BLOB NOT NULL,
+            FOREIGN KEY (chunk_id) REFERENCES chunks(id) ON DELETE CASCADE
+        );
+        CREATE TRIGGER IF NOT EXISTS chunks_embed_au AFTER UPDATE OF text ON chunks BEGIN
+            DELETE FROM embeddings WHERE chunk_id = old.id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS chunks_embed_ad AFTER DELETE ON chunks BEGIN
+            DELETE FROM embeddings WHERE chunk_id = old.id;
         END;
 
         CREATE TABLE IF NOT EXISTS tags (
@@ -104,6 +645,11 @@ def init_db(path: str | Path) -> None:
             cur.execute("ALTER TABLE audits ADD COLUMN soul_mood TEXT;")
     except Exception:
         pass
+    if rebuild_fts:
+        cur.execute("INSERT INTO chunks_fts(chunks_fts) VALUES ('rebuild')")
 
     conn.commit()
     conn.close()
+
+    _POOL = ConnectionPool(db_path, size=pool_size, readonly=True)
+    _WRITER = DBWriter(db_path, _POOL, **(writer or {}))
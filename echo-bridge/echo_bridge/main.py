@@ -6,20 +6,19 @@ import logging
 import asyncio
 import anyio
 from pathlib import Path
-from time import perf_counter
-from typing import Any, Optional, cast, Awaitable, Callable, AsyncGenerator, Dict, List
+from typing import Any, Optional, cast, Awaitable, Callable, Dict, List
 from urllib.parse import urlparse, urlunparse
 
 import yaml
 from fastapi import Depends, FastAPI, Header, HTTPException, Query, Body
 from fastapi import Request
+from starlette.concurrency import run_in_threadpool
 from starlette.responses import Response
 
-from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
+from fastapi.responses import HTMLResponse, JSONResponse
 import httpx
 from fastapi.staticfiles import StaticFiles
-from fastapi.middleware.cors import CORSMiddleware
-from contextlib import asynccontextmanager
+from contextlib import AsyncExitStack, asynccontextmanager
 try:
     # FastMCP FastAPI integration (optional)
     from fastmcp.fastapi import mount_mcp  # type: ignore
@@ -27,14 +26,25 @@ except Exception:
     mount_mcp = None  # type: ignore
 from pydantic import BaseModel
 
-from .db import init_db, get_conn
-from .services.actions_service import ActionError, PreconditionFailed, dispatch
+from .db import close_db, connection, init_db, pool_stats, write, writer_stats
+from .services.actions_service import ActionError, PreconditionFailed
+from .ai import ann, embedder, minhash
 from .ai.brain import Policy
+from .ai.reflexes import analysis_cache_info
 from .soul.loader import load_soul
 from .soul.state import get_soul, init_soul
+from .soul.timeline import parse_time
 from .mcp_server import router as mcp_router
-from .services.fs_service import FSError, list_dir, read_file
-from .services.memory_service import Chunk, Hit, add_chunks, get_chunk, search
+from .services.fs_service import FSError
+from .services.memory_service import (
+    Chunk,
+    Hit,
+    NewChunk,
+    SearchFilters,
+)
+from . import profiling, sampler, spec_cache, telemetry
+from .middleware import BridgeMiddleware
+from .services import audit_service, backend_client, mcp_forwarder, repository, search_cache, sse_relay
 from .mcp_server import register_mcp
 from .mcp_setup import mcp as mcp_server
 
@@ -44,10 +54,24 @@ class Settings(BaseModel):
     port: int = 3333
     bridge_key: Optional[str] = "SECRET"
     db_path: Path
+    db_pool_size: int = 8
+    db_executor_workers: Optional[int] = None
+    db_writer: dict[str, Any] = {"max_batch": 64, "group_ms": 0.0}
     workspace_dir: Path
     ai_s1: bool = True
     ai_s2: bool = True
     ai_s3: bool = False
+    ai_ann: dict[str, Any] = {"enabled": True, "nprobe": 8, "exact_below": 2000}
+    search_cache: dict[str, Any] = {"max_entries": 512, "ttl_secs": 60}
+    audit: dict[str, Any] = {"policy": "block", "max_queue": 10000, "batch_size": 200, "flush_ms": 200}
+    soul_timeline: dict[str, Any] = {"max_bytes": 10485760, "keep": 5, "compress": True}
+    mcp_backend: dict[str, Any] = {"max_connections": 100, "max_keepalive": 20, "keepalive_expiry": 30.0}
+    mcp_sse: dict[str, Any] = {"heartbeat_secs": 15.0, "max_buffer_frames": 64, "slow_client_secs": 10.0}
+    mcp_post: dict[str, Any] = {"max_buffer_bytes": 1048576, "coalesce_methods": ["initialize", "tools/list"]}
+    mcp_mode: str = "proxy"
+    ingest_max_line_bytes: int = 1048576
+    profile_requests: dict[str, Any] = {"enabled": False, "dir": "./echo-bridge/data/profiles", "keep": 50}
+    profile_sampler: dict[str, Any] = {"enabled": False, "hz": 20, "bucket_secs": 60, "retain_secs": 21600}
     ai_tiers: dict[str, dict[str, object]] = {
         "under": {"enabled": True, "timeout_ms": 400, "allow_llm": False},
         "core": {"enabled": True, "timeout_ms": 800, "allow_llm": False},
@@ -69,15 +93,35 @@ def load_settings() -> Settings:
     database: dict[str, Any] = data.get("database", {}) if isinstance(data.get("database", {}), dict) else {}
     workspace: dict[str, Any] = data.get("workspace", {}) if isinstance(data.get("workspace", {}), dict) else {}
     ai: dict[str, Any] = data.get("ai", {}) if isinstance(data.get("ai", {}), dict) else {}
+    search: dict[str, Any] = data.get("search", {}) if isinstance(data.get("search", {}), dict) else {}
+    audit: dict[str, Any] = data.get("audit", {}) if isinstance(data.get("audit", {}), dict) else {}
+    soul: dict[str, Any] = data.get("soul", {}) if isinstance(data.get("soul", {}), dict) else {}
+    mcp: dict[str, Any] = data.get("mcp", {}) if isinstance(data.get("mcp", {}), dict) else {}
+    prof: dict[str, Any] = data.get("profiling", {}) if isinstance(data.get("profiling", {}), dict) else {}
+    ingest: dict[str, Any] = data.get("ingest", {}) if isinstance(data.get("ingest", {}), dict) else {}
     settings = Settings(
         host=server.get("host", "127.0.0.1"),
         port=int(server.get("port", 3333)),
         bridge_key=server.get("bridge_key", "SECRET"),
         db_path=Path(database.get("path", "./echo-bridge/data/bridge.db")),
+        db_pool_size=int(database.get("pool_size", 8)),
+        db_executor_workers=database.get("executor_workers"),
+        db_writer=database.get("writer", {"max_batch": 64, "group_ms": 0.0}),
         workspace_dir=Path(workspace.get("dir", "./echo-bridge/workspace")),
         ai_s1=bool(ai.get("s1", True)),
         ai_s2=bool(ai.get("s2", True)),
         ai_s3=bool(ai.get("s3", False)),
+        ai_ann=ai.get("ann", {"enabled": True, "nprobe": 8, "exact_below": 2000}),
+        search_cache=search.get("cache", {"max_entries": 512, "ttl_secs": 60}),
+        audit=audit or {"policy": "block", "max_queue": 10000, "batch_size": 200, "flush_ms": 200},
+        soul_timeline=soul.get("timeline", {"max_bytes": 10485760, "keep": 5, "compress": True}),
+        mcp_backend=mcp.get("backend", {"max_connections": 100, "max_keepalive": 20, "keepalive_expiry": 30.0}),
+        mcp_sse=mcp.get("sse", {"heartbeat_secs": 15.0, "max_buffer_frames": 64, "slow_client_secs": 10.0}),
+        mcp_post=mcp.get("post", {"max_buffer_bytes": 1048576, "coalesce_methods": ["initialize", "tools/list"]}),
+        mcp_mode=str(mcp.get("mode", "proxy")),
+        ingest_max_line_bytes=int(ingest.get("max_line_bytes", 1048576)),
+        profile_requests=prof.get("requests", {"enabled": False, "dir": "./echo-bridge/data/profiles", "keep": 50}),
+        profile_sampler=prof.get("sampler", {"enabled": False, "hz": 20, "bucket_secs": 60, "retain_secs": 21600}),
         ai_tiers=ai.get("tiers", {
             "under": {"enabled": True, "timeout_ms": 400, "allow_llm": False},
             "core": {"enabled": True, "timeout_ms": 800, "allow_llm": False},
@@ -107,8 +151,14 @@ class IngestResponse(BaseModel):
     added: int
 
 
+class BulkIngestResponse(IngestResponse):
+    skipped: int = 0
+    errors: list[str] = []
+
+
 class SearchResponse(BaseModel):
     hits: list[Hit]
+    next_cursor: str | None = None
 
 
 class ChunkResponse(Chunk):
@@ -127,10 +177,14 @@ class ActionResponse(BaseModel):
     result: dict[str, Any]
 
 
+def expected_bridge_key() -> Optional[str]:
+    # Use ECHO_BRIDGE_API_KEY if set, otherwise fall back to API_KEY or settings.bridge_key
+    return os.environ.get("ECHO_BRIDGE_API_KEY") or os.environ.get("API_KEY") or settings.bridge_key
+
+
 def get_api_key(x_bridge_key: Optional[str] = Header(default=None, alias="X-Bridge-Key")) -> None:
     # Only required for write endpoints; the dependency is attached only there.
-    # Use ECHO_BRIDGE_API_KEY if set, otherwise fall back to API_KEY or settings.bridge_key
-    expected = os.environ.get("ECHO_BRIDGE_API_KEY") or os.environ.get("API_KEY") or settings.bridge_key
+    expected = expected_bridge_key()
     if not x_bridge_key or x_bridge_key != expected:
         raise HTTPException(status_code=401, detail="Missing or invalid X-Bridge-Key")
 
@@ -173,17 +227,48 @@ async def lifespan(app: FastAPI):
         logger.info("Initializing workspace and database...")
         settings.workspace_dir.mkdir(parents=True, exist_ok=True)
         settings.db_path.parent.mkdir(parents=True, exist_ok=True)
-        init_db(settings.db_path)
+        init_db(settings.db_path, pool_size=settings.db_pool_size, writer=settings.db_writer)
+        repository.configure(workers=settings.db_executor_workers or settings.db_pool_size)
+        repository.start()
         logger.info(f"Database initialized at {settings.db_path}")
+        ann.configure(**settings.ai_ann)
+        embedder.start_backfill()
+        if ann.enabled():
+            ann.request_maintenance()  # load the index off the request path
+        search_cache.configure(**settings.search_cache)
+        audit_service.configure(**settings.audit).start()
+        backend_client.configure(**settings.mcp_backend)
+        backend_client.start()
+        sse_opts = dict(settings.mcp_sse)
+        if os.environ.get("MCP_SSE_HEARTBEAT_SECS"):
+            sse_opts["heartbeat_secs"] = float(os.environ["MCP_SSE_HEARTBEAT_SECS"])
+        sse_relay.configure(**sse_opts)
+        mcp_forwarder.configure(retries=MAX_RETRIES, backoff_base=BACKOFF_BASE, **settings.mcp_post)
+        profiling.configure(key=expected_bridge_key, **settings.profile_requests)
+        if sampler.configure(**settings.profile_sampler).enabled:
+            sampler.start()
     except Exception as e:
         logger.exception(f"CRITICAL: Database initialization failed: {e}")
         raise  # Fatal error, app should not start without DB
     
+    # 1b. Start the in-process FastMCP app; it serves /mcp_app and, with
+    # mcp.mode=inprocess, /mcp itself
+    mcp_stack = AsyncExitStack()
+    if mcp_http_app is not None:
+        try:
+            await mcp_stack.enter_async_context(mcp_http_app.lifespan())
+        except Exception:
+            logger.exception("failed to start in-process MCP app")
+
     # 2. Initialize soul system (optional, non-fatal)
     try:
         logger.info("Loading soul system...")
         soul_root = Path(__file__).resolve().parent.parent
-        soul = load_soul(soul_root, timeline_path=Path("./echo-bridge/data/timeline.jsonl"))
+        soul = load_soul(
+            soul_root,
+            timeline_path=Path("./echo-bridge/data/timeline.jsonl"),
+            timeline_options=settings.soul_timeline,
+        )
         init_soul(soul)
         logger.info("Soul system loaded successfully")
     except Exception as e:
@@ -209,11 +294,25 @@ async def lifespan(app: FastAPI):
     # Yield to run the app
     yield
     
-    # Shutdown cleanup (if needed in future)
+    # Shutdown cleanup
     logger.info("Shutting down gracefully...")
+    # Commit queued audit rows before the pool goes away
+    audit_service.stop()
+    await mcp_stack.aclose()
+    await backend_client.stop()
+    get_soul().close()
+    try:
+        ann.save_index()
+    except Exception:
+        logger.exception("failed to persist ANN index on shutdown")
+    sampler.stop()
+    repository.stop()
+    close_db()
 
 
 app = FastAPI(title="ECHO-BRIDGE", lifespan=lifespan)
+# sync endpoints join a profiled request's profile from their worker thread
+app.router.route_class = profiling.ProfiledRoute
 # -----------------------------
 # Simple in-process metrics (defined after app creation)
 # -----------------------------
@@ -251,8 +350,47 @@ class Metrics:
 metrics = Metrics()
 
 
+def _labelled(values: dict[str, Any], keys: tuple[str, ...]) -> list[tuple[tuple[str, ...], float]]:
+    return [((k,), float(values.get(k, 0))) for k in keys]
+
+
+# Prometheus views of the counters and queues each service already tracks; read at scrape time
+telemetry.Gauge(
+    "bridge_proxy_active", "open /mcp proxy streams", lambda: [(("sse",), metrics.active_sse), (("post",), metrics.active_post)], ("proxy",)
+)
+telemetry.CounterFunc(
+    "bridge_proxy_streams_total",
+    "finished /mcp proxy streams by outcome",
+    lambda: [((proxy, state), n) for proxy, snap in metrics.snapshot().items() for state, n in snap.items() if state in ("started", "completed", "aborted")],
+    ("proxy", "state"),
+)
+telemetry.Gauge("bridge_db_pool_connections", "pooled read-only connections", lambda: _labelled(pool_stats(), ("in_use", "idle")), ("state",))
+telemetry.Gauge("bridge_db_writer_queue_depth", "write jobs waiting for the writer thread", lambda: writer_stats().get("queue_depth", 0))
+telemetry.Gauge("bridge_db_executor_queue_depth", "DB calls waiting for an executor thread", lambda: repository.stats()["queued"])
+telemetry.Gauge("bridge_db_executor_active", "DB calls running on the executor", lambda: repository.stats()["active"])
+telemetry.Gauge("bridge_audit_queue_depth", "audit rows waiting to be written", lambda: audit_service.stats()["queue_depth"])
+telemetry.CounterFunc("bridge_audit_dropped_total", "audit rows dropped under backpressure", lambda: audit_service.stats()["dropped"])
+telemetry.Gauge("bridge_sse_relay_active", "open relayed SSE streams", lambda: sse_relay.stats()["active"])
+telemetry.Gauge(
+    "bridge_mcp_backend_connections", "pooled connections to the MCP backend", lambda: _labelled(backend_client.stats(), ("active", "idle", "queued")), ("state",)
+)
+telemetry.CounterFunc(
+    "bridge_search_cache_requests_total", "search cache lookups", lambda: _labelled(search_cache.stats(), ("hits", "misses")), ("result",)
+)
+
+
+def _wants_prometheus(request: Request, format: Optional[str]) -> bool:
+    if format:
+        return format == "prometheus"
+    accept = request.headers.get("accept", "")
+    return "text/plain" in accept or "openmetrics" in accept
+
+
 @app.get("/metrics")
-def metrics_endpoint() -> JSONResponse:  # type: ignore[misc]
+def metrics_endpoint(request: Request, format: Optional[str] = Query(default=None, pattern="^(json|prometheus)$")) -> Response:  # type: ignore[misc]
+    """JSON service stats; Prometheus text exposition with ?format=prometheus or a text/plain Accept (what scrapers send)."""
+    if _wants_prometheus(request, format):
+        return Response(telemetry.render(), media_type=telemetry.CONTENT_TYPE)
     data = {
         "sse": {
             "active": metrics.active_sse,
@@ -268,46 +406,80 @@ def metrics_endpoint() -> JSONResponse:  # type: ignore[misc]
             "bytes_up": metrics.bytes_up_post,
             "bytes_down": metrics.bytes_down_post,
         },
+        "db": pool_stats(),
+        "db_writer": writer_stats(),
+        "analysis_cache": analysis_cache_info(),
+        "search_cache": search_cache.stats(),
+        "audit": audit_service.stats(),
+        "spec_cache": spec_cache.get_cache().stats(),
+        "mcp_backend": backend_client.stats(),
+        "sse_relay": sse_relay.stats(),
+        "mcp_post": mcp_forwarder.stats(),
+        "db_executor": repository.stats(),
+        "sampler": sampler.stats(),
     }
     return JSONResponse(content=data)
-# Allow CORS for local testing and for ChatGPT/tool tooling. In production you
-# should restrict origins to your hosted manifest / UI origins.
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
 
 
-# Ensure CORS headers are present for static/public/openapi endpoints and
-# handle OPTIONS preflight for them. This complements CORSMiddleware in
-# case a reverse-proxy or static file handler omits the headers.
-@app.middleware("http")
-async def ensure_cors_for_public(request: Request, call_next: Callable[[Request], Awaitable[Response]]) -> Response:
-    path = request.url.path or ""
-    public_prefixes = ("/public", "/openapi.json", "/chatgpt_tool_manifest.json", "/mcp")
-    should_apply = any(path.startswith(p) for p in public_prefixes)
+@app.get("/debug/profiles", dependencies=[Depends(get_api_key)], include_in_schema=False)
+async def debug_profiles(limit: int = Query(default=50, ge=1, le=1000)) -> dict[str, Any]:
+    """Stored request profiles, newest first; request one with X-Profile: 1 or ?profile=1."""
+    profiles = await run_in_threadpool(profiling.list_profiles, limit)
+    return {"enabled": profiling.enabled(), "profiles": profiles}
 
-    # Fast path: respond to OPTIONS preflights for guarded public endpoints
-    if should_apply and request.method.upper() == "OPTIONS":
-        headers = {
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Methods": "GET,POST,OPTIONS,PUT,PATCH,DELETE",
-            "Access-Control-Allow-Headers": "Authorization,Content-Type,X-API-Key,X-Bridge-Key",
-        }
-        return Response(status_code=200, headers=headers)
 
-    resp = await call_next(request)
-
-    if should_apply:
-        # Always ensure these CORS headers are present for public endpoints.
-        resp.headers["Access-Control-Allow-Origin"] = "*"
-        resp.headers["Access-Control-Allow-Methods"] = "GET,POST,OPTIONS,PUT,PATCH,DELETE"
-        resp.headers["Access-Control-Allow-Headers"] = "Authorization,Content-Type,X-API-Key,X-Bridge-Key"
+@app.get("/debug/profiles/{profile_id}", dependencies=[Depends(get_api_key)], include_in_schema=False)
+async def debug_profile(
+    profile_id: str, format: str = Query(default="pstats", pattern="^(pstats|collapsed|text)$")
+) -> Response:
+    """Download a profile as pstats, collapsed stacks (flamegraph input) or a text report."""
+    if format == "text":
+        text = await run_in_threadpool(profiling.report, profile_id)
+        if text is None:
+            raise HTTPException(status_code=404, detail="profile not found")
+        return Response(text, media_type="text/plain; charset=utf-8")
+    path = profiling.profile_file(profile_id, format)
+    if path is None:
+        raise HTTPException(status_code=404, detail="profile not found")
+    content = await anyio.Path(path).read_bytes()
+    media_type = "application/octet-stream" if format == "pstats" else "text/plain; charset=utf-8"
+    headers = {"Content-Disposition": f'attachment; filename="{path.name}"'}
+    return Response(content, media_type=media_type, headers=headers)
+
+
+@app.get("/debug/flamegraph", dependencies=[Depends(get_api_key)], include_in_schema=False)
+async def debug_flamegraph(
+    window: Optional[float] = Query(default=600, gt=0, description="seconds of history"),
+    thread: Optional[str] = None,
+    format: str = Query(default="collapsed", pattern="^(collapsed|json)$"),
+) -> Response:
+    """Process-wide sampled stacks over the last ``window`` seconds.
 
-    return resp
+    Collapsed format (``thread;outer;...;leaf count``) loads in speedscope or
+    flamegraph.pl; json adds the sampler's stats.
+    """
+    s = sampler.get_sampler()
+    if format == "json":
+        counts = await run_in_threadpool(s.counts, window, thread)
+        return JSONResponse({"window": window, "stats": s.stats(), "stacks": counts})
+    return Response(await run_in_threadpool(s.collapsed, window, thread), media_type="text/plain; charset=utf-8")
+
+
+@app.post("/debug/sampler", dependencies=[Depends(get_api_key)], include_in_schema=False)
+def debug_sampler(
+    enabled: Optional[bool] = None, hz: Optional[float] = Query(default=None, gt=0, le=1000), reset: bool = False
+) -> dict[str, Any]:
+    """Start/stop the sampling profiler or change its rate at runtime."""
+    s = sampler.get_sampler()
+    if hz is not None:
+        s.set_rate(hz)
+    if reset:
+        s.reset()
+    if enabled is True:
+        s.start()
+    elif enabled is False:
+        s.stop()
+    return s.stats()
 
 
 def _public_read_protection_enabled() -> bool:
@@ -319,38 +491,15 @@ def _public_read_protection_enabled() -> bool:
     return os.environ.get("REQUIRE_X_API_KEY_FOR_PUBLIC", "false").lower() in ("1", "true", "yes")
 
 
-@app.middleware("http")
-async def require_api_key_for_public_reads(request: Request, call_next: Callable[[Request], Awaitable[Response]]) -> Response:
-    """Optional middleware that enforces X-API-Key on a small set of public/read endpoints.
+def _public_read_key() -> Optional[str]:
+    """X-API-Key required on public/read endpoints, or None when they are open.
 
-    This avoids accidentally exposing the generated manifest/openapi or the MCP proxy
-    when the developer wants to gate them with the same API_KEY used for write endpoints.
+    Uses the same key resolution as get_api_key: ECHO_BRIDGE_API_KEY, then
+    API_KEY, then settings.bridge_key.
     """
-    try:
-        if _public_read_protection_enabled():
-            # Only guard read-style endpoints used by ChatGPT tooling
-            path = request.url.path or ""
-            guarded_prefixes = ("/public/", "/mcp")
-            guarded_exact = ("/public/openapi.json", "/public/chatgpt_tool_manifest.json", "/openapi.json", "/chatgpt_tool_manifest.json", "/mcp/openapi.json")
-            should_guard = False
-            if any(path.startswith(p) for p in guarded_prefixes) or path in guarded_exact:
-                # also allow health/debug endpoints for local inspection
-                if not path.startswith("/health") and not path.startswith("/debug"):
-                    should_guard = True
-
-            if should_guard:
-                # Use the same key resolution as get_api_key: prefer ECHO_BRIDGE_API_KEY,
-                # fall back to API_KEY, then settings.bridge_key
-                expected = os.environ.get("ECHO_BRIDGE_API_KEY") or os.environ.get("API_KEY") or settings.bridge_key
-                # If no expected key configured, treat as unlocked
-                if expected:
-                    header = request.headers.get("x-api-key") or request.headers.get("X-API-Key")
-                    if not header or header != expected:
-                        return JSONResponse(status_code=401, content={"detail": "Missing or invalid X-API-Key"})
-    except Exception:
-        # On unexpected errors, fall through to normal handling so we don't block unrelated endpoints
-        pass
-    return await call_next(request)
+    if not _public_read_protection_enabled():
+        return None
+    return os.environ.get("ECHO_BRIDGE_API_KEY") or os.environ.get("API_KEY") or settings.bridge_key or None
 public_dir = Path(__file__).resolve().parent.parent / "public"
 
 
@@ -394,44 +543,49 @@ def _recursive_replace_origins(obj: Any, new_origin: str) -> Any:
     return obj
 
 
+_SPEC_CORS_HEADERS = {
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Methods": "GET,POST,OPTIONS,PUT,PATCH,DELETE",
+    "Access-Control-Allow-Headers": "Authorization,Content-Type,X-API-Key,X-Bridge-Key",
+}
+
+
+def _spec_response(request: Request, p: Path, rewrite_origins: bool = True, headers: Optional[dict[str, str]] = None) -> Response:
+    """Serve a public JSON file from the spec cache (ETag/304, gzip/brotli).
+
+    With rewrite_origins the URLs are rewritten to PUBLIC_BASE_URL; the value
+    is part of the cache key, so changing it rebuilds the entry.
+    """
+    public = _get_public_base_url() if rewrite_origins else None
+
+    def _load() -> Any:
+        data = _load_json_file(p)
+        return _recursive_replace_origins(data, public) if public else data
+
+    entry = spec_cache.get_cache().get(p, public or "", _load)
+    return spec_cache.respond(spec_cache.get_cache(), request, entry, headers or _SPEC_CORS_HEADERS)
+
+
 @app.get("/public/openapi.json")
-def serve_openapi() -> JSONResponse:
+def serve_openapi(request: Request) -> Response:
     """Serve the public OpenAPI JSON with explicit application/json content-type."""
     p = public_dir / "openapi.json"
     if not p.exists():
         raise HTTPException(status_code=404, detail="openapi.json not found")
     try:
-        data = _load_json_file(p)
-        public = _get_public_base_url()
-        if public:
-            data = _recursive_replace_origins(data, public)
-        headers = {
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Methods": "GET,POST,OPTIONS,PUT,PATCH,DELETE",
-            "Access-Control-Allow-Headers": "Authorization,Content-Type,X-API-Key,X-Bridge-Key",
-        }
-        return JSONResponse(content=data, media_type="application/json", headers=headers)
+        return _spec_response(request, p)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to read openapi.json: {e}")
 
 
 @app.get("/public/chatgpt_tool_manifest.json")
-def serve_manifest() -> JSONResponse:
+def serve_manifest(request: Request) -> Response:
     """Serve the ChatGPT tool manifest with explicit application/json content-type."""
     p = public_dir / "chatgpt_tool_manifest.json"
     if not p.exists():
         raise HTTPException(status_code=404, detail="chatgpt_tool_manifest.json not found")
     try:
-        data = _load_json_file(p)
-        public = _get_public_base_url()
-        if public:
-            data = _recursive_replace_origins(data, public)
-        headers = {
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Methods": "GET,POST,OPTIONS,PUT,PATCH,DELETE",
-            "Access-Control-Allow-Headers": "Authorization,Content-Type,X-API-Key,X-Bridge-Key",
-        }
-        return JSONResponse(content=data, media_type="application/json", headers=headers)
+        return _spec_response(request, p)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to read chatgpt manifest: {e}")
 
@@ -443,38 +597,17 @@ def serve_manifest() -> JSONResponse:
 ## explicit CORS headers and generated-file fallbacks.
 
 
-@app.middleware("http")
-async def public_json_middleware(request: Request, call_next: Callable[[Request], Awaitable[Response]]) -> Response:
-    # Intercept requests for /public/*.json and serve them as JSONResponse
-    # before the StaticFiles mount handles them. This guarantees application/json
-    # content-type even when proxied by tunnels like ngrok.
+def _public_json_response(request: Request) -> Optional[Response]:
+    # Serve /public/*.json ahead of the StaticFiles mount. This guarantees
+    # application/json content-type even when proxied by tunnels like ngrok.
+    rel = request.url.path[len("/public/"):]
+    p = public_dir / rel
+    if not (p.exists() and p.is_file()):
+        return None
     try:
-        path = request.url.path
-        if path.startswith("/public/") and path.lower().endswith(".json"):
-            # Build the file path relative to public_dir (strip leading '/public/')
-            rel = path[len("/public/"):]
-            p = public_dir / rel
-            if p.exists() and p.is_file():
-                try:
-                    data = _load_json_file(p)
-                    headers = {
-                        "Access-Control-Allow-Origin": "*",
-                        "Access-Control-Allow-Methods": "GET,POST,OPTIONS,PUT,PATCH,DELETE",
-                        "Access-Control-Allow-Headers": "Authorization,Content-Type,X-API-Key,X-Bridge-Key",
-                    }
-                    return JSONResponse(content=data, media_type="application/json", headers=headers)
-                except Exception as e:
-                    headers = {
-                        "Access-Control-Allow-Origin": "*",
-                        "Access-Control-Allow-Methods": "GET,POST,OPTIONS,PUT,PATCH,DELETE",
-                        "Access-Control-Allow-Headers": "Authorization,Content-Type,X-API-Key,X-Bridge-Key",
-                    }
-                    return JSONResponse(status_code=500, content={"detail": f"Failed to read JSON: {e}"}, headers=headers)
-    except Exception:
-        # If anything goes wrong here, fall through to normal handling so we
-        # don't block unrelated endpoints.
-        pass
-    return await call_next(request)
+        return _spec_response(request, p, rewrite_origins=False)
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"detail": f"Failed to read JSON: {e}"}, headers=_SPEC_CORS_HEADERS)
 
 
 app.mount(
@@ -484,46 +617,11 @@ app.mount(
 )
 
 
-@app.middleware("http")
-async def asgi_public_cors_middleware(request: Request, call_next):
-    """ASGI middleware to ensure CORS headers on /public responses and
-    to answer preflight OPTIONS requests early.
-    """
-    path = request.url.path or ""
-    # paths we care about
-    public_prefix = "/public"
-    top_openapi = "/openapi.json"
-    top_manifest = "/chatgpt_tool_manifest.json"
-
-    cors_headers = {
-        "Access-Control-Allow-Origin": "*",
-        "Access-Control-Allow-Methods": "GET,POST,OPTIONS,PUT,PATCH,DELETE",
-        "Access-Control-Allow-Headers": "Authorization,Content-Type,X-API-Key,X-Bridge-Key",
-        # allow credentials when needed
-        "Access-Control-Allow-Credentials": "true",
-    }
-
-    # Handle OPTIONS preflight for /public and top-level handlers
-    if request.method.upper() == "OPTIONS" and (
-        path.startswith(public_prefix) or path in (top_openapi, top_manifest)
-    ):
-        return Response(status_code=204, headers=cors_headers)
-
-    # Call the downstream app and then attach headers if the path matches
-    response = await call_next(request)
-    if path.startswith(public_prefix) or path in (top_openapi, top_manifest):
-        for k, v in cors_headers.items():
-            # set only if not present already
-            if k not in response.headers:
-                response.headers[k] = v
-    return response
-
-
 # Serve top-level openapi and chatgpt manifest with explicit CORS headers so
 # external clients (ChatGPT Actions) always get JSON + CORS even if the
 # StaticFiles mount bypasses middleware ordering.
 @app.get("/openapi.json")
-def serve_top_openapi() -> JSONResponse:
+def serve_top_openapi(request: Request) -> Response:
     p = public_dir / "openapi.json"
     if not p.exists():
         # fall back to generated one
@@ -531,44 +629,26 @@ def serve_top_openapi() -> JSONResponse:
     if not p.exists():
         raise HTTPException(status_code=404, detail="openapi.json not found")
     try:
-        data = _load_json_file(p)
-        headers = {
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Methods": "GET,POST,OPTIONS,PUT,PATCH,DELETE",
-            "Access-Control-Allow-Headers": "Authorization,Content-Type,X-API-Key,X-Bridge-Key",
-        }
-        public = _get_public_base_url()
-        if public:
-            data = _recursive_replace_origins(data, public)
-        return JSONResponse(content=data, media_type="application/json", headers=headers)
+        return _spec_response(request, p)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to read openapi.json: {e}")
 
 
 @app.get("/chatgpt_tool_manifest.json")
-def serve_top_manifest() -> JSONResponse:
+def serve_top_manifest(request: Request) -> Response:
     p = public_dir / "chatgpt_tool_manifest.json"
     if not p.exists():
         p = public_dir / "chatgpt_tool_manifest.generated.json"
     if not p.exists():
         raise HTTPException(status_code=404, detail="chatgpt_tool_manifest.json not found")
     try:
-        data = _load_json_file(p)
-        public = _get_public_base_url()
-        if public:
-            data = _recursive_replace_origins(data, public)
-        headers = {
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Methods": "GET,POST,OPTIONS,PUT,PATCH,DELETE",
-            "Access-Control-Allow-Headers": "Authorization,Content-Type,X-API-Key,X-Bridge-Key",
-        }
-        return JSONResponse(content=data, media_type="application/json", headers=headers)
+        return _spec_response(request, p)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to read chatgpt manifest: {e}")
 
 
 @app.get("/public/chatgpt_tool_manifest.json")
-def serve_public_manifest() -> JSONResponse:
+def serve_public_manifest(request: Request) -> Response:
     # Serve the same content for /public/... path to override StaticFiles and guarantee CORS
     p = public_dir / "chatgpt_tool_manifest.json"
     if not p.exists():
@@ -576,17 +656,7 @@ def serve_public_manifest() -> JSONResponse:
     if not p.exists():
         raise HTTPException(status_code=404, detail="chatgpt_tool_manifest.json not found")
     try:
-        data = _load_json_file(p)
-        public = _get_public_base_url()
-        if public:
-            data = _recursive_replace_origins(data, public)
-        headers = {
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Methods": "GET,POST,OPTIONS,PUT,PATCH,DELETE",
-            "Access-Control-Allow-Headers": "Authorization,Content-Type,X-API-Key,X-Bridge-Key",
-            "Access-Control-Allow-Credentials": "true",
-        }
-        return JSONResponse(content=data, media_type="application/json", headers=headers)
+        return _spec_response(request, p, headers={**_SPEC_CORS_HEADERS, "Access-Control-Allow-Credentials": "true"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to read public chatgpt manifest: {e}")
 
@@ -687,10 +757,33 @@ if mount_mcp:
     # the main bridge to serve (notably /mcp/openapi.json).
     logger.info("fastmcp.fastapi.mount_mcp available but intentionally skipped to preserve /mcp routes")
 
+class _MCPHttpApp:
+    """Mountable handle on the FastMCP http_app.
+
+    The FastMCP session manager runs inside the app's lifespan and can only be
+    started once per instance, so every bridge lifespan starts a fresh app.
+    """
+
+    def __init__(self) -> None:
+        self.app = mcp_server.http_app(path="/", stateless_http=True)
+        self._started = False
+
+    def lifespan(self) -> Any:
+        if self._started:
+            self.app = mcp_server.http_app(path="/", stateless_http=True)
+        self._started = True
+        return self.app.router.lifespan_context(self.app)
+
+    async def __call__(self, scope: Any, receive: Any, send: Any) -> None:
+        await self.app(scope, receive, send)
+
+
+mcp_http_app: Optional[_MCPHttpApp] = None
+
 # Create FastMCP ASGI app and mount it under /mcp_app (stateless for embedding)
 if not mounted:
     try:
-        sub_app = mcp_server.http_app(path="/", stateless_http=True)
+        mcp_http_app = sub_app = _MCPHttpApp()
         # Wrap the MCP sub_app so we can serve a dynamic /openapi.json from the mounted app
         try:
             wrapper = FastAPI()
@@ -716,31 +809,14 @@ if not mounted:
         logger.error(f"failed to mount mcp http_app fallback: {e}")
 
 
-@app.middleware("http")
-async def logging_middleware(
-    request: Request,
-    call_next: Callable[[Request], Awaitable[Response]],
-) -> Response:
-    start = perf_counter()
-    outcome = "error"
-    try:
-        response = await call_next(request)  # type: ignore[no-any-return]
-        outcome = "success" if response.status_code < 400 else "error"
-    except Exception:
-        outcome = "exception"
-        raise
-    finally:
-        duration = perf_counter() - start
-        logger.info(
-            "request",
-            extra={
-                "path": request.url.path,
-                "method": request.method,
-                "duration_ms": int(duration * 1000),
-                "outcome": outcome,
-            },
-        )
-    return response
+# One pure-ASGI layer for CORS, the public-read key check, /public/*.json and
+# access logging; streamed responses pass through it unbuffered.
+app.add_middleware(
+    BridgeMiddleware,
+    json_handler=_public_json_response,
+    expected_key=_public_read_key,
+    logger=logger,
+)
 
 
 @app.get("/health", response_model=Health)
@@ -764,12 +840,9 @@ def healthz() -> dict[str, Any]:
     
     # Check database connectivity
     try:
-        conn = get_conn()
-        cursor = conn.cursor()
-        cursor.execute("SELECT 1")
-        result = cursor.fetchone()
-        conn.close()
-        
+        with connection() as conn:
+            result = conn.execute("SELECT 1").fetchone()
+
         if result and result[0] == 1:
             health_status["components"]["database"] = {
                 "status": "healthy",
@@ -831,96 +904,193 @@ def healthz() -> dict[str, Any]:
 
 
 @app.post("/ingest/text", response_model=IngestResponse, dependencies=[Depends(get_api_key)])
-def ingest_text(req: IngestRequest) -> IngestResponse:
+async def ingest_text(req: IngestRequest) -> IngestResponse:
     meta = req.meta or {}
     if req.tags:
         meta["tags"] = req.tags
-    added = add_chunks(req.source, req.title, req.texts, meta)
+    added = await repository.add_chunks(req.source, req.title, req.texts, meta)
     return IngestResponse(added=added)
 
 
 @app.post("/ingest", response_model=IngestResponse, dependencies=[Depends(get_api_key)])
-def ingest(req: IngestRequest) -> IngestResponse:
+async def ingest(req: IngestRequest) -> IngestResponse:
     # generic ingest endpoint
     meta = req.meta or {}
     if req.tags:
         meta["tags"] = req.tags
-    added = add_chunks(req.source, req.title, req.texts, meta)
+    added = await repository.add_chunks(req.source, req.title, req.texts, meta)
     return IngestResponse(added=added)
 
 
+def _bulk_line_records(obj: Any) -> list[NewChunk]:
+    """Turn one NDJSON object into chunk records; raises ValueError when malformed."""
+    if not isinstance(obj, dict):
+        raise ValueError("expected a JSON object")
+    source = obj.get("source")
+    if not isinstance(source, str) or not source:
+        raise ValueError("missing 'source'")
+    title = obj.get("title")
+    if title is not None and not isinstance(title, str):
+        raise ValueError("'title' must be a string")
+    texts_any: Any = obj.get("texts")
+    if texts_any is None:
+        texts_any = [obj.get("text")]
+    if not isinstance(texts_any, list) or not all(isinstance(t, str) for t in texts_any):
+        raise ValueError("'text' or 'texts' must be string(s)")
+    meta_any: Any = obj.get("meta")
+    if meta_any is not None and not isinstance(meta_any, dict):
+        raise ValueError("'meta' must be an object")
+    meta: dict[str, Any] | None = meta_any
+    tags = obj.get("tags")
+    if isinstance(tags, list):
+        meta = {**(meta or {}), "tags": [str(t) for t in tags]}
+    return [NewChunk(source, title, t, meta) for t in texts_any if t]
+
+
+@app.post("/ingest/bulk", response_model=BulkIngestResponse, dependencies=[Depends(get_api_key)])
+async def ingest_bulk(
+    request: Request,
+    batch_size: int = Query(1000, ge=1, le=20000),
+    defer_fts: bool = Query(False, description="Swap the FTS trigger for one insert per batch; for offline loads only"),
+) -> BulkIngestResponse:
+    """Stream-ingest NDJSON: one {source, title?, text | texts, tags?, meta?} object per line.
+
+    Lines are parsed as they arrive and written in batches of `batch_size`,
+    each batch in one transaction. Malformed lines are skipped and reported.
+    `defer_fts` drops and recreates the FTS trigger inside each batch, which
+    is a schema change in the shared write transaction and makes every reader
+    re-prepare; leave it off while the server is serving searches.
+    A line longer than `ingest.max_line_bytes` ends the request with 413;
+    the lines before it are still ingested.
+    """
+    added = 0
+    skipped = 0
+    errors: list[str] = []
+    pending: list[NewChunk] = []
+    buf = b""
+    line_no = 0
+    max_line = settings.ingest_max_line_bytes
+
+    async def _flush() -> None:
+        nonlocal added
+        if not pending:
+            return
+        batch = list(pending)
+        pending.clear()
+        added += await repository.add_chunk_records(batch, batch_size=len(batch), defer_fts=defer_fts)
+
+    def _take(line: bytes) -> None:
+        nonlocal skipped, line_no
+        line_no += 1
+        line = line.strip()
+        if not line:
+            return
+        try:
+            pending.extend(_bulk_line_records(json.loads(line)))
+        except ValueError as e:  # JSONDecodeError is a ValueError
+            skipped += 1
+            if len(errors) < 20:
+                errors.append(f"line {line_no}: {e}")
+
+    async def _too_long() -> None:
+        await _flush()
+        raise HTTPException(
+            status_code=413,
+            detail=f"line {line_no + 1} exceeds {max_line} bytes; {added} chunks from earlier lines were ingested",
+        )
+
+    async for chunk in request.stream():
+        buf += chunk
+        if b"\n" in chunk:
+            *lines, buf = buf.split(b"\n")
+            for line in lines:
+                if len(line) > max_line:
+                    await _too_long()
+                _take(line)
+        if len(buf) > max_line:
+            await _too_long()
+        if len(pending) >= batch_size:
+            await _flush()
+    _take(buf)
+    await _flush()
+    return BulkIngestResponse(added=added, skipped=skipped, errors=errors)
+
+
+@app.post("/dedupe", dependencies=[Depends(get_api_key)])
+def dedupe_start(threshold: float = Query(0.9, gt=0.0, le=1.0)) -> dict[str, Any]:
+    """Start the background near-duplicate sweep over all chunks (records meta.dup_of)."""
+    return minhash.start_dedupe_job(threshold=threshold)
+
+
+@app.get("/dedupe")
+def dedupe_status() -> dict[str, Any]:
+    return minhash.job_status()
+
+
 @app.post("/seed", dependencies=[Depends(get_api_key)])
 def seed_demo_data() -> dict[str, Any]:
     """
     Populate database with sample notes, tags, and references for testing/demo.
     Idempotent: checks for existing data before inserting.
     """
-    try:
-        conn = get_conn()
+    # Sample demo notes
+    demo_notes = [
+        {
+            "title": "Getting Started with Toobix",
+            "text": "Toobix is a local-first life management platform. It emphasizes privacy, [[federation]], and [[plugin architecture]]. Start by creating your first note!",
+            "tags": ["tutorial", "getting-started"]
+        },
+        {
+            "title": "Plugin Architecture",
+            "text": "The plugin system allows hot-reload of modules. Plugins can extend [[Notes]], [[Tasks]], and [[Calendar]] functionality. Written in TypeScript with clear API boundaries.",
+            "tags": ["architecture", "plugins"]
+        },
+        {
+            "title": "Federation Concepts",
+            "text": "Toobix uses simplified [[ActivityPub]] or [[AT Protocol]] for federation. Your data stays local, but you can selectively share with trusted peers. [[DID]]-based identity.",
+            "tags": ["federation", "privacy"]
+        },
+        {
+            "title": "Local-First Philosophy",
+            "text": "All data lives in SQLite on your machine. No mandatory cloud sync. Optional backup to S3-compatible storage using [[Litestream]]. You own your data.",
+            "tags": ["philosophy", "local-first"]
+        },
+        {
+            "title": "AI Integration",
+            "text": "Use [[Ollama]] for local LLM inference or connect to cloud providers like Groq. AI features: semantic search, auto-tagging, summary generation, and more.",
+            "tags": ["ai", "ollama", "features"]
+        },
+        {
+            "title": "Daily Notes",
+            "text": "Create daily notes with YYYY-MM-DD format. Backlinks automatically connect related concepts. Use templates for recurring structures.",
+            "tags": ["notes", "daily-notes"]
+        },
+        {
+            "title": "Graph Visualization",
+            "text": "See connections between notes with [[D3.js]] or [[Cytoscape.js]]. Filter by tags, date range, or link types. Explore knowledge visually.",
+            "tags": ["visualization", "graph"]
+        },
+        {
+            "title": "Search Capabilities",
+            "text": "Full-text search powered by [[Orama]]. Semantic search with embeddings. Search across notes, tasks, and calendar events instantly.",
+            "tags": ["search", "features"]
+        }
+    ]
+
+    # Embed before the write job, as add_chunk_records does; the writer only inserts
+    vectors = embedder.embed_all(note["text"] for note in demo_notes)
+
+    def _seed(conn: Any) -> tuple[int, int, int]:
+        """Check and insert in one write job so concurrent seeds cannot both insert."""
         cursor = conn.cursor()
-        
-        # Check if we already have demo data
         cursor.execute("SELECT COUNT(*) FROM chunks WHERE doc_source = 'demo_seed'")
         existing_count = cursor.fetchone()[0]
-        
         if existing_count > 0:
-            conn.close()
-            return {
-                "status": "skipped",
-                "message": f"Demo data already exists ({existing_count} chunks with source 'demo_seed')",
-                "chunks_added": 0,
-                "tags_added": 0
-            }
-        
-        # Sample demo notes
-        demo_notes = [
-            {
-                "title": "Getting Started with Toobix",
-                "text": "Toobix is a local-first life management platform. It emphasizes privacy, [[federation]], and [[plugin architecture]]. Start by creating your first note!",
-                "tags": ["tutorial", "getting-started"]
-            },
-            {
-                "title": "Plugin Architecture",
-                "text": "The plugin system allows hot-reload of modules. Plugins can extend [[Notes]], [[Tasks]], and [[Calendar]] functionality. Written in TypeScript with clear API boundaries.",
-                "tags": ["architecture", "plugins"]
-            },
-            {
-                "title": "Federation Concepts",
-                "text": "Toobix uses simplified [[ActivityPub]] or [[AT Protocol]] for federation. Your data stays local, but you can selectively share with trusted peers. [[DID]]-based identity.",
-                "tags": ["federation", "privacy"]
-            },
-            {
-                "title": "Local-First Philosophy",
-                "text": "All data lives in SQLite on your machine. No mandatory cloud sync. Optional backup to S3-compatible storage using [[Litestream]]. You own your data.",
-                "tags": ["philosophy", "local-first"]
-            },
-            {
-                "title": "AI Integration",
-                "text": "Use [[Ollama]] for local LLM inference or connect to cloud providers like Groq. AI features: semantic search, auto-tagging, summary generation, and more.",
-                "tags": ["ai", "ollama", "features"]
-            },
-            {
-                "title": "Daily Notes",
-                "text": "Create daily notes with YYYY-MM-DD format. Backlinks automatically connect related concepts. Use templates for recurring structures.",
-                "tags": ["notes", "daily-notes"]
-            },
-            {
-                "title": "Graph Visualization",
-                "text": "See connections between notes with [[D3.js]] or [[Cytoscape.js]]. Filter by tags, date range, or link types. Explore knowledge visually.",
-                "tags": ["visualization", "graph"]
-            },
-            {
-                "title": "Search Capabilities",
-                "text": "Full-text search powered by [[Orama]]. Semantic search with embeddings. Search across notes, tasks, and calendar events instantly.",
-                "tags": ["search", "features"]
-            }
-        ]
-        
+            return existing_count, 0, 0
         chunks_added = 0
         tags_added = 0
-        
         # Insert demo notes
-        for note in demo_notes:
+        for note, vec in zip(demo_notes, vectors):
             # Insert chunk
             cursor.execute(
                 "INSERT INTO chunks (doc_source, doc_title, text, meta_json) VALUES (?, ?, ?, ?)",
@@ -928,28 +1098,38 @@ def seed_demo_data() -> dict[str, Any]:
             )
             chunk_id = cursor.lastrowid
             chunks_added += 1
-            
+            embedder.store_vectors(cursor, [(chunk_id, vec)])
+
             # Insert tags
             for tag_name in note["tags"]:
                 # Get or create tag
                 cursor.execute("SELECT id FROM tags WHERE name = ?", (tag_name,))
                 tag_row = cursor.fetchone()
-                
+
                 if tag_row:
                     tag_id = tag_row[0]
                 else:
                     cursor.execute("INSERT INTO tags (name) VALUES (?)", (tag_name,))
                     tag_id = cursor.lastrowid
                     tags_added += 1
-                
+
                 # Link chunk to tag
                 cursor.execute(
                     "INSERT OR IGNORE INTO chunk_tags (chunk_id, tag_id) VALUES (?, ?)",
                     (chunk_id, tag_id)
                 )
-        
-        conn.commit()
-        conn.close()
+        return 0, chunks_added, tags_added
+
+    try:
+        existing_count, chunks_added, tags_added = write(_seed)
+        if existing_count > 0:
+            return {
+                "status": "skipped",
+                "message": f"Demo data already exists ({existing_count} chunks with source 'demo_seed')",
+                "chunks_added": 0,
+                "tags_added": 0
+            }
+        search_cache.bump_generation()
         
         logger.info(f"Seeded database: {chunks_added} chunks, {tags_added} new tags")
         
@@ -966,57 +1146,86 @@ def seed_demo_data() -> dict[str, Any]:
         raise HTTPException(status_code=500, detail=f"Seed failed: {str(e)}")
 
 
+def search_filters(
+    source: Optional[str] = Query(default=None, description="Only chunks with this doc_source"),
+    tag: list[str] = Query(default=[], description="Only chunks carrying every given tag"),
+    since: Optional[str] = Query(default=None, description="Inclusive lower bound on ts (ISO 8601 or epoch seconds)"),
+    until: Optional[str] = Query(default=None, description="Exclusive upper bound on ts (ISO 8601 or epoch seconds)"),
+) -> SearchFilters:
+    try:
+        return SearchFilters.parse(source=source, tags=tag, since=since, until=until)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @app.get("/search", response_model=SearchResponse)
-def search_route(q: str = Query(...), k: int = Query(5, ge=1, le=50)) -> SearchResponse:
-    hits = search(q, k)
-    return SearchResponse(hits=hits)
+async def search_route(
+    q: str = Query(...),
+    k: int = Query(5, ge=1, le=50),
+    filters: SearchFilters = Depends(search_filters),
+    cursor: Optional[str] = Query(default=None, description="next_cursor of the previous page"),
+    mode: str = Query("lexical", pattern="^(lexical|hybrid)$", description="hybrid fuses BM25 and embedding similarity"),
+) -> SearchResponse:
+    try:
+        if mode == "hybrid":
+            if cursor:
+                raise ValueError("cursor is not supported with mode=hybrid")
+            return SearchResponse(hits=await repository.hybrid_search(q, k, filters))
+        hits, next_cursor = await repository.search_page(q, k, filters, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return SearchResponse(hits=hits, next_cursor=next_cursor)
 
 
 @app.get("/chunks/{id}", response_model=ChunkResponse)
-def get_chunk_route(id: int) -> ChunkResponse:
-    c = get_chunk(id)
+async def get_chunk_route(id: int) -> ChunkResponse:
+    c = await repository.get_chunk(id)
     if not c:
         raise HTTPException(status_code=404, detail="Not found")
     return ChunkResponse(**c.model_dump())
 
 
 @app.get("/resources")
-def list_resources(q: Optional[str] = Query(default=None), limit: int = Query(default=20, ge=1, le=200)) -> Any:
+async def list_resources(
+    q: Optional[str] = Query(default=None),
+    limit: int = Query(default=20, ge=1, le=200),
+    filters: SearchFilters = Depends(search_filters),
+    cursor: Optional[str] = Query(default=None),
+) -> Any:
     """List stored resources (chunks).
 
     If `q` is provided, perform a search using the existing `search()` function
     and return matching hits. Otherwise return a simple listing of recent chunks
-    (id, title, source).
+    (id, title, source). Both honour the source/tag/since/until filters and
+    return `next_cursor` when more results exist.
     """
     try:
         if q:
-            hits = search(q, k=limit)
+            hits, next_cursor = await repository.search_page(q, limit, filters, cursor)
             # convert Hit models to serializable dicts
-            return {"hits": [h.model_dump() for h in hits]}
+            return {"hits": [h.model_dump() for h in hits], "next_cursor": next_cursor}
         # No query: list recent chunks from the DB
-        conn = get_conn()
-        cur = conn.cursor()
-        cur.execute("SELECT id, doc_title AS title, doc_source AS source, ts FROM chunks ORDER BY ts DESC LIMIT ?", (limit,))
-        rows = cur.fetchall()
-        items = [{"id": r["id"], "title": r["title"], "source": r["source"], "ts": r["ts"]} for r in rows]
-        return {"items": items}
+        items, next_cursor = await repository.list_chunks(limit, filters, cursor)
+        return {"items": items, "next_cursor": next_cursor}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/resources/{id}")
-def open_resource(id: int) -> Any:
+async def open_resource(id: int) -> Any:
     """Open a resource (chunk) by id. Returns full chunk with text and meta."""
-    c = get_chunk(id)
+    c = await repository.get_chunk(id)
     if not c:
         raise HTTPException(status_code=404, detail="Not found")
     return c.model_dump()
 
 
 @app.get("/fs/list")
-def fs_list(subdir: Optional[str] = Query(default=None)) -> Any:
+async def fs_list(subdir: Optional[str] = Query(default=None)) -> Any:
     try:
-        items = list_dir(settings.workspace_dir, subdir)
+        items = await repository.list_dir(settings.workspace_dir, subdir)
         return {"items": items}
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="Directory not found")
@@ -1027,9 +1236,9 @@ def fs_list(subdir: Optional[str] = Query(default=None)) -> Any:
 
 
 @app.get("/fs/read")
-def fs_read(path: str = Query(...)) -> Any:
+async def fs_read(path: str = Query(...)) -> Any:
     try:
-        data = read_file(settings.workspace_dir, path)
+        data = await repository.read_file(settings.workspace_dir, path)
         return {"path": path, "text": data}
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="Not found")
@@ -1040,7 +1249,7 @@ def fs_read(path: str = Query(...)) -> Any:
 
 
 @app.post("/actions/run", response_model=ActionResponse, dependencies=[Depends(get_api_key)])
-def actions_run(req: ActionRequest) -> ActionResponse:
+async def actions_run(req: ActionRequest) -> ActionResponse:
     try:
         policy = Policy(s1=settings.ai_s1, s2=settings.ai_s2, s3=settings.ai_s3)
         soul = get_soul()
@@ -1052,9 +1261,9 @@ def actions_run(req: ActionRequest) -> ActionResponse:
             confirm_flag = req.confirm if req.confirm is not None else bool(req.args.get("confirm", False))
             if requires_confirm and not confirm_flag:
                 raise PreconditionFailed("Write requires confirmation")
-        result = dispatch(req.command, req.args, policy, tier_mode=req.tier_mode, tiers_cfg=settings.ai_tiers)
+        result = await repository.dispatch(req.command, req.args, policy, tier_mode=req.tier_mode, tiers_cfg=settings.ai_tiers)
         try:
-            soul.append_event(f"actions.run:{req.command}", req.args, result, consent_checked=consent_checked)
+            await run_in_threadpool(soul.append_event, f"actions.run:{req.command}", req.args, result, consent_checked=consent_checked)
         except Exception:
             pass
         return ActionResponse(ok=True, result=result)
@@ -1074,14 +1283,14 @@ class ChatGPTIngest(BaseModel):
 
 
 @app.post("/ingest/chatgpt", response_model=IngestResponse, dependencies=[Depends(get_api_key)])
-def ingest_chatgpt(req: ChatGPTIngest) -> IngestResponse:
+async def ingest_chatgpt(req: ChatGPTIngest) -> IngestResponse:
     # Extract message contents as texts
     texts: list[str] = []
     for m in req.messages:
         content = m.get("content")
         if isinstance(content, str):
             texts.append(content)
-    added = add_chunks(req.source, req.title, texts, req.meta)
+    added = await repository.add_chunks(req.source, req.title, texts, req.meta)
     return IngestResponse(added=added)
 
 
@@ -1126,9 +1335,24 @@ def bridge_echo_generate(
 
 
 @app.get("/soul/state")
-def soul_state() -> Any:
+def soul_state(tail: int = Query(20, ge=0, le=200, description="Number of recent timeline events")) -> Any:
     s = get_soul()
-    return {"mood": s.get_mood(), "policies": s.policies}
+    return {"mood": s.get_mood(), "policies": s.policies, "recent": s.recent_events(tail)}
+
+
+@app.get("/soul/timeline")
+def soul_timeline(
+    since: Optional[str] = Query(default=None, description="ISO 8601 or epoch seconds, inclusive"),
+    until: Optional[str] = Query(default=None, description="ISO 8601 or epoch seconds, exclusive"),
+    action: Optional[str] = Query(default=None, description="Action name (e.g. actions.run:memory.add) or event kind"),
+    limit: int = Query(100, ge=1, le=1000),
+) -> Any:
+    """Timeline events, oldest first: the first `limit` after `since`, or the latest `limit`."""
+    try:
+        events = get_soul().timeline(since=parse_time(since), until=parse_time(until), action=action, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"events": events, "count": len(events)}
 
 
 @app.get("/soul/rituals")
@@ -1191,25 +1415,24 @@ def _backend_mcp_base() -> str:
 #############################
 
 # Hop-by-hop headers per RFC 7230 we never forward directly
-_HOP_BY_HOP = {"connection", "keep-alive", "proxy-authenticate", "proxy-authorization", "te", "trailer", "transfer-encoding", "upgrade"}
-
-def _filter_response_headers(h: dict[str, str]) -> dict[str, str]:
-    """Remove hop-by-hop headers (RFC 7230)."""
-    return {k: v for k, v in h.items() if k.lower() not in _HOP_BY_HOP}
-
 def _forward_request_headers(req: Request) -> dict[str, str]:
     """Whitelist and normalize headers we forward to backend."""
-    allowed = {"accept", "content-type", "authorization", "x-api-key", "x-bridge-key"}
     out: Dict[str, str] = {}
     for k, v in req.headers.items():
-        if k.lower() in allowed:
+        if k.lower() in mcp_forwarder.FORWARDED_REQUEST_HEADERS:
             out[k] = v
     if "accept" in req.headers and "text/event-stream" in req.headers.get("accept", ""):
         out["Accept"] = req.headers["accept"]
     return out
 
 BACKEND_MCP_URL = "http://127.0.0.1:3339/mcp"
-HEARTBEAT_SECS = float(os.environ.get("MCP_SSE_HEARTBEAT_SECS", "25")) if os.environ.get("MCP_SSE_HEARTBEAT_SECS") else 0.0
+
+
+def _mcp_in_process() -> bool:
+    """True when /mcp is served by the in-process FastMCP app (mcp.mode or MCP_MODE)."""
+    mode = os.environ.get("MCP_MODE") or settings.mcp_mode
+    return mode.lower() == "inprocess" and mcp_http_app is not None
+
 MAX_RETRIES = int(os.environ.get("MCP_BACKEND_RETRIES", "3"))
 BACKOFF_BASE = float(os.environ.get("MCP_BACKEND_BACKOFF_BASE", "0.3"))
 
@@ -1228,7 +1451,7 @@ async def _retry_backoff(func: Callable[[], Awaitable[Any]]):
     raise RuntimeError("retry logic failed without exception")
 
 @app.get("/mcp", name="mcp_sse", operation_id="mcp_sse_stream")
-async def mcp_get_sse(request: Request):  # Returning either JSONResponse or StreamingResponse
+async def mcp_get_sse(request: Request):  # Returning either JSONResponse or SSERelayResponse
         """SSE pass-through.
 
         Behavior:
@@ -1269,123 +1492,85 @@ async def mcp_get_sse(request: Request):  # Returning either JSONResponse or Str
                 )
             raise HTTPException(status_code=406, detail="Missing Accept: text/event-stream for SSE endpoint")
 
-        fwd_headers = _forward_request_headers(request)
         metrics.started_sse += 1
         metrics.active_sse += 1
-
-        async def sse_iterator() -> AsyncGenerator[bytes, None]:
-            try:
-                async with httpx.AsyncClient(timeout=None) as client:
-                    async def _open():
-                        return client.stream("GET", BACKEND_MCP_URL, headers=fwd_headers)
-                    stream_ctx = await _retry_backoff(_open)  # type: ignore[arg-type]
-                    async with stream_ctx as resp:
-                        if resp.status_code != 200:
-                            yield f"event: error\ndata: backend status {resp.status_code}\n\n".encode()
-                            return
-                        try:
-                            last_send = perf_counter()
-                            async for chunk in resp.aiter_raw():
-                                now = perf_counter()
-                                if HEARTBEAT_SECS and (now - last_send) >= HEARTBEAT_SECS:
-                                    yield b": heartbeat\n\n"
-                                    last_send = now
-                                if chunk:
-                                    yield chunk
-                                    last_send = perf_counter()
-                                elif HEARTBEAT_SECS and (now - last_send) >= HEARTBEAT_SECS:
-                                    yield b": heartbeat\n\n"
-                                    last_send = perf_counter()
-                        except (httpx.RemoteProtocolError, httpx.ReadError):
-                            logger.info("mcp SSE: backend stream terminated")
-                        except (ConnectionResetError, asyncio.CancelledError):
-                            logger.info("mcp SSE: client or connection reset")
-                            metrics.aborted_sse += 1
-                        except Exception as e:  # noqa: BLE001
-                            logger.warning("mcp SSE: unexpected stream error: %s", e)
-                            metrics.aborted_sse += 1
-            except (anyio.ClosedResourceError, asyncio.CancelledError, ConnectionResetError):  # type: ignore[name-defined]
-                logger.info("mcp SSE: client disconnected early")
-                metrics.aborted_sse += 1
-            except Exception as e:  # noqa: BLE001
-                logger.warning("mcp SSE: outer error: %s", e)
-                metrics.aborted_sse += 1
-            finally:
+        if _mcp_in_process():
+            def on_inprocess_close(timing: mcp_forwarder.Timing, error: Optional[str]) -> None:
+                if error:
+                    metrics.aborted_sse += 1
                 metrics.active_sse -= 1
                 metrics.completed_sse += 1
 
+            return mcp_forwarder.InProcessResponse(mcp_http_app, on_close=on_inprocess_close)
+
+        fwd_headers = _forward_request_headers(request)
+
+        async def open_backend() -> httpx.Response:
+            client = backend_client.get_client()
+            req = client.build_request("GET", BACKEND_MCP_URL, headers=fwd_headers)
+            return await _retry_backoff(lambda: client.send(req, stream=True))
+
+        def on_close(stream: sse_relay.StreamStats) -> None:
+            if stream.outcome != "completed":
+                logger.info("mcp SSE: stream %d ended (%s)", stream.id, stream.outcome)
+                metrics.aborted_sse += 1
+            metrics.active_sse -= 1
+            metrics.completed_sse += 1
+
         headers = {
             "Cache-Control": "no-cache",
             "Connection": "keep-alive",
             "X-Accel-Buffering": "no",
             "Access-Control-Allow-Origin": "*",
         }
-        return StreamingResponse(sse_iterator(), media_type="text/event-stream", headers=headers)
+        return sse_relay.SSERelayResponse(open_backend, headers=headers, on_close=on_close)
 
 
 @app.post("/mcp", name="mcp_stream_post", operation_id="mcp_post_stream")
-async def mcp_post_stream(request: Request) -> StreamingResponse:
-    """Bidirectional streaming proxy for POST /mcp.
+async def mcp_post_stream(request: Request) -> Response:
+    """Forward a JSON-RPC POST /mcp call to the backend.
 
-    Streams request body to backend and yields backend response chunks without buffering.
+    Relays the backend status, headers and body unbuffered; see
+    services.mcp_forwarder for retries, coalescing and timing.
     """
-    fwd_headers = _forward_request_headers(request)
-
     metrics.started_post += 1
     metrics.active_post += 1
-    async def req_body_iter() -> AsyncGenerator[bytes, None]:
-        try:
-            async for chunk in request.stream():  # type: ignore[attr-defined]
-                if chunk:
-                    metrics.bytes_up_post += len(chunk)
-                    yield chunk
-        except (anyio.ClosedResourceError, asyncio.CancelledError, ConnectionResetError):  # type: ignore[name-defined]
-            logger.info("mcp POST: client upload aborted")
-            metrics.aborted_post += 1
-        except Exception as e:  # noqa: BLE001
-            logger.warning("mcp POST: upload stream error: %s", e)
+
+    def on_chunk(n: int) -> None:
+        if n < 0:
+            metrics.bytes_up_post -= n
+        else:
+            metrics.bytes_down_post += n
+
+    def on_close(timing: mcp_forwarder.Timing, error: Optional[str]) -> None:
+        if error:
+            logger.warning("mcp POST: %s", error)
             metrics.aborted_post += 1
+        metrics.active_post -= 1
+        metrics.completed_post += 1
+
+    if _mcp_in_process():
+        return mcp_forwarder.InProcessResponse(mcp_http_app, on_chunk=on_chunk, on_close=on_close)
 
+    fwd_headers = _forward_request_headers(request)
     try:
-        client = httpx.AsyncClient(timeout=None)
-        async def _open_post():  # returns context manager
-            return client.stream("POST", BACKEND_MCP_URL, headers=fwd_headers, content=req_body_iter())
-        resp_ctx = await _retry_backoff(_open_post)  # type: ignore[arg-type]
+        body, stream = await mcp_forwarder.read_body(request)
     except Exception as e:  # noqa: BLE001
-        raise HTTPException(status_code=502, detail=f"Failed to connect backend: {e}")
-
-    async def response_iter() -> AsyncGenerator[bytes, None]:
-        try:
-            async with resp_ctx as resp:
-                status = resp.status_code
-                # Filter headers once we have them; yield body regardless
-                preserved = _filter_response_headers({k: v for k, v in resp.headers.items()})
-                # Force pass-through friendly defaults (no buffering hints)
-                preserved.setdefault("Cache-Control", "no-cache")
-                preserved.setdefault("Connection", "keep-alive")
-                preserved["Access-Control-Allow-Origin"] = "*"
-                # Attach headers object outside by closure trick
-                response_iter.preserved_headers = preserved  # type: ignore[attr-defined]
-                response_iter.status_code = status  # type: ignore[attr-defined]
-                async for chunk in resp.aiter_raw():
-                    if chunk:
-                        metrics.bytes_down_post += len(chunk)
-                        yield chunk
-        except (anyio.ClosedResourceError, asyncio.CancelledError, ConnectionResetError):  # type: ignore[name-defined]
-            logger.info("mcp POST: downstream client disconnected")
-            metrics.aborted_post += 1
-        except Exception as e:  # noqa: BLE001
-            logger.warning("mcp POST: response stream error: %s", e)
-            metrics.aborted_post += 1
-        finally:
-            await client.aclose()
-            metrics.active_post -= 1
-            metrics.completed_post += 1
-
-    # Prime an async generator wrapper to capture headers & status lazily
-    gen = response_iter()
-    # Headers/status set inside generator before first body chunk; FastAPI sends defaults until then.
-    return StreamingResponse(gen, media_type="application/octet-stream")
+        logger.info("mcp POST: client upload aborted: %s", e)
+        on_close(mcp_forwarder.Timing(), str(e))
+        raise HTTPException(status_code=400, detail="request body aborted")
+    if body is not None:
+        metrics.bytes_up_post += len(body)
+
+    return mcp_forwarder.MCPForwardResponse(
+        backend_client.get_client(),
+        BACKEND_MCP_URL,
+        fwd_headers,
+        body,
+        stream,
+        on_chunk=on_chunk,
+        on_close=on_close,
+    )
 
 # NOTE: Recommended Uvicorn launch for streaming stability:
 #   uvicorn echo_bridge.main:app --host 127.0.0.1 --port 3333 --http h11 --workers 1
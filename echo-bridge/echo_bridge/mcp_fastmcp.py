@@ -21,30 +21,32 @@ from fastmcp.server.auth.auth import (
     TokenVerifier,
 )
 
-from .main import settings
-from .services.memory_service import search as mem_search, add_chunks
-from .services.fs_service import list_dir as fs_list, read_file as fs_read
-from .services.actions_service import dispatch as actions_dispatch
+from . import profiling
+from .main import expected_bridge_key, settings
+from .mcp_setup import ToolMetrics, ToolProfiling
+from .services import repository
 from .ai.brain import Policy
 
 # Default server used for tool registration and tests (no auth by default)
 mcp: FastMCP = FastMCP("ECHO Bridge MCP")
+mcp.add_middleware(ToolMetrics())
+mcp.add_middleware(ToolProfiling())
 
 
 @mcp.tool
-def memory_search(query: str, k: int = 5) -> list[dict[str, Any]]:
+async def memory_search(query: str, k: int = 5) -> list[dict[str, Any]]:
     """Full-text search over local memory (SQLite FTS5). Returns ranked hits.
 
     Arguments:
     - query: search string
     - k: max number of hits (default 5)
     """
-    hits = mem_search(query, k)
+    hits = await repository.search(query, k)
     return [h.model_dump() for h in hits]
 
 
 @mcp.tool
-def memory_add(
+async def memory_add(
     source: str,
     title: Optional[str] = None,
     texts: list[str] = [],
@@ -62,26 +64,26 @@ def memory_add(
     """
     if not key or key != settings.bridge_key:
         raise PermissionError("Missing or invalid key")
-    n = add_chunks(source, title, texts, meta)
+    n = await repository.add_chunks(source, title, texts, meta)
     return {"inserted": n}
 
 
 @mcp.tool
-def fs_list_tool(subdir: Optional[str] = None) -> dict[str, Any]:
+async def fs_list_tool(subdir: Optional[str] = None) -> dict[str, Any]:
     """List files within the sandboxed workspace directory."""
-    items = fs_list(settings.workspace_dir, subdir)
+    items = await repository.list_dir(settings.workspace_dir, subdir)
     return {"items": items}
 
 
 @mcp.tool
-def fs_read_tool(path: str) -> dict[str, Any]:
+async def fs_read_tool(path: str) -> dict[str, Any]:
     """Read a file from the workspace (text only)."""
-    text = fs_read(settings.workspace_dir, path)
+    text = await repository.read_file(settings.workspace_dir, path)
     return {"path": path, "text": text}
 
 
 @mcp.tool
-def actions_run(
+async def actions_run(
     command: str,
     args: dict[str, Any] | None = None,
     tier_mode: Optional[str] = None,
@@ -100,7 +102,7 @@ def actions_run(
     if command in write_cmds and (not key or key != settings.bridge_key):
         raise PermissionError("Missing or invalid key for write")
     policy = Policy(s1=settings.ai_s1, s2=settings.ai_s2, s3=settings.ai_s3)
-    result = actions_dispatch(command, args, policy, tier_mode=tier_mode, tiers_cfg=settings.ai_tiers)
+    result = await repository.dispatch(command, args, policy, tier_mode=tier_mode, tiers_cfg=settings.ai_tiers)
     return result
 
 
@@ -168,6 +170,7 @@ def main() -> None:
     parser.add_argument("--doc-url", default=os.getenv("ECHO_MCP_OAUTH_DOC_URL"))
     parser.add_argument("--scopes", default=os.getenv("ECHO_MCP_OAUTH_SCOPES"))  # comma-separated
     args = parser.parse_args()
+    profiling.configure(key=expected_bridge_key, **settings.profile_requests)
 
     base_url = args.base_url or f"http://{args.host}:{args.port}"
 
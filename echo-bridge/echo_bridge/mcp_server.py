@@ -1,7 +1,5 @@
 from fastapi import WebSocket, WebSocketDisconnect, APIRouter
-from echo_bridge.services.memory_service import search, add_chunks
-from echo_bridge.services.fs_service import list_dir, read_file
-from echo_bridge.services.actions_service import dispatch
+from echo_bridge.services import repository
 
 router = APIRouter()
 
@@ -16,15 +14,15 @@ async def mcp_ws(websocket: WebSocket):
             tier_mode = data.get("tier_mode")
             try:
                 if tool == "memory.search":
-                    result = search(args.get("query", ""), args.get("k", 5))
+                    result = await repository.search(args.get("query", ""), args.get("k", 5))
                 elif tool == "memory.add":
-                    result = {"inserted": add_chunks(args.get("source"), args.get("title"), args.get("texts", []), args.get("meta"))}
+                    result = {"inserted": await repository.add_chunks(args.get("source"), args.get("title"), args.get("texts", []), args.get("meta"))}
                 elif tool == "fs.list":
-                    result = list_dir(args.get("workspace_dir"), args.get("subdir"))
+                    result = await repository.list_dir(args.get("workspace_dir"), args.get("subdir"))
                 elif tool == "fs.read":
-                    result = read_file(args.get("workspace_dir"), args.get("path"))
+                    result = await repository.read_file(args.get("workspace_dir"), args.get("path"))
                 elif tool == "actions.run":
-                    result = dispatch(args.get("command"), args.get("args", {}))
+                    result = await repository.dispatch(args.get("command"), args.get("args", {}))
                 else:
                     result = {"error": "Unknown tool"}
             except Exception as e:
@@ -39,9 +37,8 @@ from typing import Any
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 
 from .ai.brain import Policy
-from .services.memory_service import search as mem_search, add_chunks
-from .services.fs_service import list_dir, read_file, FSError
-from .services.actions_service import dispatch, ActionError
+from .services.fs_service import FSError
+from .services.actions_service import ActionError
 
 
 def register_mcp(app, settings) -> None:
@@ -70,7 +67,7 @@ def register_mcp(app, settings) -> None:
                     elif method == "memory.search":
                         q = params.get("query", "")
                         k = int(params.get("k", 5))
-                        hits = mem_search(q, k)
+                        hits = await repository.search(q, k)
                         await ws.send_text(
                             json.dumps({"id": mid, "result": [h.model_dump() for h in hits]}, ensure_ascii=False)
                         )
@@ -81,15 +78,15 @@ def register_mcp(app, settings) -> None:
                         title = params.get("title")
                         texts = params.get("texts") or []
                         meta = params.get("meta")
-                        n = add_chunks(source, title, texts, meta)
+                        n = await repository.add_chunks(source, title, texts, meta)
                         await ws.send_text(json.dumps({"id": mid, "result": {"inserted": n}}))
                     elif method == "fs.list":
                         subdir = params.get("subdir")
-                        items = list_dir(settings.workspace_dir, subdir)
+                        items = await repository.list_dir(settings.workspace_dir, subdir)
                         await ws.send_text(json.dumps({"id": mid, "result": {"items": items}}, ensure_ascii=False))
                     elif method == "fs.read":
                         path = params.get("path")
-                        text = read_file(settings.workspace_dir, path)
+                        text = await repository.read_file(settings.workspace_dir, path)
                         await ws.send_text(json.dumps({"id": mid, "result": {"path": path, "text": text}}, ensure_ascii=False))
                     elif method == "actions.run":
                         # Write actions require auth; enforce minimally based on command name
@@ -99,7 +96,7 @@ def register_mcp(app, settings) -> None:
                         if cmd in write_commands and not authed:
                             raise PermissionError("auth required")
                         policy = Policy(s1=settings.ai_s1, s2=settings.ai_s2, s3=settings.ai_s3)
-                        result = dispatch(cmd, args, policy)
+                        result = await repository.dispatch(cmd, args, policy)
                         await ws.send_text(json.dumps({"id": mid, "result": result}, ensure_ascii=False))
                     else:
                         await ws.send_text(json.dumps({"id": mid, "error": {"message": "unknown method"}}))
@@ -1,39 +1,119 @@
+import time
+from typing import Any
+
 from fastmcp import FastMCP
+from fastmcp.exceptions import NotFoundError
+from fastmcp.server.dependencies import get_http_request
+from fastmcp.server.middleware import CallNext, Middleware, MiddlewareContext
 
-from .services.memory_service import search as fts_search, get_chunk
+from . import profiling
+from .services import repository
+from .services.memory_service import SearchFilters, get_chunk
 from .services.fs_service import read_file
-from .services.memory_service import add_chunks
+from .telemetry import MCP_TOOL_SECONDS
+
+
+class ToolMetrics(Middleware):
+    """Record per-tool call latency in bridge_mcp_tool_duration_seconds."""
+
+    async def on_call_tool(self, context: MiddlewareContext, call_next: CallNext) -> Any:
+        tool = getattr(context.message, "name", None) or "unknown"
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            result = await call_next(context)
+            outcome = "ok"
+            return result
+        except NotFoundError:
+            tool = "unknown"  # client-supplied name; keep it out of the labels
+            raise
+        finally:
+            MCP_TOOL_SECONDS.observe(time.perf_counter() - start, tool, outcome)
+
+
+class ToolProfiling(Middleware):
+    """Profile a tool call when its HTTP request asks for it (see echo_bridge.profiling)."""
+
+    async def on_call_tool(self, context: MiddlewareContext, call_next: CallNext) -> Any:
+        if not profiling.enabled() or profiling.current() is not None:
+            return await call_next(context)
+        try:
+            request = get_http_request()
+        except RuntimeError:  # stdio transport
+            return await call_next(context)
+        if not profiling.requested(request.headers, request.url.query.encode("latin-1")):
+            return await call_next(context)
+        tool = getattr(context.message, "name", None) or "unknown"
+        session = profiling.begin(f"mcp {tool}")
+        if session is None:
+            return await call_next(context)
+        outcome = "error"
+        try:
+            with session:
+                result = await call_next(context)
+            outcome = "ok"
+            return result
+        finally:
+            await session.save(kind="mcp", tool=tool, outcome=outcome)
+
 
 mcp = FastMCP("Echo Bridge", auth=None)  # lokal ohne Auth
+mcp.add_middleware(ToolMetrics())
+mcp.add_middleware(ToolProfiling())
 
 
 @mcp.tool(
     name="search",
     # FastMCP in this environment expects schema under 'output_schema';
     # keep the intended input contract in the function signature and docstring.
-    output_schema={"type": "object", "properties": {"results": {"type": "array"}, "content": {"type": "array"}}},
+    output_schema={"type": "object", "properties": {"results": {"type": "array"}, "content": {"type": "array"}, "next_cursor": {"type": ["string", "null"]}}},
 )
-def search_tool(query: str, k: int = 5):
-    """Structured search for documents using local FTS5 index."""
-    hits = fts_search(query, k)
+async def search_tool(
+    query: str,
+    k: int = 5,
+    source: str | None = None,
+    tags: list[str] | None = None,
+    since: str | None = None,
+    until: str | None = None,
+    cursor: str | None = None,
+    mode: str = "lexical",
+):
+    """Structured search for documents using local FTS5 index (BM25-ranked).
+
+    Optional filters: source, tags (all must match), since/until (ISO 8601 or epoch seconds).
+    Pass the returned next_cursor back as cursor to fetch the next page.
+    mode="hybrid" also ranks by embedding similarity (no cursor paging).
+    """
+    try:
+        filters = SearchFilters.parse(source=source, tags=tags or (), since=since, until=until)
+        if mode == "hybrid":
+            hits, next_cursor = await repository.hybrid_search(query, k, filters), None
+        else:
+            hits, next_cursor = await repository.search_page(query, k, filters, cursor)
+    except ValueError as e:
+        return {"error": str(e)}
     results = []
     for h in hits:
-        results.append({
+        item = {
             "id": str(h.id),
             "title": h.title or "",
             "url": f"mcp://chunk/{h.id}",
             "snippet": h.snippet,
-        })
+            "score": h.score,
+        }
+        if mode == "hybrid":
+            item["signals"] = {"bm25": h.bm25, "cosine": h.cosine}
+        results.append(item)
     # Also provide MCP-friendly content array (type=text snippets)
     content = [{"type": "search_results", "results": results}]
-    return {"results": results, "content": content}
+    return {"results": results, "content": content, "next_cursor": next_cursor}
 
 
 @mcp.tool(
     name="fetch",
     output_schema={"type": "object", "properties": {"id": {"type": "string"}, "title": {"type": "string"}, "content": {"type": "array"}, "metadata": {"type": "object"}}},
 )
-def fetch_tool(id: str):
+async def fetch_tool(id: str):
     """Fetch full content by chunk id (or mcp://chunk/<id> url)."""
     # accept both raw id and mcp://chunk/<id>
     if id.startswith("mcp://chunk/"):
@@ -44,7 +124,7 @@ def fetch_tool(id: str):
         cid = int(_id)
     except Exception:
         return {"error": "invalid id"}
-    c = get_chunk(cid)
+    c = await repository.get_chunk(cid)
     if not c:
         return {"error": "not found"}
     content = [{"type": "text", "text": c.text}]
@@ -56,34 +136,15 @@ def fetch_tool(id: str):
     name="list_resources",
     output_schema={"type": "object", "properties": {"resources": {"type": "array"}}},
 )
-def list_resources(q: str | None = None):
+async def list_resources(q: str | None = None):
     """List available chunk resources (used for source activation)."""
     # Simple listing: return recent chunks or search results if q provided
-    from .services.memory_service import search as _search
-
-    items = []
     if q:
-        hits = _search(q, 20)
+        rows = [{"id": h.id, "title": h.title} for h in await repository.search(q, 20)]
     else:
         # fallback: show latest by id
-        # naive direct DB access
-        from .db import get_conn
-
-        conn = get_conn()
-        cur = conn.cursor()
-        cur.execute("SELECT id, doc_title FROM chunks ORDER BY id DESC LIMIT 20")
-        rows = cur.fetchall()
-        hits = []
-        for r in rows:
-            class H: pass
-            h = H()
-            h.id = r["id"]
-            h.title = r["doc_title"]
-            h.snippet = ""
-            hits.append(h)
-
-    for h in hits:
-        items.append({"id": str(h.id), "title": h.title or "", "url": f"mcp://chunk/{h.id}"})
+        rows, _ = await repository.list_chunks(20)
+    items = [{"id": str(r["id"]), "title": r["title"] or "", "url": f"mcp://chunk/{r['id']}"} for r in rows]
     return {"resources": items}
 
 
@@ -91,37 +152,50 @@ def list_resources(q: str | None = None):
     name="open_resource",
     output_schema={"type": "object", "properties": {"id": {"type": "string"}, "title": {"type": "string"}, "content": {"type": "array"}}},
 )
-def open_resource(id: str):
-    # reuse fetch
-    return fetch_tool(id)
+async def open_resource(id: str):
+    # reuse fetch (the decorator returns a FunctionTool; call the wrapped fn)
+    return await fetch_tool.fn(id)
 
 
 # New helper tools for Project-ECHO playground
 
 
 @mcp.tool(name="echo_search", output_schema={"type": "object"})
-def echo_search_tool(query: str | None = None, k: int = 5):
+async def echo_search_tool(
+    query: str | None = None,
+    k: int = 5,
+    source: str | None = None,
+    tags: list[str] | None = None,
+    since: str | None = None,
+    until: str | None = None,
+    cursor: str | None = None,
+):
     """Search tool exposed as 'echo_search' using (query, k) to match the 'search' tool naming.
     This avoids an extra nested 'arguments' property in the input schema.
+    Accepts the same optional filters and cursor as 'search'.
     """
     q = query or ""
     try:
         k = int(k)
     except Exception:
         k = 5
-    hits = fts_search(q, k)
-    results = [{"id": str(h.id), "title": h.title or "", "snippet": h.snippet} for h in hits]
-    return {"results": results}
+    try:
+        filters = SearchFilters.parse(source=source, tags=tags or (), since=since, until=until)
+        hits, next_cursor = await repository.search_page(q, k, filters, cursor)
+    except ValueError as e:
+        return {"error": str(e)}
+    results = [{"id": str(h.id), "title": h.title or "", "snippet": h.snippet, "score": h.score} for h in hits]
+    return {"results": results, "next_cursor": next_cursor}
 
 
 @mcp.tool(name="echo_ingest", output_schema={"type": "object"})
-def echo_ingest_tool(source: str, title: str | None = None, text: str | None = None, tags: list[str] | None = None):
+async def echo_ingest_tool(source: str, title: str | None = None, text: str | None = None, tags: list[str] | None = None):
     """Ingest tool exposed as 'echo_ingest' with explicit signature for source/title/text/tags.
     Accepts direct fields (source, title, text, tags) so clients don't need to nest under 'arguments'.
     """
     texts = [text] if text else []
     meta = {"tags": tags} if tags else {}
-    added = add_chunks(source, title, texts, meta)
+    added = await repository.add_chunks(source, title, texts, meta)
     return {"added": added}
 
 
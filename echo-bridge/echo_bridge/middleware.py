@@ -0,0 +1,201 @@
+"""Single pure-ASGI request pipeline for the bridge app.
+
+Replaces the stack of ``@app.middleware("http")`` layers (public CORS, optional
+X-API-Key guard for public reads, /public/*.json serving, access logging) and
+Starlette's CORSMiddleware. The path is classified once per request; response
+headers are patched on ``http.response.start`` only, so streamed bodies (SSE,
+the /mcp POST proxy) pass through without being re-wrapped or copied.
+"""
+
+from __future__ import annotations
+
+import logging
+from contextlib import nullcontext
+from time import perf_counter
+from typing import Callable, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from . import profiling
+from .telemetry import HTTP_SECONDS
+
+
+CORS_HEADERS = {
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Methods": "GET,POST,OPTIONS,PUT,PATCH,DELETE",
+    "Access-Control-Allow-Headers": "Authorization,Content-Type,X-API-Key,X-Bridge-Key",
+}
+PUBLIC_CORS_HEADERS = {**CORS_HEADERS, "Access-Control-Allow-Credentials": "true"}
+
+# What CORSMiddleware(allow_origins=["*"], allow_methods=["*"], allow_headers=["*"],
+# allow_credentials=True) sent for every other route.
+_ALL_METHODS = ("DELETE", "GET", "HEAD", "OPTIONS", "PATCH", "POST", "PUT")
+_PREFLIGHT_HEADERS = {
+    "Vary": "Origin",
+    "Access-Control-Allow-Methods": ", ".join(_ALL_METHODS),
+    "Access-Control-Max-Age": "600",
+    "Access-Control-Allow-Credentials": "true",
+}
+
+_TOP_LEVEL_SPECS = ("/openapi.json", "/chatgpt_tool_manifest.json")
+_GUARDED_EXACT = ("/mcp/openapi.json",) + _TOP_LEVEL_SPECS
+
+OTHER, PUBLIC, MCP = 0, 1, 2
+
+
+def classify(path: str) -> int:
+    if path.startswith("/public") or path in _TOP_LEVEL_SPECS:
+        return PUBLIC
+    if path.startswith("/mcp"):
+        return MCP
+    return OTHER
+
+
+def route_label(scope: Scope, kind: int, status: int) -> str:
+    """Route template for metrics; never the raw path, so label cardinality stays bounded."""
+    route = scope.get("route")
+    template = getattr(route, "path", None)
+    if template:
+        return template
+    if kind == PUBLIC:
+        return "/public/*"
+    if status == 404:
+        return "unmatched"
+    # Mounts (static files, the MCP sub-app) do not set scope["route"]
+    head = scope["path"].split("/", 2)[1]
+    return f"/{head}/*" if head else "/"
+
+
+def is_guarded(path: str) -> bool:
+    """Paths that need X-API-Key when public-read protection is enabled."""
+    return path.startswith("/public/") or path.startswith("/mcp") or path in _GUARDED_EXACT
+
+
+class BridgeMiddleware:
+    """Path classification, CORS, public-read key check, JSON serving, access log, latency histogram
+    and opt-in request profiling.
+
+    ``json_handler`` may return a response for a request (``/public/*.json``) or
+    None to continue to the app; ``expected_key`` returns the required
+    X-API-Key, or None when public reads are not protected.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        json_handler: Callable[[Request], Optional[Response]],
+        expected_key: Callable[[], Optional[str]],
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        self.app = app
+        self.json_handler = json_handler
+        self.expected_key = expected_key
+        self.logger = logger or logging.getLogger("echo_bridge")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = perf_counter()
+        path: str = scope["path"]
+        method: str = scope["method"]
+        kind = classify(path)
+        headers = Headers(scope=scope)
+        origin = headers.get("origin")
+        status = 500
+        patch = True
+        session: Optional[profiling.Session] = None
+        if profiling.enabled() and profiling.requested(headers, scope.get("query_string", b"")):
+            session = profiling.begin(f"{method} {path}")
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if patch:
+                    self._patch_headers(message, kind, origin, "cookie" in headers)
+                if session is not None:
+                    message.setdefault("headers", [])
+                    MutableHeaders(scope=message)[profiling.ID_HEADER] = session.id
+            await send(message)
+
+        outcome = "error"
+        try:
+            if method == "OPTIONS" and kind == OTHER and origin is not None and "access-control-request-method" in headers:
+                response: Optional[Response] = self._preflight(headers, origin)
+                patch = False
+            else:
+                response = self._short_circuit(scope, kind, method, path, headers)
+            with session if session is not None else nullcontext():
+                if response is not None:
+                    await response(scope, receive, send_wrapper)
+                else:
+                    await self.app(scope, receive, send_wrapper)
+            outcome = "success" if status < 400 else "error"
+        except Exception:
+            outcome = "exception"
+            raise
+        finally:
+            elapsed = perf_counter() - start
+            route = route_label(scope, kind, status)
+            HTTP_SECONDS.observe(elapsed, method, route, str(status))
+            if session is not None:
+                await session.save(kind="http", method=method, path=path, route=route, status=status)
+            self.logger.info(
+                "request",
+                extra={
+                    "path": path,
+                    "method": method,
+                    "duration_ms": int(elapsed * 1000),
+                    "outcome": outcome,
+                },
+            )
+
+    def _short_circuit(self, scope: Scope, kind: int, method: str, path: str, headers: Headers) -> Optional[Response]:
+        """Return a response produced without calling the app, if any."""
+        if method == "OPTIONS":
+            # Preflights never carry the API key, so answer them before the guard
+            if kind == PUBLIC:
+                return Response(status_code=204, headers=PUBLIC_CORS_HEADERS)
+            if kind == MCP:
+                return Response(status_code=200, headers=CORS_HEADERS)
+
+        if is_guarded(path):
+            expected = self.expected_key()
+            if expected and headers.get("x-api-key") != expected:
+                return JSONResponse(status_code=401, content={"detail": "Missing or invalid X-API-Key"})
+
+        if kind == PUBLIC and path.startswith("/public/") and path.lower().endswith(".json"):
+            return self.json_handler(Request(scope))
+        return None
+
+    @staticmethod
+    def _preflight(headers: Headers, origin: str) -> Response:
+        out = dict(_PREFLIGHT_HEADERS)
+        out["Access-Control-Allow-Origin"] = origin
+        requested = headers.get("access-control-request-headers")
+        if requested is not None:
+            out["Access-Control-Allow-Headers"] = requested
+        if headers["access-control-request-method"] not in _ALL_METHODS:
+            return PlainTextResponse("Disallowed CORS method", status_code=400, headers=out)
+        return PlainTextResponse("OK", status_code=200, headers=out)
+
+    @staticmethod
+    def _patch_headers(message: Message, kind: int, origin: Optional[str], has_cookie: bool) -> None:
+        message.setdefault("headers", [])
+        out = MutableHeaders(scope=message)
+        if origin is not None:
+            out["Access-Control-Allow-Credentials"] = "true"
+            if has_cookie and kind == OTHER:
+                out["Access-Control-Allow-Origin"] = origin
+                out.add_vary_header("Origin")
+            else:
+                out["Access-Control-Allow-Origin"] = "*"
+        if kind != OTHER:
+            out.update(CORS_HEADERS)
+            if kind == PUBLIC and "access-control-allow-credentials" not in out:
+                out["Access-Control-Allow-Credentials"] = "true"
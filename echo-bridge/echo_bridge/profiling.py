@@ -0,0 +1,359 @@
+"""Opt-in per-request profiling with cProfile, kept in a bounded on-disk ring.
+
+With ``profiling.requests.enabled`` set, a request that sends ``X-Profile: 1``
+(or ``?profile=1``) together with a valid ``X-Bridge-Key`` runs under a
+deterministic profiler. The response carries ``X-Profile-Id``; the profile is
+stored as ``<id>.pstats`` (load with ``pstats``/snakeviz), ``<id>.collapsed``
+(flamegraph.pl / speedscope input) and ``<id>.json`` metadata, and the oldest
+profiles beyond ``keep`` are deleted. ``/debug/profiles`` lists and serves them.
+
+Up to Python 3.11 cProfile hooks one thread at a time, so a session holds
+one profiler per thread it touches and merges them when saved:
+
+  - async routes and MCP tools: the event-loop thread, for the whole request
+  - sync routes: their worker thread (``ProfiledRoute`` wraps the endpoint)
+  - DB calls: the ``db-executor`` thread running them (``repository.run``)
+
+From 3.12 cProfile sits on the process-wide ``sys.monitoring`` and only one
+profiler may be enabled at a time; the session's single profiler then sees
+every thread and the per-thread hooks do nothing. If another profiling tool
+already holds the hook, the request simply runs unprofiled.
+
+Work on the event loop is not attributed per task, so other requests that
+interleave with a profiled async request show up in its profile; profile on a
+quiet instance when that matters. Only one request is profiled at a time;
+concurrent requests asking for a profile run unprofiled.
+
+When disabled, or when a request does not ask, the cost is one flag check in
+the middleware and one context-variable read per sync endpoint or DB call.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import cProfile
+import functools
+import hmac
+import io
+import itertools
+import json
+import logging
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from pathlib import Path
+from typing import Any, Callable, Iterator, Mapping, Optional, TypeVar
+from urllib.parse import parse_qs
+
+import anyio
+from fastapi.routing import APIRoute
+
+
+logger = logging.getLogger("echo_bridge.profiling")
+
+T = TypeVar("T")
+
+FLAG_HEADER = "x-profile"
+ID_HEADER = "X-Profile-Id"
+
+_DEFAULTS: dict[str, Any] = {
+    "enabled": False,
+    "dir": "./echo-bridge/data/profiles",
+    "keep": 50,
+}
+_options: dict[str, Any] = dict(_DEFAULTS)
+_key: Callable[[], Optional[str]] = lambda: None
+
+_SESSION: ContextVar[Optional["Session"]] = ContextVar("echo_bridge_profile", default=None)
+_busy = threading.Lock()  # held by the one request being profiled
+_seq = itertools.count(1)
+_ID_RE = re.compile(r"^[0-9A-Za-z-]+$")
+_TRUTHY = ("1", "true", "yes", "on")
+# cProfile on sys.monitoring (3.12+): one profiler per process, covering all threads
+_PROCESS_WIDE = sys.version_info >= (3, 12)
+
+
+def configure(key: Optional[Callable[[], Optional[str]]] = None, **options: Any) -> None:
+    """Set ring options; ``key`` returns the X-Bridge-Key a request must present."""
+    global _key
+    unknown = set(options) - set(_DEFAULTS)
+    if unknown:
+        raise ValueError(f"unknown profiling options: {sorted(unknown)}")
+    _options.clear()
+    _options.update(_DEFAULTS)
+    _options.update({k: v for k, v in options.items() if v is not None})
+    if key is not None:
+        _key = key
+
+
+def enabled() -> bool:
+    return bool(_options["enabled"])
+
+
+def requested(headers: Mapping[str, str], query_string: bytes = b"") -> bool:
+    """True when the caller asked for a profile and presented the bridge key."""
+    flag = headers.get(FLAG_HEADER)
+    if flag is None and b"profile=" in query_string:
+        flag = parse_qs(query_string.decode("latin-1")).get("profile", [""])[-1]
+    if not flag or flag.lower() not in _TRUTHY:
+        return False
+    expected = _key()
+    presented = headers.get("x-bridge-key")
+    return bool(expected and presented) and hmac.compare_digest(str(presented), str(expected))
+
+
+def current() -> Optional["Session"]:
+    return _SESSION.get()
+
+
+class Session:
+    """One profiled request: per-thread cProfile instances merged on save.
+
+    Use as a context manager around the request; it profiles the entering
+    thread and marks the context so worker threads can join via ``thread()``.
+    """
+
+    def __init__(self, label: str) -> None:
+        now = time.time()
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime(now))
+        self.id = f"{stamp}-{int(now * 1000) % 1000:03d}-{os.getpid()}-{next(_seq)}"
+        self.label = label
+        self.created = now
+        self._profiles: list[cProfile.Profile] = []
+        self._threads: set[int] = set()
+        self._lock = threading.Lock()
+        self._token: Optional[Token[Optional[Session]]] = None
+        self._outer: Optional[Any] = None
+        self._started = time.perf_counter()
+
+    def __enter__(self) -> "Session":
+        self._token = _SESSION.set(self)
+        self._outer = self._profile()
+        self._outer.__enter__()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        if self._outer is not None:
+            self._outer.__exit__(*exc)
+            self._outer = None
+        if self._token is not None:
+            _SESSION.reset(self._token)
+            self._token = None
+
+    @contextmanager
+    def thread(self) -> Iterator[None]:
+        """Profile the calling thread for the duration of the block (no-op if already profiled)."""
+        if _PROCESS_WIDE:
+            yield
+            return
+        with self._profile():
+            yield
+
+    @contextmanager
+    def _profile(self) -> Iterator[None]:
+        ident = threading.get_ident()
+        with self._lock:
+            nested = ident in self._threads
+            self._threads.add(ident)
+        prof: Optional[cProfile.Profile] = None
+        if not nested:
+            prof = cProfile.Profile()
+            try:
+                prof.enable()
+            except ValueError:  # another profiling tool holds the hook; never fail the request
+                logger.warning("profile %s: profiler unavailable in thread %s", self.id, ident)
+                prof = None
+        try:
+            yield
+        finally:
+            if prof is not None:
+                prof.disable()
+            with self._lock:
+                if not nested:
+                    self._threads.discard(ident)
+                if prof is not None:
+                    self._profiles.append(prof)
+
+    def stats(self) -> Optional[pstats.Stats]:
+        with self._lock:
+            profiles = list(self._profiles)
+        merged: Optional[pstats.Stats] = None
+        for prof in profiles:
+            try:
+                if merged is None:
+                    merged = pstats.Stats(prof)
+                else:
+                    merged.add(prof)
+            except TypeError:  # a profiler that recorded nothing
+                continue
+        return merged
+
+    async def save(self, **meta: Any) -> None:
+        """Write the profile to the ring and release the profiling slot."""
+        try:
+            meta = {
+                "id": self.id,
+                "label": self.label,
+                "created": round(self.created, 3),
+                "duration_ms": round((time.perf_counter() - self._started) * 1000, 2),
+                "threads": len(self._profiles),
+                **meta,
+            }
+            await anyio.to_thread.run_sync(_store, self, meta)
+        except Exception:
+            logger.exception("failed to store profile %s", self.id)
+        finally:
+            _busy.release()
+
+
+def begin(label: str) -> Optional[Session]:
+    """Start a session, or None while another request is being profiled."""
+    if not _busy.acquire(blocking=False):
+        return None
+    return Session(label)
+
+
+def profile_thread(fn: Callable[..., T]) -> Callable[..., T]:
+    """Wrap a sync callable so it is profiled when it runs inside a profiled request."""
+
+    @functools.wraps(fn)
+    def wrapper(*args: Any, **kwargs: Any) -> T:
+        session = _SESSION.get()
+        if session is None:
+            return fn(*args, **kwargs)
+        with session.thread():
+            return fn(*args, **kwargs)
+
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    """APIRoute whose sync endpoints join the request's profile in their worker thread."""
+
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs: Any) -> None:
+        super().__init__(path, endpoint, **kwargs)
+        # Swap the call after FastAPI has read the endpoint's signature, which
+        # it resolves against the endpoint's own module globals.
+        if not asyncio.iscoroutinefunction(endpoint) and self.dependant.call is not None:
+            self.dependant.call = profile_thread(self.dependant.call)
+
+
+# --- collapsed stacks ---------------------------------------------------------
+
+def frame_label(filename: str, lineno: int, name: str) -> str:
+    """``name (dir/file.py:line)``; shared by every collapsed-stack producer."""
+    if filename == "~" or not lineno:
+        return name
+    parts = filename.replace("\\", "/").rsplit("/", 2)
+    return f"{name} ({'/'.join(parts[-2:])}:{lineno})"
+
+
+def collapsed(stats: pstats.Stats, max_depth: int = 64, min_seconds: float = 1e-6) -> str:
+    """Approximate collapsed stacks (``a;b;c <microseconds>``) from cProfile's call graph.
+
+    cProfile keeps caller->callee edges, not whole stacks, so each function's
+    time is split across its callers in proportion to the time each edge
+    accounts for. Recursive edges are cut.
+    """
+    raw: dict[Any, Any] = stats.stats  # type: ignore[attr-defined]
+    callees: dict[Any, list[tuple[Any, float]]] = {}
+    for func, (_cc, _nc, _tt, _ct, callers) in raw.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((func, edge[3]))
+    roots = [f for f, row in raw.items() if not any(c in raw for c in row[4])]
+    out: dict[str, float] = {}
+
+    def walk(func: Any, path: list[str], on_path: set[Any], frac: float) -> None:
+        _cc, _nc, tt, _ct, _callers = raw[func]
+        key = ";".join(path)
+        out[key] = out.get(key, 0.0) + tt * frac
+        if len(path) >= max_depth:
+            return
+        for child, edge_ct in callees.get(func, ()):
+            if child in on_path or child not in raw:
+                continue
+            child_ct = raw[child][3]
+            child_frac = frac * (edge_ct / child_ct) if child_ct else 0.0
+            if child_ct * child_frac < min_seconds:
+                continue
+            on_path.add(child)
+            path.append(frame_label(*child))
+            walk(child, path, on_path, child_frac)
+            path.pop()
+            on_path.discard(child)
+
+    for root in roots:
+        walk(root, [frame_label(*root)], {root}, 1.0)
+    lines = [f"{stack} {round(sec * 1e6)}" for stack, sec in sorted(out.items()) if round(sec * 1e6) > 0]
+    return "\n".join(lines) + ("\n" if lines else "")
+
+
+# --- on-disk ring -------------------------------------------------------------
+
+def _dir() -> Path:
+    return Path(_options["dir"])
+
+
+def _store(session: Session, meta: dict[str, Any]) -> None:
+    stats = session.stats()
+    if stats is None:
+        return
+    d = _dir()
+    d.mkdir(parents=True, exist_ok=True)
+    stats.dump_stats(str(d / f"{session.id}.pstats"))
+    (d / f"{session.id}.collapsed").write_text(collapsed(stats), encoding="utf-8")
+    # metadata last: list_profiles() only sees complete profiles
+    tmp = d / f"{session.id}.json.tmp"
+    tmp.write_text(json.dumps(meta), encoding="utf-8")
+    os.replace(tmp, d / f"{session.id}.json")
+    _prune(d)
+    logger.info("stored profile %s (%s, %.1fms)", session.id, session.label, meta["duration_ms"])
+
+
+def _prune(d: Path) -> None:
+    keep = max(1, int(_options["keep"]))
+    metas = sorted(d.glob("*.json"), key=lambda p: p.stat().st_mtime)
+    for old in metas[:-keep]:
+        pid = old.name[: -len(".json")]
+        for suffix in (".json", ".pstats", ".collapsed"):
+            try:
+                (d / f"{pid}{suffix}").unlink()
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles(limit: int = 50) -> list[dict[str, Any]]:
+    """Stored profile metadata, newest first."""
+    d = _dir()
+    if not d.is_dir():
+        return []
+    metas = sorted(d.glob("*.json"), key=lambda p: p.stat().st_mtime, reverse=True)
+    out: list[dict[str, Any]] = []
+    for p in metas[:limit]:
+        try:
+            out.append(json.loads(p.read_text(encoding="utf-8")))
+        except (OSError, ValueError):
+            continue
+    return out
+
+
+def profile_file(profile_id: str, fmt: str = "pstats") -> Optional[Path]:
+    if not _ID_RE.match(profile_id) or fmt not in ("pstats", "collapsed"):
+        return None
+    path = _dir() / f"{profile_id}.{fmt}"
+    return path if path.is_file() else None
+
+
+def report(profile_id: str, limit: int = 60, sort: str = "cumulative") -> Optional[str]:
+    """pstats text report of the top ``limit`` functions."""
+    path = profile_file(profile_id, "pstats")
+    if path is None:
+        return None
+    buf = io.StringIO()
+    pstats.Stats(str(path), stream=buf).sort_stats(sort).print_stats(limit)
+    return buf.getvalue()
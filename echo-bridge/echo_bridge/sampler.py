@@ -0,0 +1,254 @@
+"""Continuous in-process sampling profiler.
+
+A daemon thread (``stack-sampler``) wakes ``hz`` times a second, reads every
+thread's current frame with ``sys._current_frames()`` and counts the stack,
+keyed by thread name and code objects. Counts go into ``bucket_secs`` wide
+time buckets kept for ``retain_secs``, so ``/debug/flamegraph?window=600``
+merges just the last ten minutes. Output is collapsed stacks
+(``thread;outer;...;leaf count``), which flamegraph.pl and speedscope read
+directly.
+
+Unlike ``echo_bridge.profiling`` nothing is hooked into the interpreter: the
+only cost is the sampling itself, which holds the GIL while it walks stacks.
+The thread times each sample and stretches its interval whenever the measured
+cost would exceed ``max_overhead`` of wall time (1% by default).
+
+Threads parked in a known wait (condition/queue waits, the event loop's
+``select``) are skipped unless ``include_idle`` is set, so the flamegraph
+shows where CPU goes rather than who is sleeping. Each bucket keeps at most
+``max_stacks`` distinct stacks; further ones are counted under ``[other]``.
+"""
+
+from __future__ import annotations
+
+import sys
+import threading
+import time
+from collections import deque
+from types import CodeType, FrameType
+from typing import Any, Optional
+
+from .profiling import frame_label
+
+
+_IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),
+}
+
+_OTHER = "[other]"
+_TRUNCATED = "[truncated]"
+
+StackKey = tuple[str, tuple[CodeType, ...]]
+
+
+class Sampler:
+    def __init__(
+        self,
+        enabled: bool = False,
+        hz: float = 20.0,
+        bucket_secs: float = 60.0,
+        retain_secs: float = 21600.0,
+        max_stacks: int = 10000,
+        max_depth: int = 64,
+        include_idle: bool = False,
+        max_overhead: float = 0.01,
+    ) -> None:
+        if hz <= 0:
+            raise ValueError("sampler hz must be positive")
+        self.enabled = enabled
+        self.hz = float(hz)
+        self.bucket_secs = max(1.0, float(bucket_secs))
+        self.retain_secs = max(self.bucket_secs, float(retain_secs))
+        self.max_stacks = max(1, int(max_stacks))
+        self.max_depth = max(1, int(max_depth))
+        self.include_idle = include_idle
+        self.max_overhead = max_overhead
+        # (bucket start, stack -> samples); the last bucket is being filled
+        self._buckets: deque[tuple[float, dict[StackKey, int]]] = deque()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._idle: dict[CodeType, bool] = {}
+        self._labels: dict[CodeType, str] = {}
+        self._names: dict[int, str] = {}
+        self.interval = 1.0 / self.hz
+        self.samples = 0
+        self.stacks_seen = 0
+        self.overflow = 0
+        self._cost = 0.0  # seconds spent sampling, for the overhead estimate
+        self._since = time.monotonic()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        with self._lock:
+            self.enabled = True
+            if self.running:
+                return
+            self._stop = threading.Event()
+            self._cost, self._since = 0.0, time.monotonic()
+            self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 2.0) -> None:
+        with self._lock:
+            self.enabled = False
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._stop.set()
+        thread.join(timeout)
+
+    def set_rate(self, hz: float) -> None:
+        if hz <= 0:
+            raise ValueError("sampler hz must be positive")
+        self.hz = float(hz)
+        self.interval = 1.0 / self.hz
+
+    def reset(self) -> None:
+        """Drop recorded samples and the per-code caches (which pin code objects)."""
+        with self._lock:
+            self._buckets.clear()
+            self._labels.clear()
+            self._idle.clear()
+            self._names.clear()
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        stop = self._stop
+        while not stop.wait(self.interval):
+            started = time.perf_counter()
+            self.sample(skip=me)
+            cost = time.perf_counter() - started
+            self._cost += cost
+            # stretch the interval so sampling stays within max_overhead of wall time
+            self.interval = max(1.0 / self.hz, cost / self.max_overhead if self.max_overhead > 0 else 0.0)
+
+    def sample(self, skip: Optional[int] = None) -> None:
+        """Record one sample of every thread's stack (except ``skip``)."""
+        now = time.time()
+        frames = sys._current_frames()
+        stacks: list[StackKey] = []
+        for ident, frame in frames.items():
+            if ident == skip:
+                continue
+            codes = self._walk(frame)
+            if not self.include_idle and self._is_idle(codes[0]):
+                continue
+            name = self._names.get(ident)
+            if name is None:
+                self._names = {t.ident: t.name for t in threading.enumerate() if t.ident is not None}
+                name = self._names.get(ident, f"thread-{ident}")
+            codes.reverse()
+            stacks.append((name, tuple(codes)))
+        del frames
+        with self._lock:
+            if not self._buckets or now - self._buckets[-1][0] >= self.bucket_secs:
+                self._buckets.append((now - now % self.bucket_secs, {}))
+                while self._buckets and now - self._buckets[0][0] > self.retain_secs + self.bucket_secs:
+                    self._buckets.popleft()
+            counts = self._buckets[-1][1]
+            for key in stacks:
+                if key not in counts and len(counts) >= self.max_stacks:
+                    key = (key[0], ())
+                    self.overflow += 1
+                counts[key] = counts.get(key, 0) + 1
+            self.samples += 1
+            self.stacks_seen += len(stacks)
+
+    def _walk(self, frame: Optional[FrameType]) -> list[CodeType]:
+        codes: list[CodeType] = []
+        depth = self.max_depth
+        while frame is not None and depth:
+            codes.append(frame.f_code)
+            frame = frame.f_back
+            depth -= 1
+        if frame is not None:
+            codes.append(_TRUNCATED_CODE)
+        return codes
+
+    def _is_idle(self, code: CodeType) -> bool:
+        idle = self._idle.get(code)
+        if idle is None:
+            base = code.co_filename.replace("\\", "/").rsplit("/", 1)[-1]
+            idle = self._idle[code] = (base, code.co_name) in _IDLE_LEAVES
+        return idle
+
+    def _label(self, code: CodeType) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = _TRUNCATED if code is _TRUNCATED_CODE else frame_label(code.co_filename, code.co_firstlineno, code.co_name)
+            self._labels[code] = label
+        return label
+
+    def counts(self, window: Optional[float] = None, thread: Optional[str] = None) -> dict[str, int]:
+        """Collapsed stack -> samples over the last ``window`` seconds (all retained data if None)."""
+        since = time.time() - window if window else 0.0
+        with self._lock:
+            buckets = [counts.copy() for start, counts in self._buckets if start + self.bucket_secs > since]
+        out: dict[str, int] = {}
+        for counts in buckets:
+            for (name, codes), n in counts.items():
+                if thread is not None and name != thread:
+                    continue
+                parts = [name, *(self._label(c) for c in codes)] if codes else [name, _OTHER]
+                key = ";".join(p.replace(";", ",") for p in parts)
+                out[key] = out.get(key, 0) + n
+        return out
+
+    def collapsed(self, window: Optional[float] = None, thread: Optional[str] = None) -> str:
+        lines = [f"{stack} {n}" for stack, n in sorted(self.counts(window, thread).items())]
+        return "\n".join(lines) + ("\n" if lines else "")
+
+    def stats(self) -> dict[str, Any]:
+        elapsed = time.monotonic() - self._since
+        with self._lock:
+            buckets = len(self._buckets)
+            stacks = sum(len(c) for _, c in self._buckets)
+        return {
+            "enabled": self.enabled,
+            "running": self.running,
+            "hz": self.hz,
+            "interval_ms": round(self.interval * 1000, 2),
+            "samples": self.samples,
+            "stacks_seen": self.stacks_seen,
+            "distinct_stacks": stacks,
+            "buckets": buckets,
+            "overflow": self.overflow,
+            "overhead_pct": round(100 * self._cost / elapsed, 3) if self.running and elapsed > 0 else 0.0,
+        }
+
+
+_TRUNCATED_CODE = compile("", _TRUNCATED, "exec")
+
+_SAMPLER = Sampler()
+
+
+def configure(**options: Any) -> Sampler:
+    """Replace the process-wide sampler (stopping the old one) with new options."""
+    global _SAMPLER
+    _SAMPLER.stop()
+    _SAMPLER = Sampler(**options)
+    return _SAMPLER
+
+
+def get_sampler() -> Sampler:
+    return _SAMPLER
+
+
+def start() -> None:
+    _SAMPLER.start()
+
+
+def stop() -> None:
+    _SAMPLER.stop()
+
+
+def stats() -> dict[str, Any]:
+    return _SAMPLER.stats()
@@ -1,9 +1,13 @@
 from __future__ import annotations
 
 import json
+import sqlite3
+import time
 from typing import Any, cast
 
-from ..db import get_conn
+from ..db import write
+from ..telemetry import ACTION_SECONDS, bounded
+from . import audit_service, search_cache
 from .memory_service import add_chunks
 from ..ai.brain import Policy, apply as ai_apply, pipeline as ai_pipeline
 from ..soul.state import get_soul
@@ -18,18 +22,43 @@ class PreconditionFailed(Exception):
 
 
 def _audit(action: str, payload: dict[str, Any], result: dict[str, Any]) -> None:
-    conn = get_conn()
-    cur = conn.cursor()
     mood = ""
     try:
         mood = get_soul().get_mood()
     except Exception:
         mood = ""
-    cur.execute(
-        "INSERT INTO audits(action, payload_json, result_json, soul_mood) VALUES (?,?,?,?)",
-        (action, json.dumps(payload, ensure_ascii=False), json.dumps(result, ensure_ascii=False), mood),
-    )
-    conn.commit()
+    # Queued for the background audit writer; no DB I/O on the request path
+    audit_service.record(action, payload, result, mood)
+
+
+def _link_tags(chunk_id: int, tags: list[str]) -> int:
+    """Ensure tags exist and link them to chunk_id; returns number of tags resolved."""
+
+    def _write(conn: sqlite3.Connection) -> int:
+        tag_ids: list[int] = []
+        cur = conn.cursor()
+        for name in tags:
+            cur.execute("INSERT OR IGNORE INTO tags(name) VALUES (?)", (name,))
+            cur.execute("SELECT id FROM tags WHERE name=?", (name,))
+            row = cur.fetchone()
+            if row:
+                tag_ids.append(row["id"])
+        for tid in tag_ids:
+            cur.execute(
+                "INSERT OR IGNORE INTO chunk_tags(chunk_id, tag_id) VALUES (?,?)",
+                (chunk_id, tid),
+            )
+        return len(tag_ids)
+
+    linked = write(_write)
+    search_cache.bump_generation()
+    return linked
+
+
+COMMANDS = frozenset({
+    "memory.add", "memory.tag", "memory.group", "game.new", "game.choose",
+    "journal.prompt", "journal.summarize", "memory.auto_tag", "game.describe", "lesson.plan",
+})
 
 
 def dispatch(
@@ -39,6 +68,24 @@ def dispatch(
     *,
     tier_mode: str | None = None,
     tiers_cfg: dict[str, dict[str, object]] | None = None,
+) -> dict[str, Any]:
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        result = _dispatch(command, args, policy, tier_mode=tier_mode, tiers_cfg=tiers_cfg)
+        outcome = "ok"
+        return result
+    finally:
+        ACTION_SECONDS.observe(time.perf_counter() - start, bounded(command, COMMANDS, "unknown"), outcome)
+
+
+def _dispatch(
+    command: str,
+    args: dict[str, Any],
+    policy: Policy | None,
+    *,
+    tier_mode: str | None,
+    tiers_cfg: dict[str, dict[str, object]] | None,
 ) -> dict[str, Any]:
     pol = policy or Policy()
     if command == "memory.add":
@@ -68,24 +115,9 @@ def dispatch(
                 raise ActionError("Invalid tags type")
         if not isinstance(chunk_id, int):
             raise ActionError("Invalid arguments for memory.tag")
-        conn = get_conn()
-        cur = conn.cursor()
         # ensure tags exist and link
-        tag_ids: list[int] = []
         tags = cast(list[str], tags_any)
-        for name in tags:
-            cur.execute("INSERT OR IGNORE INTO tags(name) VALUES (?)", (name,))
-            cur.execute("SELECT id FROM tags WHERE name=?", (name,))
-            row = cur.fetchone()
-            if row:
-                tag_ids.append(row["id"])
-        for tid in tag_ids:
-            cur.execute(
-                "INSERT OR IGNORE INTO chunk_tags(chunk_id, tag_id) VALUES (?,?)",
-                (chunk_id, tid),
-            )
-        conn.commit()
-        result = {"linked": len(tag_ids)}
+        result = {"linked": _link_tags(chunk_id, tags)}
         _audit(command, args, result)
         return result
     elif command == "memory.group":
@@ -94,9 +126,7 @@ def dispatch(
         if not isinstance(tag, str) or not isinstance(query, str):
             raise ActionError("Invalid arguments for memory.group")
         # store as a tag with meta
-        conn = get_conn()
-        cur = conn.cursor()
-        cur.execute("INSERT OR IGNORE INTO tags(name) VALUES (?)", (tag,))
+        write(lambda conn: conn.execute("INSERT OR IGNORE INTO tags(name) VALUES (?)", (tag,)))
         # For MVP, audit only; grouping is conceptual
         result = {"group": tag, "query": query}
         _audit(command, args, result)
@@ -104,14 +134,12 @@ def dispatch(
     elif command == "game.new":
         kind = args.get("kind", "echo")
         state: dict[str, Any] = {"log": [], "choices": []}
-        conn = get_conn()
-        cur = conn.cursor()
-        cur.execute(
-            "INSERT INTO sessions(kind, state_json) VALUES (?, ?)",
-            (kind, json.dumps(state, ensure_ascii=False)),
+        session_id = write(
+            lambda conn: conn.execute(
+                "INSERT INTO sessions(kind, state_json) VALUES (?, ?)",
+                (kind, json.dumps(state, ensure_ascii=False)),
+            ).lastrowid
         )
-        session_id = cur.lastrowid
-        conn.commit()
         result = {"session_id": session_id, "kind": kind}
         _audit(command, args, result)
         return result
@@ -120,24 +148,28 @@ def dispatch(
         choice = args.get("choice")
         if not isinstance(session_id, int) or not isinstance(choice, str):
             raise ActionError("Invalid arguments for game.choose")
-        conn = get_conn()
-        cur = conn.cursor()
-        cur.execute("SELECT state_json FROM sessions WHERE id=?", (session_id,))
-        row = cur.fetchone()
-        if not row:
-            raise ActionError("Session not found")
-        state = cast(dict[str, Any], json.loads(row["state_json"]))
-        logs_any = state.setdefault("log", [])
-        if isinstance(logs_any, list):
-            logs_typed: list[dict[str, Any]] = cast(list[dict[str, Any]], logs_any)
-            logs_typed.append({"choice": choice})
-        else:
-            state["log"] = [{"choice": choice}]
-        cur.execute(
-            "UPDATE sessions SET state_json=? WHERE id=?",
-            (json.dumps(state, ensure_ascii=False), session_id),
-        )
-        conn.commit()
+
+        # Read-modify-write in one job so concurrent choices are not lost
+        def _choose(conn: sqlite3.Connection) -> dict[str, Any]:
+            cur = conn.cursor()
+            cur.execute("SELECT state_json FROM sessions WHERE id=?", (session_id,))
+            row = cur.fetchone()
+            if not row:
+                raise ActionError("Session not found")
+            state = cast(dict[str, Any], json.loads(row["state_json"]))
+            logs_any = state.setdefault("log", [])
+            if isinstance(logs_any, list):
+                logs_typed: list[dict[str, Any]] = cast(list[dict[str, Any]], logs_any)
+                logs_typed.append({"choice": choice})
+            else:
+                state["log"] = [{"choice": choice}]
+            cur.execute(
+                "UPDATE sessions SET state_json=? WHERE id=?",
+                (json.dumps(state, ensure_ascii=False), session_id),
+            )
+            return state
+
+        state = write(_choose)
         result = {"session_id": session_id, "state": state}
         _audit(command, args, result)
         return result
@@ -210,19 +242,7 @@ def dispatch(
                     tags = []
                 if not isinstance(chunk_id, int):
                     raise ActionError("Invalid chunk_id for memory.auto_tag")
-                conn = get_conn()
-                cur = conn.cursor()
-                tag_ids: list[int] = []
-                for name in tags:
-                    cur.execute("INSERT OR IGNORE INTO tags(name) VALUES (?)", (name,))  # type: ignore[arg-type]
-                    cur.execute("SELECT id FROM tags WHERE name=?", (name,))  # type: ignore[arg-type]
-                    row = cur.fetchone()
-                    if row:
-                        tag_ids.append(row["id"])
-                for tid in tag_ids:
-                    cur.execute("INSERT OR IGNORE INTO chunk_tags(chunk_id, tag_id) VALUES (?,?)", (chunk_id, tid))
-                conn.commit()
-                result = {**result, "linked": len(tag_ids)}
+                result = {**result, "linked": _link_tags(chunk_id, tags)}
             _audit(command, args, result)
             return result
         else:
@@ -233,19 +253,7 @@ def dispatch(
                 tags = [t for t in tags_raw if isinstance(t, str)] if isinstance(tags_raw, list) else []
                 if not isinstance(chunk_id, int):
                     raise ActionError("Invalid chunk_id for memory.auto_tag")
-                conn = get_conn()
-                cur = conn.cursor()
-                tag_ids: list[int] = []
-                for name in tags:
-                    cur.execute("INSERT OR IGNORE INTO tags(name) VALUES (?)", (name,))
-                    cur.execute("SELECT id FROM tags WHERE name=?", (name,))
-                    row = cur.fetchone()
-                    if row:
-                        tag_ids.append(row["id"])
-                for tid in tag_ids:
-                    cur.execute("INSERT OR IGNORE INTO chunk_tags(chunk_id, tag_id) VALUES (?,?)", (chunk_id, tid))
-                conn.commit()
-                out = {**out, "linked": len(tag_ids)}
+                out = {**out, "linked": _link_tags(chunk_id, tags)}
             _audit(command, args, out)
             return out
     elif command == "game.describe":
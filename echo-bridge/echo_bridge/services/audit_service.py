@@ -0,0 +1,224 @@
+"""Batched, off-request-path writer for the ``audits`` table.
+
+``record()`` serializes the row on the caller's thread and hands it to a
+bounded queue; a background thread drains the queue and inserts rows in one
+transaction every ``batch_size`` rows or ``flush_ms`` milliseconds. When the
+writer is not running (scripts, tests without the app lifespan) rows are
+written synchronously, as before.
+
+Backpressure when the queue is full:
+  - block:  wait up to ``block_timeout`` seconds for room, then drop
+  - drop:   drop the new row immediately
+  - sample: once the queue is 3/4 full keep only ``sample_rate`` of new rows
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import queue
+import random
+import threading
+import time
+from typing import Any
+
+from ..db import write
+
+
+logger = logging.getLogger("echo_bridge.audit")
+
+_INSERT = "INSERT INTO audits(action, payload_json, result_json, soul_mood) VALUES (?,?,?,?)"
+
+Row = tuple[str, str, str, str]
+
+
+def _write_rows(rows: list[Row]) -> None:
+    write(lambda conn: conn.executemany(_INSERT, rows))
+
+
+class AuditWriter:
+    def __init__(
+        self,
+        max_queue: int = 10000,
+        batch_size: int = 200,
+        flush_ms: int = 200,
+        policy: str = "block",
+        block_timeout: float = 1.0,
+        sample_rate: float = 0.1,
+    ) -> None:
+        if policy not in ("block", "drop", "sample"):
+            raise ValueError(f"unknown audit backpressure policy: {policy}")
+        self.max_queue = max_queue
+        self.batch_size = max(1, batch_size)
+        self.flush_ms = max(1, flush_ms)
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.sample_rate = sample_rate
+        self._queue: queue.Queue[Row | threading.Event | None] = queue.Queue(maxsize=max_queue)
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.errors = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        with self._lock:
+            if self.running:
+                return
+            self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Write everything still queued and stop the writer thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._queue.put(None)
+        thread.join(timeout)
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Block until rows queued before this call are committed."""
+        if not self.running:
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def submit(self, row: Row) -> bool:
+        if not self.running:
+            _write_rows([row])
+            self._count(written=1)
+            return True
+        try:
+            if self.policy == "block":
+                self._queue.put(row, timeout=self.block_timeout)
+            elif self.policy == "sample" and self._queue.qsize() >= self.max_queue * 3 // 4:
+                if random.random() >= self.sample_rate:
+                    raise queue.Full
+                self._queue.put_nowait(row)
+            else:
+                self._queue.put_nowait(row)
+        except queue.Full:
+            self._count(dropped=1)
+            return False
+        self._count(enqueued=1)
+        return True
+
+    def _count(self, **deltas: int) -> None:
+        # submit() runs on every request thread; a bare += would lose updates
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    def _commit(self, rows: list[Row]) -> None:
+        if not rows:
+            return
+        try:
+            _write_rows(rows)
+            self._count(written=len(rows), batches=1)
+        except Exception:
+            self._count(errors=1, dropped=len(rows))
+            logger.exception("audit batch of %d rows failed", len(rows))
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            batch: list[Row] = []
+            waiters: list[threading.Event] = []
+            item = self._queue.get()
+            deadline = time.monotonic() + self.flush_ms / 1000.0
+            while True:
+                if item is None:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    batch.append(item)
+                if stop or waiters or len(batch) >= self.batch_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if stop:
+                # drain whatever arrived before the stop marker was processed
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if isinstance(item, threading.Event):
+                        waiters.append(item)
+                    elif item is not None:
+                        batch.append(item)
+            self._commit(batch)
+            for ev in waiters:
+                ev.set()
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            counts = {
+                "enqueued": self.enqueued,
+                "written": self.written,
+                "dropped": self.dropped,
+                "batches": self.batches,
+                "errors": self.errors,
+            }
+        return {
+            "running": self.running,
+            "policy": self.policy,
+            "queue_depth": self._queue.qsize(),
+            **counts,
+        }
+
+
+_WRITER = AuditWriter()
+
+
+def configure(**options: Any) -> AuditWriter:
+    """Replace the process-wide writer (stopping the old one) with new options."""
+    global _WRITER
+    _WRITER.stop()
+    _WRITER = AuditWriter(**options)
+    return _WRITER
+
+
+def get_writer() -> AuditWriter:
+    return _WRITER
+
+
+def start() -> None:
+    _WRITER.start()
+
+
+def stop() -> None:
+    _WRITER.stop()
+
+
+def flush(timeout: float = 5.0) -> bool:
+    return _WRITER.flush(timeout)
+
+
+def stats() -> dict[str, Any]:
+    return _WRITER.stats()
+
+
+def record(action: str, payload: Any, result: Any, mood: str = "") -> bool:
+    """Queue one audit row; returns False if backpressure dropped it."""
+    row = (
+        action,
+        json.dumps(payload, ensure_ascii=False),
+        json.dumps(result, ensure_ascii=False),
+        mood,
+    )
+    return _WRITER.submit(row)
@@ -0,0 +1,112 @@
+"""Application-scoped, pooled ``httpx.AsyncClient`` for the /mcp proxy.
+
+The SSE and POST pass-through routes share one client so backend calls reuse
+keep-alive connections to the MCP server instead of paying a TCP connect per
+request. The app lifespan calls ``configure()``/``start()`` and ``stop()``;
+``get_client()`` lazily creates a client with the current options when the
+lifespan did not run (scripts, TestClient without a context manager).
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import Any, Optional
+
+import httpx
+
+
+logger = logging.getLogger("echo_bridge.backend_client")
+
+_DEFAULTS: dict[str, Any] = {
+    "max_connections": 100,
+    "max_keepalive": 20,
+    "keepalive_expiry": 30.0,
+    "connect_timeout": 5.0,
+    "pool_timeout": 10.0,
+    "http2": False,
+}
+
+_options: dict[str, Any] = dict(_DEFAULTS)
+_client: Optional[httpx.AsyncClient] = None
+_requests = 0
+
+
+async def _count_request(request: httpx.Request) -> None:
+    global _requests
+    _requests += 1
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # type: ignore  # noqa: F401
+    except Exception:
+        return False
+    return True
+
+
+def _build() -> httpx.AsyncClient:
+    http2 = bool(_options["http2"])
+    if http2 and not _http2_available():
+        logger.warning("backend http2 requested but the 'h2' package is not installed; using HTTP/1.1")
+        http2 = False
+    limits = httpx.Limits(
+        max_connections=int(_options["max_connections"]),
+        max_keepalive_connections=int(_options["max_keepalive"]),
+        keepalive_expiry=float(_options["keepalive_expiry"]),
+    )
+    # Streams are long-lived: no read/write timeout, but bound connect and pool waits
+    timeout = httpx.Timeout(None, connect=float(_options["connect_timeout"]), pool=float(_options["pool_timeout"]))
+    return httpx.AsyncClient(limits=limits, timeout=timeout, http2=http2, event_hooks={"request": [_count_request]})
+
+
+def configure(**options: Any) -> None:
+    """Set pool options; takes effect on the next ``start()``."""
+    unknown = set(options) - set(_DEFAULTS)
+    if unknown:
+        raise ValueError(f"unknown backend client options: {sorted(unknown)}")
+    _options.clear()
+    _options.update(_DEFAULTS)
+    _options.update(options)
+
+
+def start() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build()
+    return _client
+
+
+async def stop() -> None:
+    global _client
+    client, _client = _client, None
+    if client is not None and not client.is_closed:
+        await client.aclose()
+
+
+def get_client() -> httpx.AsyncClient:
+    return start()
+
+
+def stats() -> dict[str, Any]:
+    out: dict[str, Any] = {
+        "open": _client is not None and not _client.is_closed,
+        "requests": _requests,
+        "max_connections": int(_options["max_connections"]),
+        "max_keepalive": int(_options["max_keepalive"]),
+        "connections": 0,
+        "active": 0,
+        "idle": 0,
+        "queued": 0,
+    }
+    if _client is None:
+        return out
+    try:
+        # httpcore's pool is not public API; report what it exposes
+        pool = _client._transport._pool  # type: ignore[attr-defined]
+        conns = list(pool.connections)
+        idle = sum(1 for c in conns if c.is_idle())
+        queued = sum(1 for r in pool._requests if r.connection is None)
+        out.update(connections=len(conns), idle=idle, active=len(conns) - idle, queued=queued)
+    except Exception:
+        pass
+    return out
@@ -0,0 +1,425 @@
+"""Forwarder for ``POST /mcp`` JSON-RPC calls to the MCP backend.
+
+Compared with a plain streamed proxy it adds:
+
+  - retries that are safe: a request is retried only when it failed before
+    any of its body reached the backend (connect/pool errors), or when the
+    body is buffered and the JSON-RPC method is read-only
+  - coalescing: identical concurrent calls for the methods in
+    ``coalesce_methods`` (``initialize``, ``tools/list``) share one backend
+    round trip; each follower gets the leader's response with its own
+    JSON-RPC id. Responses that open a session (``Mcp-Session-Id``) are never
+    shared.
+  - timing: connect (0 on a reused keep-alive connection), time to first
+    byte and total per request, returned as ``Server-Timing`` and aggregated
+    in ``stats()``
+
+Request bodies up to ``max_buffer_bytes`` are read up front (MCP calls are
+small JSON documents); larger bodies are streamed and never retried once
+streaming has started.
+
+``InProcessResponse`` serves the same call with the FastMCP ``http_app``
+running in this process instead, with the same header filtering and
+response headers as the proxy.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Optional
+
+import httpx
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+
+logger = logging.getLogger("echo_bridge.mcp_forwarder")
+
+# Request headers passed on to the MCP server, by the proxy and in-process alike
+FORWARDED_REQUEST_HEADERS = {"accept", "content-type", "authorization", "x-api-key", "x-bridge-key", "x-profile"}
+HOP_BY_HOP = {"connection", "keep-alive", "proxy-authenticate", "proxy-authorization", "te", "trailer", "transfer-encoding", "upgrade"}
+READ_ONLY_METHODS = {"initialize", "ping", "tools/list", "resources/list", "resources/templates/list", "prompts/list"}
+_CONNECT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+# Request headers that make two calls different even with identical bodies
+_KEY_HEADERS = ("authorization", "x-api-key", "x-bridge-key", "x-profile", "mcp-session-id", "mcp-protocol-version", "accept")
+
+_DEFAULTS: dict[str, Any] = {
+    "max_buffer_bytes": 1 << 20,
+    "coalesce_methods": ["initialize", "tools/list"],
+    "retries": 3,
+    "backoff_base": 0.3,
+}
+_options: dict[str, Any] = dict(_DEFAULTS)
+
+_inflight: dict[tuple[Any, ...], asyncio.Future[Optional[tuple[int, dict[str, str], bytes]]]] = {}
+_totals: dict[str, float] = {
+    "requests": 0,
+    "coalesced": 0,
+    "retries": 0,
+    "errors": 0,
+    "reused_connections": 0,
+    "connect_ms_sum": 0.0,
+    "ttfb_ms_sum": 0.0,
+    "total_ms_sum": 0.0,
+    "ttfb_ms_max": 0.0,
+    "total_ms_max": 0.0,
+}
+
+
+def configure(**options: Any) -> None:
+    unknown = set(options) - set(_DEFAULTS)
+    if unknown:
+        raise ValueError(f"unknown mcp forwarder options: {sorted(unknown)}")
+    _options.clear()
+    _options.update(_DEFAULTS)
+    _options.update({k: v for k, v in options.items() if v is not None})
+
+
+def stats() -> dict[str, Any]:
+    n = max(1, int(_totals["requests"] - _totals["coalesced"]))
+    return {
+        "requests": int(_totals["requests"]),
+        "coalesced": int(_totals["coalesced"]),
+        "retries": int(_totals["retries"]),
+        "errors": int(_totals["errors"]),
+        "reused_connections": int(_totals["reused_connections"]),
+        "inflight_coalesce_keys": len(_inflight),
+        "avg_connect_ms": round(_totals["connect_ms_sum"] / n, 2),
+        "avg_ttfb_ms": round(_totals["ttfb_ms_sum"] / n, 2),
+        "avg_total_ms": round(_totals["total_ms_sum"] / n, 2),
+        "max_ttfb_ms": round(_totals["ttfb_ms_max"], 2),
+        "max_total_ms": round(_totals["total_ms_max"], 2),
+    }
+
+
+@dataclass
+class Timing:
+    start: float = 0.0
+    connect_ms: float = 0.0
+    ttfb_ms: float = 0.0
+    total_ms: float = 0.0
+    reused: bool = True
+    retries: int = 0
+    coalesced: bool = False
+
+    def server_timing(self) -> str:
+        parts = [f"connect;dur={self.connect_ms:.1f}", f"ttfb;dur={self.ttfb_ms:.1f}"]
+        if self.coalesced:
+            parts.append('coalesced;desc="shared backend call"')
+        return ", ".join(parts)
+
+
+def _rpc_call(body: Optional[bytes]) -> tuple[Optional[str], Any]:
+    """Return (method, id) of a single JSON-RPC request body, else (None, None)."""
+    if not body:
+        return None, None
+    try:
+        msg = json.loads(body)
+    except Exception:
+        return None, None
+    if not isinstance(msg, dict) or not isinstance(msg.get("method"), str):
+        return None, None
+    return msg["method"], msg.get("id")
+
+
+def _rewrite_id(body: bytes, content_type: str, new_id: Any) -> Optional[bytes]:
+    """Put ``new_id`` into a single JSON-RPC response (plain JSON or one SSE event)."""
+    def _swap(raw: str) -> Optional[str]:
+        try:
+            msg = json.loads(raw)
+        except Exception:
+            return None
+        if not isinstance(msg, dict) or "id" not in msg:
+            return None
+        msg["id"] = new_id
+        return json.dumps(msg, ensure_ascii=False, separators=(",", ":"))
+
+    text = body.decode("utf-8", errors="replace")
+    if "text/event-stream" in content_type:
+        lines = text.splitlines()
+        data_idx = [i for i, line in enumerate(lines) if line.startswith("data:")]
+        if len(data_idx) != 1:
+            return None
+        swapped = _swap(lines[data_idx[0]][5:].strip())
+        if swapped is None:
+            return None
+        lines[data_idx[0]] = "data: " + swapped
+        return ("\n".join(lines) + "\n\n").encode("utf-8")
+    swapped = _swap(text)
+    return swapped.encode("utf-8") if swapped is not None else None
+
+
+def _response_headers(resp: httpx.Response, decoded: bool = False) -> dict[str, str]:
+    out = {k: v for k, v in resp.headers.items() if k.lower() not in HOP_BY_HOP}
+    if decoded:
+        # aread() returns decoded bytes; length is recomputed by the caller
+        out = {k: v for k, v in out.items() if k.lower() not in ("content-encoding", "content-length")}
+    out.setdefault("Cache-Control", "no-cache")
+    out["Access-Control-Allow-Origin"] = "*"
+    return out
+
+
+async def read_body(request: Request) -> tuple[Optional[bytes], Optional[AsyncIterator[bytes]]]:
+    """Buffer the request body when small; otherwise return a stream of the rest.
+
+    Returns (body, None) or (None, stream).
+    """
+    limit = int(_options["max_buffer_bytes"])
+    declared = request.headers.get("content-length")
+    if declared is not None and declared.isdigit() and int(declared) > limit:
+        return None, request.stream()
+    chunks: list[bytes] = []
+    size = 0
+    it = request.stream().__aiter__()
+    async for chunk in it:
+        chunks.append(chunk)
+        size += len(chunk)
+        if size > limit:
+            async def rest(head: list[bytes] = chunks) -> AsyncIterator[bytes]:
+                for c in head:
+                    yield c
+                async for c in it:
+                    yield c
+            return None, rest()
+    return b"".join(chunks), None
+
+
+class MCPForwardResponse(Response):
+    """Send one JSON-RPC POST to the backend and relay status, headers and body.
+
+    ``on_chunk`` is called with the size of every uploaded/downloaded chunk
+    (positive = down, negative = up); ``on_close`` with the final Timing and
+    an error string or None.
+    """
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        url: str,
+        headers: dict[str, str],
+        body: Optional[bytes],
+        stream: Optional[AsyncIterator[bytes]] = None,
+        on_chunk: Optional[Callable[[int], None]] = None,
+        on_close: Optional[Callable[[Timing, Optional[str]], None]] = None,
+    ) -> None:
+        self.status_code = 200
+        self.background = None
+        self.init_headers({})
+        self.client = client
+        self.url = url
+        self.fwd_headers = headers
+        self.body_bytes = body
+        self.body_stream = stream
+        self.on_chunk = on_chunk or (lambda n: None)
+        self.on_close = on_close
+        self.committed = False
+
+    # --- backend round trip -------------------------------------------------
+
+    def _content(self) -> Any:
+        if self.body_bytes is not None:
+            return self.body_bytes
+
+        async def upload() -> AsyncIterator[bytes]:
+            assert self.body_stream is not None
+            async for chunk in self.body_stream:
+                self.committed = True
+                self.on_chunk(-len(chunk))
+                yield chunk
+
+        return upload()
+
+    async def _open(self, timing: Timing, method: Optional[str]) -> httpx.Response:
+        retries = max(1, int(_options["retries"]))
+        backoff = float(_options["backoff_base"])
+        idempotent = self.body_bytes is not None and method in READ_ONLY_METHODS
+        attempt = 0
+        while True:
+            attempt += 1
+
+            async def trace(name: str, info: dict[str, Any], _t: dict[str, float] = {}) -> None:
+                if name == "connection.connect_tcp.started":
+                    _t["c"] = time.perf_counter()
+                    timing.reused = False
+                elif name in ("connection.connect_tcp.complete", "connection.start_tls.complete") and "c" in _t:
+                    timing.connect_ms = (time.perf_counter() - _t["c"]) * 1000
+
+            req = self.client.build_request("POST", self.url, headers=self.fwd_headers, content=self._content(), extensions={"trace": trace})
+            try:
+                resp = await self.client.send(req, stream=True)
+                timing.ttfb_ms = (time.perf_counter() - timing.start) * 1000
+                return resp
+            except Exception as e:
+                retryable = not self.committed and (isinstance(e, _CONNECT_ERRORS) or (idempotent and isinstance(e, httpx.TransportError)))
+                if attempt >= retries or not retryable:
+                    raise
+                timing.retries += 1
+                logger.info("mcp POST: retrying %s after %s (attempt %d)", method or "request", type(e).__name__, attempt)
+                await asyncio.sleep(backoff * (2 ** (attempt - 1)))
+
+    async def _shared(self, key: tuple[Any, ...], timing: Timing, method: str, rpc_id: Any) -> Optional[tuple[int, dict[str, str], bytes]]:
+        """Run or join the in-flight call for ``key``; None means "send your own"."""
+        fut = _inflight.get(key)
+        if fut is not None:
+            shared = await asyncio.shield(fut)
+            if shared is None:
+                return None
+            status, headers, body = shared
+            rewritten = _rewrite_id(body, headers.get("content-type", ""), rpc_id)
+            if rewritten is None:
+                return None
+            timing.coalesced = True
+            return status, headers, rewritten
+
+        fut = asyncio.get_running_loop().create_future()
+        _inflight[key] = fut
+        result: Optional[tuple[int, dict[str, str], bytes]] = None
+        try:
+            resp = await self._open(timing, method)
+            try:
+                body = await resp.aread()
+            finally:
+                await resp.aclose()
+            result = (resp.status_code, _response_headers(resp, decoded=True), body)
+            return result
+        finally:
+            _inflight.pop(key, None)
+            # a session-bound or failed response is not shareable
+            shareable = result is not None and result[0] == 200 and not any(k.lower() == "mcp-session-id" for k in result[1])
+            fut.set_result(result if shareable else None)
+
+    # --- ASGI ---------------------------------------------------------------
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        timing = Timing(start=time.perf_counter())
+        method, rpc_id = _rpc_call(self.body_bytes)
+        error: Optional[str] = None
+        try:
+            if method in _options["coalesce_methods"]:
+                key = (method, self.url, self.body_bytes if rpc_id is None else _body_without_id(self.body_bytes))
+                key += tuple(self.fwd_headers.get(h, "") for h in _KEY_HEADERS)
+                shared = await self._shared(key, timing, method, rpc_id)
+                if shared is not None:
+                    status, headers, body = shared
+                    headers = {**headers, "Content-Length": str(len(body)), "Server-Timing": timing.server_timing()}
+                    await send({"type": "http.response.start", "status": status, "headers": _raw(headers)})
+                    await send({"type": "http.response.body", "body": body})
+                    self.on_chunk(len(body))
+                    return
+            resp = await self._open(timing, method)
+            try:
+                headers = {**_response_headers(resp), "Server-Timing": timing.server_timing()}
+                await send({"type": "http.response.start", "status": resp.status_code, "headers": _raw(headers)})
+                async for chunk in resp.aiter_raw():
+                    if chunk:
+                        self.on_chunk(len(chunk))
+                        await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                await send({"type": "http.response.body", "body": b""})
+            finally:
+                await resp.aclose()
+        except Exception as e:  # noqa: BLE001
+            error = f"{type(e).__name__}: {e}"
+            _totals["errors"] += 1
+            if not timing.ttfb_ms:
+                body = json.dumps({"detail": f"Failed to connect backend: {e}"}).encode()
+                await send({"type": "http.response.start", "status": 502, "headers": _raw({"content-type": "application/json", "content-length": str(len(body))})})
+                await send({"type": "http.response.body", "body": body})
+            else:
+                logger.warning("mcp POST: response stream error: %s", e)
+        finally:
+            timing.total_ms = (time.perf_counter() - timing.start) * 1000
+            _record(timing)
+            if self.on_close is not None:
+                self.on_close(timing, error)
+
+
+class InProcessResponse(Response):
+    """Hand the request to an in-process ASGI app mounted at ``path``.
+
+    The request body is not read here; the app receives it from the original
+    ``receive`` channel. Callbacks match MCPForwardResponse.
+    """
+
+    def __init__(
+        self,
+        app: Callable[[Scope, Receive, Send], Any],
+        path: str = "/",
+        on_chunk: Optional[Callable[[int], None]] = None,
+        on_close: Optional[Callable[[Timing, Optional[str]], None]] = None,
+    ) -> None:
+        self.status_code = 200
+        self.background = None
+        self.init_headers({})
+        self.app = app
+        self.path = path
+        self.on_chunk = on_chunk or (lambda n: None)
+        self.on_close = on_close
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        timing = Timing(start=time.perf_counter())
+        headers = [(k, v) for k, v in scope["headers"] if k.decode("latin-1") in FORWARDED_REQUEST_HEADERS or k == b"content-length"]
+        sub_scope = dict(scope, path=self.path, raw_path=self.path.encode(), root_path="", headers=headers)
+
+        async def receive_counted() -> Any:
+            message = await receive()
+            if message["type"] == "http.request" and message.get("body"):
+                self.on_chunk(-len(message["body"]))
+            return message
+
+        async def send_filtered(message: Any) -> None:
+            if message["type"] == "http.response.start":
+                timing.ttfb_ms = (time.perf_counter() - timing.start) * 1000
+                raw = [(k, v) for k, v in message.get("headers", []) if k.decode("latin-1").lower() not in HOP_BY_HOP]
+                names = {k.lower() for k, _ in raw}
+                if b"cache-control" not in names:
+                    raw.append((b"cache-control", b"no-cache"))
+                raw = [(k, v) for k, v in raw if k.lower() != b"access-control-allow-origin"]
+                raw.append((b"access-control-allow-origin", b"*"))
+                raw.append((b"server-timing", timing.server_timing().encode()))
+                message = {**message, "headers": raw}
+            elif message["type"] == "http.response.body" and message.get("body"):
+                self.on_chunk(len(message["body"]))
+            await send(message)
+
+        error: Optional[str] = None
+        try:
+            await self.app(sub_scope, receive_counted, send_filtered)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            _totals["errors"] += 1
+            raise
+        finally:
+            timing.total_ms = (time.perf_counter() - timing.start) * 1000
+            _record(timing)
+            if self.on_close is not None:
+                self.on_close(timing, error)
+
+
+def _body_without_id(body: Optional[bytes]) -> str:
+    msg = json.loads(body or b"{}")
+    msg.pop("id", None)
+    return json.dumps(msg, sort_keys=True, separators=(",", ":"))
+
+
+def _raw(headers: dict[str, str]) -> list[tuple[bytes, bytes]]:
+    return [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers.items()]
+
+
+def _record(t: Timing) -> None:
+    _totals["requests"] += 1
+    _totals["retries"] += t.retries
+    if t.coalesced:
+        _totals["coalesced"] += 1
+        return
+    if t.reused:
+        _totals["reused_connections"] += 1
+    _totals["connect_ms_sum"] += t.connect_ms
+    _totals["ttfb_ms_sum"] += t.ttfb_ms
+    _totals["total_ms_sum"] += t.total_ms
+    _totals["ttfb_ms_max"] = max(_totals["ttfb_ms_max"], t.ttfb_ms)
+    _totals["total_ms_max"] = max(_totals["total_ms_max"], t.total_ms)
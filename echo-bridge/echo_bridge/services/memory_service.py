@@ -1,12 +1,23 @@
 from __future__ import annotations
 
-from typing import Any, Optional
+from typing import Any, Iterable, NamedTuple, Optional
+import base64
+import json
+import math
 import re
 import sqlite3
+import time
 
 from pydantic import BaseModel
 
-from ..db import get_conn
+from ..ai.embedder import embed, embed_all, nearest, store_vectors
+from ..db import CHUNKS_FTS_INSERT_TRIGGER, FTS_COLUMNS, connection, get_pool, write
+from ..soul.timeline import parse_time
+from . import search_cache
+
+
+# Stay well below SQLITE_MAX_VARIABLE_NUMBER on older builds
+_SQL_VARS_PER_QUERY = 500
 
 
 class Chunk(BaseModel):
@@ -23,53 +34,142 @@ class Hit(BaseModel):
     snippet: str
     source: str | None = None
     title: str | None = None
+    # Per-signal scores, only set by hybrid search
+    bm25: float | None = None
+    cosine: float | None = None
 
 
-def add_chunks(source: str, title: str | None, texts: list[str], meta: dict[str, Any] | None) -> int:
-    if not texts:
-        return 0
-    conn = get_conn()
-    cur = conn.cursor()
-    count = 0
-    meta_json = None
-    if meta is not None:
-        import json
-
-        meta_json = json.dumps(meta, ensure_ascii=False)
-    for t in texts:
+class NewChunk(NamedTuple):
+    source: str
+    title: str | None
+    text: str
+    meta: dict[str, Any] | None = None
+
+
+def _meta_tags(meta: dict[str, Any] | None) -> tuple[str, ...]:
+    if meta and isinstance(meta.get("tags"), (list, tuple)):
+        return tuple(str(t) for t in meta["tags"])
+    return ()
+
+
+def _resolve_tag_ids(cur: sqlite3.Cursor, names: set[str]) -> dict[str, int]:
+    """Create missing tags and return name -> id for the whole batch at once."""
+    if not names:
+        return {}
+    ordered = sorted(names)
+    cur.executemany("INSERT OR IGNORE INTO tags(name) VALUES (?)", [(n,) for n in ordered])
+    ids: dict[str, int] = {}
+    for i in range(0, len(ordered), _SQL_VARS_PER_QUERY):
+        part = ordered[i : i + _SQL_VARS_PER_QUERY]
+        marks = ",".join("?" * len(part))
+        for row in cur.execute(f"SELECT id, name FROM tags WHERE name IN ({marks})", part):
+            ids[row["name"]] = row["id"]
+    return ids
+
+
+def _insert_batch(cur: sqlite3.Cursor, batch: list[NewChunk], defer_fts: bool, vectors: list[list[float]]) -> list[int]:
+    """Insert one batch and its precomputed vectors inside the caller's transaction; returns the new chunk ids."""
+    meta_cache: dict[int, str | None] = {}
+
+    def _meta_json(meta: dict[str, Any] | None) -> str | None:
+        if meta is None:
+            return None
+        key = id(meta)
+        if key not in meta_cache:
+            meta_cache[key] = json.dumps(meta, ensure_ascii=False)
+        return meta_cache[key]
+
+    if defer_fts:
+        cur.execute("DROP TRIGGER IF EXISTS chunks_ai")
+    cur.executemany(
+        "INSERT INTO chunks(doc_source, doc_title, text, meta_json) VALUES (?,?,?,?)",
+        [(c.source, c.title, c.text, _meta_json(c.meta)) for c in batch],
+    )
+    # The write lock is held for the whole statement, so AUTOINCREMENT ids are contiguous
+    last_id = int(cur.execute("SELECT last_insert_rowid()").fetchone()[0])
+    ids = list(range(last_id - len(batch) + 1, last_id + 1))
+    if defer_fts:
         cur.execute(
-            "INSERT INTO chunks(doc_source, doc_title, text, meta_json) VALUES (?,?,?,?)",
-            (source, title, t, meta_json),
+            "INSERT INTO chunks_fts(rowid, text, doc_title) SELECT id, text, doc_title FROM chunks WHERE id BETWEEN ? AND ?",
+            (ids[0], ids[-1]),
         )
-        rowid = cur.lastrowid
-        count += 1
-        # if meta contains tags, persist them
-        if meta and isinstance(meta.get("tags"), (list, tuple)):
-            tags = meta.get("tags")
-            for tag in tags:
-                # insert or ignore tag
-                cur.execute("INSERT OR IGNORE INTO tags(name) VALUES (?)", (tag,))
-                # get tag id
-                cur.execute("SELECT id FROM tags WHERE name=?", (tag,))
-                tr = cur.fetchone()
-                if tr:
-                    tag_id = tr[0]
-                    cur.execute(
-                        "INSERT OR IGNORE INTO chunk_tags(chunk_id, tag_id) VALUES (?,?)",
-                        (rowid, tag_id),
-                    )
-    conn.commit()
-    return count
+        cur.execute(CHUNKS_FTS_INSERT_TRIGGER)
 
+    store_vectors(cur, list(zip(ids, vectors)))
 
-def get_tags_for_chunk(chunk_id: int) -> list[str]:
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT t.name FROM tags t JOIN chunk_tags ct ON ct.tag_id=t.id WHERE ct.chunk_id=?",
-        (chunk_id,),
+    batch_tags = [_meta_tags(c.meta) for c in batch]
+    tag_ids = _resolve_tag_ids(cur, {t for tags in batch_tags for t in tags})
+    links = [(cid, tag_ids[t]) for cid, tags in zip(ids, batch_tags) for t in tags if t in tag_ids]
+    if links:
+        cur.executemany("INSERT OR IGNORE INTO chunk_tags(chunk_id, tag_id) VALUES (?,?)", links)
+    return ids
+
+
+def add_chunk_records(
+    records: Iterable[NewChunk],
+    *,
+    batch_size: int = 500,
+    defer_fts: bool = False,
+) -> int:
+    """Bulk ingest engine used by every ingest path.
+
+    Each batch is one write job on the DB writer, written with ``executemany``
+    with tag ids resolved once per batch; embeddings are computed on the
+    calling thread first so the writer only inserts. With ``defer_fts`` the
+    per-row FTS trigger is replaced by one ``INSERT ... SELECT`` per batch,
+    followed by an FTS merge once all batches are in. That swap is a schema
+    change committed with whatever else shares the writer's group, so it is
+    meant for offline loads, not for a server answering searches.
+    """
+    total = 0
+    batch: list[NewChunk] = []
+
+    def _flush() -> None:
+        nonlocal total
+        if not batch:
+            return
+        rows = list(batch)
+        batch.clear()
+        vectors = embed_all(c.text for c in rows)
+        total += len(write(lambda conn: _insert_batch(conn.cursor(), rows, defer_fts, vectors)))
+
+    for rec in records:
+        batch.append(rec)
+        if len(batch) >= batch_size:
+            _flush()
+    _flush()
+    if defer_fts and total:
+        write(lambda conn: conn.execute("INSERT INTO chunks_fts(chunks_fts, rank) VALUES ('merge', 500)"))
+    if total:
+        search_cache.bump_generation()
+    return total
+
+
+def add_chunks(
+    source: str,
+    title: str | None,
+    texts: list[str],
+    meta: dict[str, Any] | None,
+    *,
+    defer_fts: bool = False,
+) -> int:
+    if not texts:
+        return 0
+    return add_chunk_records(
+        (NewChunk(source, title, t, meta) for t in texts),
+        batch_size=max(1, len(texts)),
+        defer_fts=defer_fts,
     )
-    return [r[0] for r in cur.fetchall()]
+
+
+def get_tags_for_chunk(chunk_id: int) -> list[str]:
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT t.name FROM tags t JOIN chunk_tags ct ON ct.tag_id=t.id WHERE ct.chunk_id=?",
+            (chunk_id,),
+        )
+        return [r[0] for r in cur.fetchall()]
 
 
 def _sanitize_query(q: str) -> str:
@@ -78,46 +178,245 @@ def _sanitize_query(q: str) -> str:
     return " ".join(toks[:32])  # cap tokens for safety
 
 
-def search(q: str, k: int = 5) -> list[Hit]:
-    conn = get_conn()
-    cur = conn.cursor()
+class SearchFilters(NamedTuple):
+    """Server-side restrictions applied inside the search SQL.
+
+    ``since``/``until`` are UTC ``YYYY-MM-DD HH:MM:SS`` strings, the format of
+    ``chunks.ts``; build filters from user input with ``parse``.
+    """
+
+    source: str | None = None
+    tags: tuple[str, ...] = ()
+    since: str | None = None
+    until: str | None = None
+
+    @classmethod
+    def parse(
+        cls,
+        source: str | None = None,
+        tags: Iterable[str] = (),
+        since: str | float | None = None,
+        until: str | float | None = None,
+    ) -> "SearchFilters":
+        """Filters from request values; bounds are epoch seconds or ISO 8601 (naive = UTC).
+
+        Raises ValueError for an unparseable bound.
+        """
+        return cls(source=source or None, tags=tuple(tags), since=_ts_bound(since), until=_ts_bound(until))
+
+
+def _ts_bound(value: str | float | None) -> str | None:
+    ts = parse_time(value)
+    if ts is None:
+        return None
+    # chunks.ts has whole seconds, so rounding up keeps ">= since" and "< until" exact
+    try:
+        return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(math.ceil(ts)))
+    except (OverflowError, OSError, ValueError):
+        raise ValueError(f"timestamp out of range: {value!r}") from None
+
+
+# bm25() weight per FTS_COLUMNS entry: a title match counts double
+BM25_WEIGHTS: dict[str, float] = {"text": 1.0, "doc_title": 2.0}
+
+
+def _encode_cursor(rank: float, id: int) -> str:
+    raw = json.dumps([rank, id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[float, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        rank, id = json.loads(raw)
+        return float(rank), int(id)
+    except Exception:
+        raise ValueError("invalid cursor") from None
+
+
+def _filter_sql(filters: SearchFilters | None) -> tuple[str, list[Any]]:
+    """Return an SQL fragment (prefixed with AND, over alias c) and its params."""
+    if filters is None:
+        return "", []
+    sql: list[str] = []
+    params: list[Any] = []
+    if filters.source:
+        sql.append("c.doc_source = ?")
+        params.append(filters.source)
+    if filters.since:
+        sql.append("c.ts >= ?")
+        params.append(filters.since)
+    if filters.until:
+        sql.append("c.ts < ?")
+        params.append(filters.until)
+    tags = sorted(set(filters.tags))
+    if tags:
+        # chunk must carry every requested tag
+        sql.append(
+            f"""c.id IN (
+                SELECT ct.chunk_id FROM chunk_tags ct JOIN tags t ON t.id = ct.tag_id
+                WHERE t.name IN ({",".join("?" * len(tags))})
+                GROUP BY ct.chunk_id HAVING COUNT(*) = ?)"""
+        )
+        params.extend(tags)
+        params.append(len(tags))
+    return "".join(f" AND {frag}" for frag in sql), params
+
+
+def _cache_key(mode: str, sanitized: str, k: int, filters: SearchFilters | None, *extra: Any) -> tuple[Any, ...]:
+    f = filters or SearchFilters()
+    # The database path keeps results from a previously initialised DB apart
+    return (str(get_pool().path), mode, sanitized, k, f._replace(tags=tuple(sorted(set(f.tags)))), *extra)
+
+
+def search_page(
+    q: str, k: int = 5, filters: SearchFilters | None = None, cursor: str | None = None
+) -> tuple[list[Hit], str | None]:
+    """BM25-ranked, filtered search returning one page of hits and the cursor of the next page.
+
+    Hit.score is the negated bm25() value, so higher is better. Pages are
+    keyset-paginated on (rank, id); raises ValueError for a malformed cursor.
+    Results are served from the search cache until the next write.
+    """
     sanitized = _sanitize_query(q or "")
     if not sanitized:
-        return []
+        return [], None
+    after = _decode_cursor(cursor) if cursor else None
+    hits, next_cursor = search_cache.get_cache().get_or_compute(
+        _cache_key("lexical", sanitized, k, filters, after),
+        lambda: _search_page(sanitized, k, filters, after),
+    )
+    return list(hits), next_cursor
+
+
+def _search_page(
+    sanitized: str, k: int, filters: SearchFilters | None, after: tuple[float, int] | None
+) -> tuple[list[Hit], str | None]:
+    where, params = _filter_sql(filters)
+    weights = [BM25_WEIGHTS.get(col, 1.0) for col in FTS_COLUMNS]
+    page, page_params = "", []
+    if after is not None:
+        page = "WHERE rank > ? OR (rank = ? AND id > ?)"
+        page_params = [after[0], after[0], after[1]]
     try:
-        # Using rank and snippet for highlights; sanitized query avoids FTS parser errors
-        cur.execute(
-            """
-            SELECT c.id as id,
-                0.0 AS score,
-                snippet(chunks_fts, 0, '[', ']', ' … ', 10) AS snip,
-                c.doc_source as source,
-                c.doc_title as title
-            FROM chunks_fts
-            JOIN chunks c ON c.id = chunks_fts.rowid
-            WHERE chunks_fts MATCH ?
-            ORDER BY rank LIMIT ?
-            """,
-            (sanitized, k),
-        )
-        rows = cur.fetchall()
+        # Sanitized query avoids FTS parser errors; fetch one extra row to know if more exist
+        with connection() as conn:
+            rows = conn.execute(
+                f"""
+                SELECT * FROM (
+                    SELECT c.id AS id,
+                        bm25(chunks_fts, {",".join("?" * len(weights))}) AS rank,
+                        snippet(chunks_fts, 0, '[', ']', ' … ', 10) AS snip,
+                        c.doc_source AS source,
+                        c.doc_title AS title
+                    FROM chunks_fts
+                    JOIN chunks c ON c.id = chunks_fts.rowid
+                    WHERE chunks_fts MATCH ?{where}
+                )
+                {page}
+                ORDER BY rank, id LIMIT ?
+                """,
+                (*weights, sanitized, *params, *page_params, k + 1),
+            ).fetchall()
     except sqlite3.OperationalError:
         # In case of unexpected syntax, fall back to empty
-        return []
-    hits = [Hit(id=row["id"], score=row["score"], snippet=row["snip"], source=row["source"], title=row["title"]) for row in rows]
-    return hits
+        return [], None
+    next_cursor = _encode_cursor(rows[k - 1]["rank"], rows[k - 1]["id"]) if len(rows) > k else None
+    hits = [
+        Hit(id=row["id"], score=-row["rank"], snippet=row["snip"], source=row["source"], title=row["title"])
+        for row in rows[:k]
+    ]
+    return hits, next_cursor
 
 
-def get_chunk(id: int) -> Chunk | None:
-    import json
+def search(q: str, k: int = 5, filters: SearchFilters | None = None) -> list[Hit]:
+    return search_page(q, k, filters)[0]
+
 
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT id, doc_source, doc_title, text, meta_json FROM chunks WHERE id=?",
-        (id,),
+# Reciprocal-rank fusion constant; 60 is the value from the original RRF paper
+RRF_K = 60
+
+
+def hybrid_search(q: str, k: int = 5, filters: SearchFilters | None = None, pool: int | None = None) -> list[Hit]:
+    """Fuse BM25 and embedding-similarity rankings with reciprocal-rank fusion.
+
+    Each signal contributes 1 / (RRF_K + rank) for its top ``pool`` results;
+    Hit.score is the fused value and Hit.bm25 / Hit.cosine carry the raw
+    per-signal scores (None when the chunk was not retrieved by that signal).
+    """
+    sanitized = _sanitize_query(q or "")
+    if not sanitized:
+        return []
+    pool = pool or max(k * 4, 20)
+    hits = search_cache.get_cache().get_or_compute(
+        _cache_key("hybrid", sanitized, k, filters, pool),
+        lambda: _hybrid_search(sanitized, k, filters, pool),
     )
-    row = cur.fetchone()
+    return list(hits)
+
+
+def _hybrid_search(sanitized: str, k: int, filters: SearchFilters | None, pool: int) -> list[Hit]:
+    lexical = _search_page(sanitized, pool, filters, None)[0]
+    by_id = {h.id: h for h in lexical}
+    vector: list[tuple[int, float]] = []
+    qvec = embed(sanitized) or []
+    if any(qvec):
+        # Filters are applied after retrieval, so over-fetch when they are set
+        vector = [(cid, s) for cid, s in nearest(qvec, pool * 4 if filters else pool) if s > 0]
+    missing = [cid for cid, _ in vector if cid not in by_id]
+    if missing:
+        where, params = _filter_sql(filters)
+        with connection() as conn:
+            rows = conn.execute(
+                f"""
+                SELECT c.id AS id, c.doc_source AS source, c.doc_title AS title, substr(c.text, 1, 160) AS snip
+                FROM chunks c WHERE c.id IN ({",".join("?" * len(missing))}){where}
+                """,
+                (*missing, *params),
+            ).fetchall()
+        for row in rows:
+            by_id[row["id"]] = Hit(id=row["id"], score=0.0, snippet=row["snip"], source=row["source"], title=row["title"])
+    vector = [(cid, s) for cid, s in vector if cid in by_id][:pool]
+
+    fused: dict[int, float] = {}
+    for rank, h in enumerate(lexical, start=1):
+        fused[h.id] = 1.0 / (RRF_K + rank)
+        by_id[h.id] = h.model_copy(update={"bm25": h.score})
+    for rank, (cid, cos) in enumerate(vector, start=1):
+        fused[cid] = fused.get(cid, 0.0) + 1.0 / (RRF_K + rank)
+        by_id[cid] = by_id[cid].model_copy(update={"cosine": cos})
+    ranked = sorted(fused.items(), key=lambda kv: (-kv[1], kv[0]))[:k]
+    return [by_id[cid].model_copy(update={"score": score}) for cid, score in ranked]
+
+
+def list_chunks(
+    limit: int = 20, filters: SearchFilters | None = None, cursor: str | None = None
+) -> tuple[list[dict[str, Any]], str | None]:
+    """Newest-first chunk listing (id, title, source, ts), keyset-paginated on id."""
+    where, params = _filter_sql(filters)
+    if cursor:
+        where += " AND c.id < ?"
+        params.append(_decode_cursor(cursor)[1])
+    with connection() as conn:
+        rows = conn.execute(
+            f"""
+            SELECT c.id AS id, c.doc_title AS title, c.doc_source AS source, c.ts AS ts
+            FROM chunks c WHERE 1=1{where}
+            ORDER BY c.id DESC LIMIT ?
+            """,
+            (*params, limit + 1),
+        ).fetchall()
+    items = [{"id": r["id"], "title": r["title"], "source": r["source"], "ts": r["ts"]} for r in rows[:limit]]
+    next_cursor = _encode_cursor(0.0, rows[limit - 1]["id"]) if len(rows) > limit else None
+    return items, next_cursor
+
+
+def get_chunk(id: int) -> Chunk | None:
+    with connection() as conn:
+        row = conn.execute(
+            "SELECT id, doc_source, doc_title, text, meta_json FROM chunks WHERE id=?",
+            (id,),
+        ).fetchone()
     if not row:
         return None
     meta = json.loads(row["meta_json"]) if row["meta_json"] else None
@@ -0,0 +1,191 @@
+"""Async data access over the chunks/tags/audits/sessions tables.
+
+Every call runs the existing sync service function on a dedicated DB executor
+(``db-executor-N`` threads) instead of AnyIO's default threadpool, so async
+routes and websocket handlers never block the event loop on SQLite, and DB
+work does not compete with the streaming proxies for threadpool tokens. Size
+the executor with ``configure(workers=...)``; the default matches the DB
+connection pool so a worker never waits on ``PoolTimeout``.
+
+The executor is created lazily, so scripts and tests that never run the app
+lifespan can still await these functions.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Optional, TypeVar
+
+from ..ai.brain import Policy
+from .. import profiling
+from ..db import connection
+from ..telemetry import DB_EXECUTOR_WAIT_SECONDS, DB_OP_SECONDS
+from . import actions_service, fs_service, memory_service
+from .memory_service import Chunk, Hit, NewChunk, SearchFilters
+
+
+T = TypeVar("T")
+
+_DEFAULT_WORKERS = 8
+
+_workers = _DEFAULT_WORKERS
+_executor: Optional[ThreadPoolExecutor] = None
+_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_totals = {"submitted": 0, "completed": 0, "errors": 0, "active": 0}
+_max_wait_ms = 0.0
+
+
+def configure(workers: Optional[int] = None) -> None:
+    """Set the executor size; takes effect on the next ``start()``."""
+    global _workers
+    _workers = max(1, int(workers or _DEFAULT_WORKERS))
+
+
+def start() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=_workers, thread_name_prefix="db-executor")
+        return _executor
+
+
+def stop(wait: bool = True) -> None:
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait, cancel_futures=not wait)
+
+
+def stats() -> dict[str, Any]:
+    executor = _executor
+    queued = executor._work_queue.qsize() if executor is not None else 0  # type: ignore[attr-defined]
+    return {
+        "workers": _workers,
+        "running": executor is not None,
+        **_totals,
+        "queued": queued,
+        "max_wait_ms": round(_max_wait_ms, 2),
+    }
+
+
+def _call(submitted: float, ctx: contextvars.Context, fn: Callable[..., T], args: tuple[Any, ...], kwargs: dict[str, Any]) -> T:
+    global _max_wait_ms
+    started = time.monotonic()
+    DB_EXECUTOR_WAIT_SECONDS.observe(started - submitted)
+    with _stats_lock:
+        _max_wait_ms = max(_max_wait_ms, (started - submitted) * 1000)
+        _totals["active"] += 1
+    ok = False
+    try:
+        result = ctx.run(fn, *args, **kwargs)
+        ok = True
+        return result
+    finally:
+        DB_OP_SECONDS.observe(time.monotonic() - started, getattr(fn, "__name__", "call"))
+        with _stats_lock:
+            _totals["active"] -= 1
+            _totals["completed"] += 1
+            if not ok:
+                _totals["errors"] += 1
+
+
+async def run(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking DB call on the DB executor and await its result."""
+    loop = asyncio.get_running_loop()
+    if profiling.current() is not None:
+        fn = profiling.profile_thread(fn)
+    with _stats_lock:
+        _totals["submitted"] += 1
+    call = functools.partial(_call, time.monotonic(), contextvars.copy_context(), fn, args, kwargs)
+    return await loop.run_in_executor(start(), call)
+
+
+# --- chunks ---------------------------------------------------------------
+
+async def search(q: str, k: int = 5, filters: SearchFilters | None = None) -> list[Hit]:
+    return await run(memory_service.search, q, k, filters)
+
+
+async def search_page(
+    q: str, k: int = 5, filters: SearchFilters | None = None, cursor: str | None = None
+) -> tuple[list[Hit], str | None]:
+    return await run(memory_service.search_page, q, k, filters, cursor)
+
+
+async def hybrid_search(q: str, k: int = 5, filters: SearchFilters | None = None) -> list[Hit]:
+    return await run(memory_service.hybrid_search, q, k, filters)
+
+
+async def get_chunk(id: int) -> Chunk | None:
+    return await run(memory_service.get_chunk, id)
+
+
+async def list_chunks(
+    limit: int = 20, filters: SearchFilters | None = None, cursor: str | None = None
+) -> tuple[list[dict[str, Any]], str | None]:
+    return await run(memory_service.list_chunks, limit, filters, cursor)
+
+
+async def add_chunks(source: str, title: str | None, texts: list[str], meta: dict[str, Any] | None) -> int:
+    return await run(memory_service.add_chunks, source, title, texts, meta)
+
+
+async def add_chunk_records(records: list[NewChunk], *, batch_size: int = 1000, defer_fts: bool = False) -> int:
+    return await run(memory_service.add_chunk_records, records, batch_size=batch_size, defer_fts=defer_fts)
+
+
+# --- tags -----------------------------------------------------------------
+
+async def get_tags_for_chunk(chunk_id: int) -> list[str]:
+    return await run(memory_service.get_tags_for_chunk, chunk_id)
+
+
+# --- audits / sessions ----------------------------------------------------
+
+def _recent(table: str, column: str, value: str | None, limit: int) -> list[dict[str, Any]]:
+    sql = f"SELECT * FROM {table}"
+    params: list[Any] = []
+    if value is not None:
+        sql += f" WHERE {column}=?"
+        params.append(value)
+    sql += " ORDER BY id DESC LIMIT ?"
+    params.append(limit)
+    with connection() as conn:
+        return [dict(r) for r in conn.execute(sql, params).fetchall()]
+
+
+async def recent_audits(action: str | None = None, limit: int = 50) -> list[dict[str, Any]]:
+    return await run(_recent, "audits", "action", action, limit)
+
+
+async def recent_sessions(kind: str | None = None, limit: int = 50) -> list[dict[str, Any]]:
+    return await run(_recent, "sessions", "kind", kind, limit)
+
+
+# --- actions / workspace --------------------------------------------------
+
+async def dispatch(
+    command: str,
+    args: dict[str, Any],
+    policy: Policy | None = None,
+    *,
+    tier_mode: str | None = None,
+    tiers_cfg: dict[str, dict[str, object]] | None = None,
+) -> dict[str, Any]:
+    return await run(actions_service.dispatch, command, args, policy, tier_mode=tier_mode, tiers_cfg=tiers_cfg)
+
+
+async def list_dir(workspace_dir: Path, subdir: str | None = None) -> list[fs_service.FSItem]:
+    return await run(fs_service.list_dir, workspace_dir, subdir)
+
+
+async def read_file(workspace_dir: Path, rel_path: str) -> str:
+    return await run(fs_service.read_file, workspace_dir, rel_path)
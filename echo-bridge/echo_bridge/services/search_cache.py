@@ -0,0 +1,114 @@
+"""Bounded LRU/TTL cache for search results.
+
+Entries are tagged with the write generation current when their query
+started. Every write that can change search results calls
+``bump_generation()``, which makes all older entries misses without having
+to scan the cache. The TTL bounds staleness for writes made by other
+processes sharing the database file.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+_GEN_LOCK = threading.Lock()
+_GENERATION = 0
+
+
+def generation() -> int:
+    return _GENERATION
+
+
+def bump_generation() -> int:
+    """Invalidate every cached result; call after committing chunk/tag writes or deletes."""
+    global _GENERATION
+    with _GEN_LOCK:
+        _GENERATION += 1
+        return _GENERATION
+
+
+class ResultCache:
+    def __init__(self, max_entries: int = 512, ttl_secs: float = 60.0) -> None:
+        self.max_entries = max_entries
+        self.ttl_secs = ttl_secs
+        self._data: OrderedDict[Hashable, tuple[int, float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale = 0
+
+    def get(self, key: Hashable) -> tuple[bool, Any]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                gen, expires, value = entry
+                if gen == _GENERATION and now < expires:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._data[key]
+                self.stale += 1
+            self.misses += 1
+            return False, None
+
+    def put(self, key: Hashable, gen: int, value: Any) -> None:
+        if self.max_entries <= 0 or gen != _GENERATION:
+            return
+        with self._lock:
+            self._data[key] = (gen, time.monotonic() + self.ttl_secs, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], T]) -> T:
+        found, value = self.get(key)
+        if found:
+            return value
+        gen = _GENERATION  # read before querying so a concurrent write invalidates the result
+        value = compute()
+        self.put(key, gen, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "stale": self.stale,
+                "generation": _GENERATION,
+            }
+
+
+_CACHE = ResultCache()
+
+
+def get_cache() -> ResultCache:
+    return _CACHE
+
+
+def configure(max_entries: int | None = None, ttl_secs: float | None = None) -> None:
+    """Resize the cache (0 disables it) or change the TTL; existing entries are dropped."""
+    if max_entries is not None:
+        _CACHE.max_entries = max(0, int(max_entries))
+    if ttl_secs is not None:
+        _CACHE.ttl_secs = float(ttl_secs)
+    _CACHE.clear()
+
+
+def stats() -> dict[str, int]:
+    return _CACHE.stats()
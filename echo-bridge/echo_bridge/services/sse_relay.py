@@ -0,0 +1,278 @@
+"""Frame-aware SSE relay from the MCP backend to a client.
+
+``SSERelayResponse`` is a raw ASGI response (no StreamingResponse layer). Per
+connection it runs three tasks:
+
+  - reader:   reads backend bytes, cuts them into complete SSE events (a frame
+              ends with a blank line) and puts them on a bounded queue
+  - writer:   sends queued frames to the client; when nothing was sent for
+              ``heartbeat_secs`` it emits a ``: heartbeat`` comment, so a silent
+              backend still keeps tunnels and proxies alive
+  - watcher:  waits for ``http.disconnect`` and tears the stream down
+
+When the queue stays full for ``slow_client_secs`` the client is not keeping
+up; the relay disconnects it instead of buffering without bound. Per-stream
+byte/frame/latency counters are kept while the stream is open and folded into
+the module totals when it closes.
+"""
+
+from __future__ import annotations
+
+import itertools
+import logging
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Optional
+
+import anyio
+import httpx
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+
+logger = logging.getLogger("echo_bridge.sse")
+
+_FRAME_END = re.compile(rb"\r\n\r\n|\n\n|\r\r")
+HEARTBEAT = b": heartbeat\n\n"
+
+_DEFAULTS: dict[str, Any] = {
+    "heartbeat_secs": 15.0,
+    "max_buffer_frames": 64,
+    "max_frame_bytes": 1 << 20,
+    "slow_client_secs": 10.0,
+}
+_options: dict[str, Any] = dict(_DEFAULTS)
+
+
+def configure(**options: Any) -> None:
+    unknown = set(options) - set(_DEFAULTS)
+    if unknown:
+        raise ValueError(f"unknown sse relay options: {sorted(unknown)}")
+    _options.clear()
+    _options.update(_DEFAULTS)
+    _options.update({k: v for k, v in options.items() if v is not None})
+
+
+class FrameSplitter:
+    """Accumulate bytes and return only complete SSE events.
+
+    A partial event larger than ``max_frame_bytes`` is passed through as-is so
+    a backend that never terminates an event cannot grow the buffer unbounded.
+    """
+
+    def __init__(self, max_frame_bytes: int) -> None:
+        self.max_frame_bytes = max_frame_bytes
+        self._buf = bytearray()
+
+    def feed(self, chunk: bytes) -> list[bytes]:
+        self._buf += chunk
+        frames: list[bytes] = []
+        start = 0
+        for m in _FRAME_END.finditer(self._buf):
+            frames.append(bytes(self._buf[start:m.end()]))
+            start = m.end()
+        del self._buf[:start]
+        if len(self._buf) > self.max_frame_bytes:
+            frames.append(bytes(self._buf))
+            self._buf.clear()
+        return frames
+
+    def flush(self) -> Optional[bytes]:
+        if not self._buf:
+            return None
+        rest = bytes(self._buf)
+        self._buf.clear()
+        return rest
+
+
+@dataclass
+class StreamStats:
+    id: int
+    started: float = field(default_factory=time.monotonic)
+    frames: int = 0
+    bytes: int = 0
+    heartbeats: int = 0
+    max_queue_ms: float = 0.0  # longest time a frame waited between backend read and client send
+    outcome: str = "open"
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "id": self.id,
+            "age_s": round(time.monotonic() - self.started, 1),
+            "frames": self.frames,
+            "bytes": self.bytes,
+            "heartbeats": self.heartbeats,
+            "max_queue_ms": round(self.max_queue_ms, 2),
+        }
+
+
+_ids = itertools.count(1)
+_active: dict[int, StreamStats] = {}
+_totals = {"streams": 0, "frames": 0, "bytes": 0, "heartbeats": 0, "slow_disconnects": 0, "client_disconnects": 0, "backend_errors": 0}
+
+
+def stats(max_streams: int = 50) -> dict[str, Any]:
+    active = list(_active.values())
+    return {
+        "active": len(active),
+        **_totals,
+        "options": dict(_options),
+        "streams": [s.snapshot() for s in active[-max_streams:]],
+    }
+
+
+class _SlowClient(Exception):
+    pass
+
+
+class SSERelayResponse(Response):
+    """Relay an SSE stream opened by ``open_stream`` to the ASGI client.
+
+    ``on_close`` receives the stream's final StreamStats (``outcome`` is one of
+    completed, client_disconnect, slow_client, backend_error).
+    """
+
+    media_type = "text/event-stream"
+
+    def __init__(
+        self,
+        open_stream: Callable[[], Awaitable[httpx.Response]],
+        headers: Optional[dict[str, str]] = None,
+        on_close: Optional[Callable[[StreamStats], None]] = None,
+    ) -> None:
+        self.status_code = 200
+        self.open_stream = open_stream
+        self.on_close = on_close
+        self.background = None
+        self.init_headers(headers)
+        self.heartbeat_secs = float(_options["heartbeat_secs"] or 0)
+        self.max_buffer_frames = max(1, int(_options["max_buffer_frames"]))
+        self.max_frame_bytes = int(_options["max_frame_bytes"])
+        self.slow_client_secs = float(_options["slow_client_secs"])
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        st = StreamStats(id=next(_ids))
+        _active[st.id] = st
+        _totals["streams"] += 1
+        try:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            try:
+                resp = await self.open_stream()
+            except Exception as e:  # noqa: BLE001
+                st.outcome = "backend_error"
+                logger.warning("mcp SSE: backend connect failed: %s", e)
+                await send({"type": "http.response.body", "body": b"event: error\ndata: backend unavailable\n\n"})
+                return
+            try:
+                if resp.status_code != 200:
+                    st.outcome = "backend_error"
+                    body = f"event: error\ndata: backend status {resp.status_code}\n\n".encode()
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                await self._relay(resp, st, receive, send)
+            finally:
+                await resp.aclose()
+        except OSError:
+            st.outcome = "client_disconnect"
+        finally:
+            _active.pop(st.id, None)
+            if st.outcome == "open":
+                st.outcome = "completed"
+            _totals["frames"] += st.frames
+            _totals["bytes"] += st.bytes
+            _totals["heartbeats"] += st.heartbeats
+            key = {"slow_client": "slow_disconnects", "client_disconnect": "client_disconnects", "backend_error": "backend_errors"}.get(st.outcome)
+            if key:
+                _totals[key] += 1
+            if self.on_close is not None:
+                self.on_close(st)
+
+    async def _relay(self, resp: httpx.Response, st: StreamStats, receive: Receive, send: Send) -> None:
+        tx, rx = anyio.create_memory_object_stream[tuple[float, bytes]](self.max_buffer_frames)
+
+        async def reader() -> None:
+            splitter = FrameSplitter(self.max_frame_bytes)
+            async with tx:
+                try:
+                    async for chunk in resp.aiter_raw():
+                        for frame in splitter.feed(chunk):
+                            await self._put(tx, frame)
+                except (httpx.RemoteProtocolError, httpx.ReadError):
+                    logger.info("mcp SSE: backend stream terminated")
+                rest = splitter.flush()
+                if rest:
+                    await self._put(tx, rest)
+
+        async def writer() -> None:
+            async with rx:
+                last_send = time.monotonic()
+                while True:
+                    frame: Optional[tuple[float, bytes]] = None
+                    wait = self.heartbeat_secs - (time.monotonic() - last_send) if self.heartbeat_secs else None
+                    with anyio.move_on_after(max(wait, 0) if wait is not None else None):
+                        try:
+                            frame = await rx.receive()
+                        except anyio.EndOfStream:
+                            return
+                    if frame is None:
+                        await send({"type": "http.response.body", "body": HEARTBEAT, "more_body": True})
+                        st.heartbeats += 1
+                    else:
+                        queued_at, body = frame
+                        await send({"type": "http.response.body", "body": body, "more_body": True})
+                        st.frames += 1
+                        st.bytes += len(body)
+                        st.max_queue_ms = max(st.max_queue_ms, (time.monotonic() - queued_at) * 1000)
+                    last_send = time.monotonic()
+
+        async def watcher(cancel: anyio.CancelScope) -> None:
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    st.outcome = "client_disconnect"
+                    cancel.cancel()
+                    return
+
+        try:
+            async with anyio.create_task_group() as tg:
+                tg.start_soon(watcher, tg.cancel_scope)
+
+                async def pump() -> None:
+                    async with anyio.create_task_group() as inner:
+                        inner.start_soon(reader)
+                        inner.start_soon(writer)
+                    tg.cancel_scope.cancel()  # backend finished: stop the watcher
+
+                tg.start_soon(pump)
+        except _SlowClient:
+            st.outcome = "slow_client"
+            logger.warning("mcp SSE: stream %d disconnected, client did not drain %d frames in %.1fs", st.id, self.max_buffer_frames, self.slow_client_secs)
+            return
+        except BaseException as e:  # anyio may group the slow-client error
+            if _is_slow(e):
+                st.outcome = "slow_client"
+                logger.warning("mcp SSE: stream %d disconnected as a slow client", st.id)
+                return
+            raise
+        if st.outcome != "client_disconnect":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    async def _put(self, tx: Any, frame: bytes) -> None:
+        item = (time.monotonic(), frame)
+        try:
+            tx.send_nowait(item)
+            return
+        except anyio.WouldBlock:
+            pass
+        with anyio.move_on_after(self.slow_client_secs) as scope:
+            await tx.send(item)
+        if scope.cancelled_caught:
+            raise _SlowClient()
+
+
+def _is_slow(exc: BaseException) -> bool:
+    if isinstance(exc, _SlowClient):
+        return True
+    subs = getattr(exc, "exceptions", None)
+    return bool(subs) and all(_is_slow(e) for e in subs)
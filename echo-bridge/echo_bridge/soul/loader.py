@@ -9,7 +9,7 @@ import yaml
 from .state import Soul, SoulConfig
 
 
-def load_soul(root: Path, timeline_path: Path | None = None) -> Soul:
+def load_soul(root: Path, timeline_path: Path | None = None, timeline_options: dict[str, Any] | None = None) -> Soul:
     soul_dir = root / "soul"
     constitution_path = soul_dir / "constitution.yaml"
     consent_path = soul_dir / "consent.yaml"
@@ -62,4 +62,4 @@ def load_soul(root: Path, timeline_path: Path | None = None) -> Soul:
             pass
 
     cfg = SoulConfig(values=values, policies=policies, tones=tones, moods=moods, transitions=transitions)
-    return Soul(cfg, identity_md=identity_md, rituals=rituals, timeline_path=timeline_path)
+    return Soul(cfg, identity_md=identity_md, rituals=rituals, timeline_path=timeline_path, timeline_options=timeline_options)
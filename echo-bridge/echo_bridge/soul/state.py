@@ -1,10 +1,11 @@
 from __future__ import annotations
 
-import json
 from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Any, Optional
 
+from .timeline import TimelineWriter
+
 
 @dataclass
 class SoulConfig:
@@ -16,12 +17,28 @@ class SoulConfig:
 
 
 class Soul:
-    def __init__(self, cfg: SoulConfig, identity_md: str, rituals: list[dict[str, Any]], timeline_path: Optional[Path] = None) -> None:
+    def __init__(
+        self,
+        cfg: SoulConfig,
+        identity_md: str,
+        rituals: list[dict[str, Any]],
+        timeline_path: Optional[Path] = None,
+        timeline_options: Optional[dict[str, Any]] = None,
+    ) -> None:
         self._cfg = cfg
         self._identity_md = identity_md
         self._rituals = rituals
         self._mood: str = cfg.moods[0] if cfg.moods else "calm"
         self._timeline_path = timeline_path
+        self._timeline = TimelineWriter(timeline_path, **(timeline_options or {})) if timeline_path else None
+        if self._timeline is not None:
+            # Resume the last recorded mood instead of resetting to moods[0]
+            try:
+                last = self._timeline.last_mood()
+            except Exception:
+                last = None
+            if last and last in (cfg.moods or []):
+                self._mood = last
 
     # Config accessors
     @property
@@ -58,16 +75,34 @@ class Soul:
 
     # Timeline
     def _append_timeline(self, event: dict[str, Any]) -> None:
-        if not self._timeline_path:
+        if self._timeline is None:
             return
         try:
-            self._timeline_path.parent.mkdir(parents=True, exist_ok=True)
-            with self._timeline_path.open("a", encoding="utf-8") as f:
-                f.write(json.dumps(event, ensure_ascii=False) + "\n")
+            self._timeline.write(event)
         except Exception:
             # best-effort only
             pass
 
+    def recent_events(self, n: int = 20) -> list[dict[str, Any]]:
+        """Last n timeline events from the in-memory tail (newest last)."""
+        return self._timeline.tail(n) if self._timeline is not None else []
+
+    def timeline(
+        self,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        action: Optional[str] = None,
+        limit: int = 100,
+    ) -> list[dict[str, Any]]:
+        """Indexed range query over the timeline, see TimelineWriter.query."""
+        if self._timeline is None:
+            return []
+        return self._timeline.query(since=since, until=until, action=action, limit=limit)
+
+    def close(self) -> None:
+        if self._timeline is not None:
+            self._timeline.close()
+
     def append_event(self, action: str, payload: dict[str, Any], result: dict[str, Any], consent_checked: bool) -> None:
         self._append_timeline({
             "kind": "action",
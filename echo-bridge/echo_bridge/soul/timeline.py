@@ -0,0 +1,424 @@
+from __future__ import annotations
+
+import calendar
+import gzip
+import json
+import shutil
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import IO, Any, Iterator, Optional, Sequence
+
+
+def parse_time(value: str | float | None) -> Optional[float]:
+    """Epoch seconds from an epoch number or an ISO 8601 string (naive = UTC)."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"invalid timestamp: {value!r}") from None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+def _clean(value: Any) -> str:
+    return str(value or "").replace("\t", " ").replace("\n", " ")
+
+
+def _label(event: dict[str, Any]) -> tuple[str, str]:
+    """(kind, label) for the index: label is the action, or the new mood for mood changes."""
+    kind = _clean(event.get("kind"))
+    label = _clean(event.get("to") if kind == "mood_change" else event.get("action"))
+    return kind, label or kind
+
+
+class TimelineIndex:
+    """In-memory copy of the sidecar index of the active timeline file.
+
+    Sidecar lines are ``ts \\t offset \\t length \\t kind \\t label`` where label
+    is the action name (or the new mood for mood changes). A ``carry`` line
+    with offset -1 records the mood in effect when the file was started.
+    """
+
+    def __init__(self) -> None:
+        self.ts: list[float] = []
+        self.offsets: list[tuple[int, int]] = []
+        self.positions: dict[str, list[int]] = {}
+        self.last_mood: Optional[str] = None
+        self.end = 0
+
+    def add(self, ts: float, offset: int, length: int, kind: str, label: str) -> None:
+        if offset < 0:
+            if kind == "carry":
+                self.last_mood = label or None
+            return
+        pos = len(self.ts)
+        self.ts.append(ts)
+        self.offsets.append((offset, length))
+        self.positions.setdefault(label, []).append(pos)
+        if kind and kind != label:
+            self.positions.setdefault(kind, []).append(pos)
+        if kind == "mood_change":
+            self.last_mood = label
+        self.end = offset + length
+
+    @staticmethod
+    def line(ts: float, offset: int, length: int, kind: str, label: str) -> str:
+        return f"{ts:.6f}\t{offset}\t{length}\t{kind}\t{label}\n"
+
+    def select(self, since: Optional[float], until: Optional[float], action: Optional[str]) -> Sequence[int]:
+        lo = bisect_left(self.ts, since) if since is not None else 0
+        hi = bisect_left(self.ts, until) if until is not None else len(self.ts)
+        if action is None:
+            return range(lo, max(lo, hi))
+        pos = self.positions.get(action, [])
+        return pos[bisect_left(pos, lo) : bisect_left(pos, hi)]
+
+
+class TimelineWriter:
+    """Append-only JSONL sink for Soul events with a sidecar offset index.
+
+    Keeps one file handle open, flushes every ``flush_every`` events or
+    ``flush_secs`` seconds (whichever comes first), and rotates the file once
+    it exceeds ``max_bytes`` or is older than ``rotate_secs``. Rotated
+    segments are named ``<name>.<YYYYmmdd-HHMMSS-ffffff>`` (gzip-compressed in the
+    background when ``compress``), and only the newest ``keep`` are retained.
+    The last ``tail_size`` events are kept in memory for state endpoints.
+
+    Every event gets a ``ts`` and one line in ``<stem>.idx`` (see
+    TimelineIndex), so range/action queries on the active file seek straight
+    to matching lines. A missing or stale index is rebuilt from the file.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        flush_every: int = 64,
+        flush_secs: float = 1.0,
+        max_bytes: int = 10 * 1024 * 1024,
+        rotate_secs: Optional[float] = None,
+        keep: int = 5,
+        compress: bool = True,
+        tail_size: int = 200,
+    ) -> None:
+        self.path = Path(path)
+        self.index_path = self.path.with_suffix(".idx")
+        self.flush_every = max(1, flush_every)
+        self.flush_secs = flush_secs
+        self.max_bytes = max_bytes
+        self.rotate_secs = rotate_secs
+        self.keep = keep
+        self.compress = compress
+        self._tail: deque[dict[str, Any]] = deque(maxlen=tail_size)
+        self._lock = threading.RLock()
+        self._fh: Optional[IO[bytes]] = None
+        self._idx_fh: Optional[IO[str]] = None
+        self._index = TimelineIndex()
+        self._size = 0
+        self._opened_at = 0.0
+        self._pending = 0
+        self._closed = False
+        self._flusher: Optional[threading.Thread] = None
+        self._wake = threading.Event()
+
+    # File handling
+    def _open(self) -> IO[bytes]:
+        if self._fh is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._fh = self.path.open("ab", buffering=64 * 1024)
+            self._size = self._fh.tell()
+            if self._size:
+                with self.path.open("rb") as f:
+                    f.seek(self._size - 1)
+                    if f.read(1) != b"\n":
+                        # terminate a line torn by a crash so the next event starts cleanly
+                        self._fh.write(b"\n")
+                        self._fh.flush()
+                        self._size += 1
+            self._opened_at = time.time()
+            self._load_index()
+            if self._flusher is None and self.flush_secs > 0:
+                self._flusher = threading.Thread(target=self._flush_loop, name="timeline-flush", daemon=True)
+                self._flusher.start()
+        return self._fh
+
+    def _load_index(self) -> None:
+        index = TimelineIndex()
+        valid = True
+        if self.index_path.exists():
+            for raw in self.index_path.read_text(encoding="utf-8").splitlines():
+                parts = raw.split("\t")
+                try:
+                    index.add(float(parts[0]), int(parts[1]), int(parts[2]), parts[3], parts[4])
+                except (ValueError, IndexError):
+                    valid = False
+                    break
+        if not valid or index.end > self._size:
+            carry = index.last_mood if valid else None
+            index = TimelineIndex()
+            index.last_mood = carry
+            mode = "w"
+        else:
+            mode = "a"
+        new_lines: list[str] = []
+        if mode == "w" and index.last_mood:
+            new_lines.append(TimelineIndex.line(0.0, -1, 0, "carry", index.last_mood))
+        if index.end < self._size:
+            # index lags the data (crash before flush, pre-index file): index the remainder
+            last_ts = index.ts[-1] if index.ts else 0.0
+            with self.path.open("rb") as f:
+                f.seek(index.end)
+                offset = index.end
+                for raw in f:
+                    if not raw.endswith(b"\n"):
+                        break
+                    try:
+                        event = json.loads(raw)
+                        ts = parse_time(event.get("ts")) if isinstance(event, dict) else None
+                        kind, label = _label(event) if isinstance(event, dict) else ("", "")
+                    except (ValueError, TypeError):
+                        kind, label, ts = "", "", None
+                    last_ts = max(last_ts, ts or 0.0)
+                    index.add(last_ts, offset, len(raw), kind, label)
+                    new_lines.append(TimelineIndex.line(last_ts, offset, len(raw), kind, label))
+                    offset += len(raw)
+        self._index = index
+        self._idx_fh = self.index_path.open(mode, encoding="utf-8", buffering=64 * 1024)
+        if new_lines:
+            self._idx_fh.writelines(new_lines)
+            self._idx_fh.flush()
+
+    def _flush_loop(self) -> None:
+        while not self._closed:
+            self._wake.wait(self.flush_secs)
+            self._wake.clear()
+            self.flush()
+
+    def write(self, event: dict[str, Any]) -> None:
+        with self._lock:
+            last = self._index.ts[-1] if self._index.ts else 0.0
+            ts = max(time.time(), last)  # index timestamps never go backwards
+            event = {"ts": _iso(ts), **event}
+            self._tail.append(event)
+            if self._closed:
+                return
+            fh = self._open()
+            data = (json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8")
+            kind, label = _label(event)
+            fh.write(data)
+            assert self._idx_fh is not None
+            self._idx_fh.write(TimelineIndex.line(ts, self._size, len(data), kind, label))
+            self._index.add(ts, self._size, len(data), kind, label)
+            self._size += len(data)
+            self._pending += 1
+            if self._pending >= self.flush_every:
+                self._flush_locked()
+            if self._size >= self.max_bytes or (
+                self.rotate_secs is not None and time.time() - self._opened_at >= self.rotate_secs
+            ):
+                self._rotate_locked()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        if self._fh is not None and self._pending:
+            # data before index, so the index never points past the data
+            self._fh.flush()
+            if self._idx_fh is not None:
+                self._idx_fh.flush()
+            self._pending = 0
+
+    def _close_files(self) -> None:
+        self._flush_locked()
+        for fh in (self._fh, self._idx_fh):
+            if fh is not None:
+                fh.close()
+        self._fh = None
+        self._idx_fh = None
+
+    # Rotation
+    def segments(self) -> list[Path]:
+        """Rotated segments, oldest first."""
+        return sorted(self.path.parent.glob(self.path.name + ".*"))
+
+    def _rotate_locked(self) -> None:
+        if self._fh is None:
+            return
+        mood = self._index.last_mood
+        self._close_files()
+        # Fixed-width stamps keep name order == rotation order
+        now = time.time()
+        while True:
+            stamp = time.strftime("%Y%m%d-%H%M%S", time.gmtime(now)) + f"-{int(now * 1e6) % 1000000:06d}"
+            target = self.path.with_name(f"{self.path.name}.{stamp}")
+            if not (target.exists() or target.with_name(target.name + ".gz").exists()):
+                break
+            now += 1e-6
+        self.path.rename(target)
+        # the new file starts with an index that only carries the current mood
+        self.index_path.write_text(TimelineIndex.line(0.0, -1, 0, "carry", mood) if mood else "", encoding="utf-8")
+        self._index = TimelineIndex()
+        self._index.last_mood = mood
+        if self.compress:
+            threading.Thread(target=self._gzip, args=(target,), name="timeline-gzip", daemon=True).start()
+        self._prune()
+
+    def _gzip(self, src: Path) -> None:
+        dst = src.with_name(src.name + ".gz")
+        try:
+            with src.open("rb") as fin, gzip.open(dst, "wb") as fout:
+                shutil.copyfileobj(fin, fout)
+            src.unlink()
+        except Exception:
+            # best-effort; the uncompressed segment stays in place
+            dst.unlink(missing_ok=True)
+
+    def _segment_stems(self) -> dict[str, list[Path]]:
+        # one name per segment, whether or not its compression has finished
+        stems: dict[str, list[Path]] = {}
+        for p in self.segments():
+            stems.setdefault(p.name.removesuffix(".gz"), []).append(p)
+        return stems
+
+    def _prune(self) -> None:
+        stems = self._segment_stems()
+        for stem in sorted(stems)[: max(0, len(stems) - self.keep)]:
+            for p in stems[stem]:
+                p.unlink(missing_ok=True)
+
+    # Consumers
+    def tail(self, n: Optional[int] = None) -> list[dict[str, Any]]:
+        with self._lock:
+            items = list(self._tail)
+        return items if n is None else items[-n:] if n > 0 else []
+
+    def last_mood(self) -> Optional[str]:
+        """Mood set by the most recent mood_change, read from the index."""
+        with self._lock:
+            if not self._closed:
+                self._open()
+            return self._index.last_mood
+
+    def _read_current(self, picked: Sequence[int]) -> list[dict[str, Any]]:
+        out: list[dict[str, Any]] = []
+        if not picked:
+            return out
+        with self.path.open("rb") as f:
+            for pos in picked:
+                offset, length = self._index.offsets[pos]
+                f.seek(offset)
+                try:
+                    out.append(json.loads(f.read(length)))
+                except ValueError:
+                    continue
+        return out
+
+    def _scan_segment(self, stem: str, paths: list[Path]) -> Iterator[tuple[float, dict[str, Any]]]:
+        plain = [p for p in paths if not p.name.endswith(".gz")]
+        for p in plain + [p for p in paths if p.name.endswith(".gz")]:
+            try:
+                opener = gzip.open if p.name.endswith(".gz") else open
+                with opener(p, "rb") as f:  # type: ignore[operator]
+                    for raw in f:
+                        try:
+                            event = json.loads(raw)
+                            yield parse_time(event.get("ts")) or 0.0, event
+                        except (ValueError, AttributeError):
+                            continue
+                return
+            except (FileNotFoundError, EOFError, OSError):
+                continue  # compressed/pruned underneath us; try the other copy
+
+    @staticmethod
+    def _segment_end(stem: str) -> float:
+        try:
+            stamp = stem.rsplit(".", 1)[1]
+            return calendar.timegm(time.strptime(stamp[:15], "%Y%m%d-%H%M%S")) + int(stamp[16:22]) / 1e6 + 1e-6
+        except (IndexError, ValueError):
+            return float("inf")
+
+    def _matching_in_segments(
+        self, since: Optional[float], until: Optional[float], action: Optional[str], newest_first: bool
+    ) -> Iterator[list[dict[str, Any]]]:
+        stems = self._segment_stems()
+        order = sorted(stems, reverse=newest_first)
+        for stem in order:
+            if since is not None and self._segment_end(stem) < since:
+                continue
+            matches: list[dict[str, Any]] = []
+            for ts, event in self._scan_segment(stem, stems[stem]):
+                if since is not None and ts < since:
+                    continue
+                if until is not None and ts >= until:
+                    continue
+                if action is not None and action not in _label(event):
+                    continue
+                matches.append(event)
+            yield matches
+
+    def query(
+        self,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        action: Optional[str] = None,
+        limit: int = 100,
+    ) -> list[dict[str, Any]]:
+        """Events with since <= ts < until, optionally only one action (or kind), oldest first.
+
+        With ``since`` the earliest ``limit`` matches are returned (forward
+        paging); without it the most recent ``limit``. The active file is read
+        through the index; rotated segments are only scanned when the active
+        file cannot satisfy the query.
+        """
+        if limit <= 0:
+            return []
+        with self._lock:
+            if not self._closed:
+                self._open()
+                self._flush_locked()
+            cand = self._index.select(since, until, action)
+            first_ts = self._index.ts[0] if self._index.ts else None
+            if since is None:
+                current = self._read_current(cand[-limit:])
+            else:
+                reach_back = first_ts is None or since < first_ts
+                current = self._read_current(cand[:limit])
+        if since is None:
+            older: list[dict[str, Any]] = []
+            if len(current) < limit:
+                for matches in self._matching_in_segments(since, until, action, newest_first=True):
+                    older = matches[-(limit - len(current) - len(older)) :] + older
+                    if len(current) + len(older) >= limit:
+                        break
+            return older + current
+        if not reach_back:
+            return current
+        earlier: list[dict[str, Any]] = []
+        for matches in self._matching_in_segments(since, until, action, newest_first=False):
+            earlier.extend(matches[: limit - len(earlier)])
+            if len(earlier) >= limit:
+                return earlier
+        return (earlier + current)[:limit]
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            self._close_files()
+        self._wake.set()
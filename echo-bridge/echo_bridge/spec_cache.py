@@ -0,0 +1,124 @@
+"""In-memory cache of the serialized public JSON specs (OpenAPI, tool manifests).
+
+Each entry holds the final response bytes, a strong ETag and precompressed
+gzip/brotli variants. An entry is rebuilt when the source file's mtime/size
+changes or when the variant key (e.g. the PUBLIC_BASE_URL the origins were
+rewritten to) differs.
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+try:
+    # Optional: brotli variant is only offered when the package is installed
+    import brotli  # type: ignore
+except Exception:
+    brotli = None  # type: ignore
+
+
+@dataclass
+class SpecEntry:
+    body: bytes
+    etag: str
+    encoded: dict[str, bytes] = field(default_factory=dict)
+
+    def tags(self) -> set[str]:
+        base = self.etag.strip('"')
+        return {self.etag, *(f'"{base}-{enc}"' for enc in self.encoded)}
+
+
+def _build_entry(data: Any) -> SpecEntry:
+    # Same serialization as starlette's JSONResponse
+    body = json.dumps(data, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+    entry = SpecEntry(body=body, etag='"' + hashlib.sha256(body).hexdigest()[:32] + '"')
+    entry.encoded["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+    if brotli is not None:
+        entry.encoded["br"] = brotli.compress(body)
+    return entry
+
+
+class SpecCache:
+    def __init__(self) -> None:
+        self._entries: dict[tuple[str, str], tuple[int, int, SpecEntry]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.builds = 0
+        self.not_modified = 0
+
+    def get(self, path: Path, variant: str, load: Callable[[], Any]) -> SpecEntry:
+        """Return the entry for (path, variant), calling load() to rebuild when stale."""
+        st = path.stat()
+        key = (str(path), variant)
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+                self.hits += 1
+                return cached[2]
+        entry = _build_entry(load())
+        with self._lock:
+            self._entries[key] = (st.st_mtime_ns, st.st_size, entry)
+            self.builds += 1
+        return entry
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "builds": self.builds, "not_modified": self.not_modified}
+
+
+def _accepts(accept_encoding: str, coding: str) -> bool:
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        if name.strip().lower() == coding:
+            q = params.strip()
+            if not q.startswith("q="):
+                return True
+            try:
+                return float(q[2:]) > 0
+            except ValueError:
+                return False  # malformed q: fall back to identity rather than 500
+    return False
+
+
+def respond(cache: SpecCache, request: Request, entry: SpecEntry, headers: Optional[dict[str, str]] = None) -> Response:
+    """Build a 200 (best accepted encoding) or 304 response for a cached spec."""
+    hdrs = dict(headers or {})
+    hdrs["Vary"] = "Accept-Encoding"
+    hdrs["Cache-Control"] = "no-cache"  # always revalidate; 304s are cheap
+    inm = request.headers.get("if-none-match")
+    if inm:
+        offered = {t.strip().removeprefix("W/") for t in inm.split(",")}
+        if "*" in offered or offered & entry.tags():
+            with cache._lock:
+                cache.not_modified += 1
+            hdrs["ETag"] = entry.etag
+            return Response(status_code=304, headers=hdrs)
+    accept = request.headers.get("accept-encoding", "")
+    for coding in ("br", "gzip"):
+        body = entry.encoded.get(coding)
+        if body is not None and _accepts(accept, coding):
+            hdrs["Content-Encoding"] = coding
+            hdrs["ETag"] = f'"{entry.etag.strip(chr(34))}-{coding}"'
+            return Response(content=body, media_type="application/json", headers=hdrs)
+    hdrs["ETag"] = entry.etag
+    return Response(content=entry.body, media_type="application/json", headers=hdrs)
+
+
+_CACHE = SpecCache()
+
+
+def get_cache() -> SpecCache:
+    return _CACHE
@@ -0,0 +1,227 @@
+"""Prometheus text-format metrics: counters, latency histograms and scrape-time gauges.
+
+No client library is needed. Counters and histograms write to a per-thread
+shard (a plain dict reached through ``threading.local``), so ``inc()`` and
+``observe()`` take no lock and never contend between the event loop, the DB
+executor and the writer thread. Shards are summed when ``/metrics`` is
+scraped. Gauges are callbacks evaluated at scrape time, so queue depths and
+pool sizes cost nothing between scrapes.
+
+Label values must come from a bounded set (route templates, tool names, known
+commands); use ``bounded()`` for anything derived from user input.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Iterable, Optional, Union
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = tuple[str, ...]
+
+_REGISTRY: list["_Metric"] = []
+_registry_lock = threading.Lock()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Labels, values: Labels, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) and not v.is_integer() else str(int(v))
+
+
+def bounded(value: Optional[str], allowed: Iterable[str], other: str = "other") -> str:
+    return value if value is not None and value in allowed else other
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Labels = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        with _registry_lock:
+            if any(m.name == name for m in _REGISTRY):
+                raise ValueError(f"metric {name} already registered")
+            _REGISTRY.append(self)
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class _Sharded(_Metric):
+    def __init__(self, name: str, help: str, labelnames: Labels = ()) -> None:
+        super().__init__(name, help, labelnames)
+        self._local = threading.local()
+        self._shards: list[dict[Labels, Any]] = []
+        self._lock = threading.Lock()  # only taken the first time a thread records
+
+    def _shard(self) -> dict[Labels, Any]:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard: dict[Labels, Any] = {}
+            with self._lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+            return shard
+
+    def _rows(self) -> list[tuple[Labels, Any]]:
+        with self._lock:
+            shards = list(self._shards)
+        return [item for shard in shards for item in list(shard.items())]
+
+
+class Counter(_Sharded):
+    type = "counter"
+
+    def inc(self, amount: float = 1.0, *labels: str) -> None:
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0.0) + amount
+
+    def values(self) -> dict[Labels, float]:
+        out: dict[Labels, float] = {}
+        for labels, v in self._rows():
+            out[labels] = out.get(labels, 0.0) + v
+        return out
+
+    def samples(self) -> Iterable[str]:
+        for labels, v in sorted(self.values().items()):
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_num(v)}"
+
+
+class Histogram(_Sharded):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Labels = (), buckets: tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels: str) -> None:
+        shard = self._shard()
+        row = shard.get(labels)
+        if row is None:
+            # one count per bucket, one for +Inf, then the running sum
+            row = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        row[bisect_left(self.buckets, value)] += 1
+        row[-1] += value
+
+    def time(self, *labels: str) -> "_Timer":
+        return _Timer(self, labels)
+
+    def snapshot(self) -> dict[Labels, tuple[list[int], float]]:
+        """Per label set: cumulative bucket counts (the last is the total) and the sum."""
+        merged: dict[Labels, list[float]] = {}
+        for labels, row in self._rows():
+            acc = merged.setdefault(labels, [0] * len(row))
+            for i, v in enumerate(row):
+                acc[i] += v
+        out: dict[Labels, tuple[list[int], float]] = {}
+        for labels, row in merged.items():
+            cumulative: list[int] = []
+            running = 0
+            for c in row[:-1]:
+                running += int(c)
+                cumulative.append(running)
+            out[labels] = (cumulative, float(row[-1]))
+        return out
+
+    def samples(self) -> Iterable[str]:
+        bounds = [*self.buckets, float("inf")]
+        for labels, (cumulative, total) in sorted(self.snapshot().items()):
+            for bound, count in zip(bounds, cumulative):
+                le = 'le="' + _num(bound) + '"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {count}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_num(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative[-1]}"
+
+
+class _Timer:
+    __slots__ = ("hist", "labels", "start")
+
+    def __init__(self, hist: Histogram, labels: Labels) -> None:
+        self.hist = hist
+        self.labels = labels
+
+    def __enter__(self) -> "_Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.hist.observe(time.perf_counter() - self.start, *self.labels)
+
+
+GaugeValue = Union[float, Iterable[tuple[Labels, float]]]
+
+
+class Gauge(_Metric):
+    """Value read at scrape time from ``fn`` (a number, or (labels, value) pairs)."""
+
+    type = "gauge"
+
+    def __init__(self, name: str, help: str, fn: Callable[[], GaugeValue], labelnames: Labels = ()) -> None:
+        super().__init__(name, help, labelnames)
+        self.fn = fn
+
+    def samples(self) -> Iterable[str]:
+        try:
+            value = self.fn()
+        except Exception:
+            return
+        if isinstance(value, (int, float)):
+            yield f"{self.name} {_num(value)}"
+            return
+        for labels, v in value:
+            yield f"{self.name}{_labels(self.labelnames, tuple(labels))} {_num(v)}"
+
+
+class CounterFunc(Gauge):
+    """Monotonic total read at scrape time (for counters another module already keeps)."""
+
+    type = "counter"
+
+
+def render() -> str:
+    with _registry_lock:
+        metrics = list(_REGISTRY)
+    return "\n".join(m.render() for m in metrics) + "\n"
+
+
+# --- metrics recorded across the bridge --------------------------------------
+
+HTTP_SECONDS = Histogram(
+    "bridge_http_request_duration_seconds", "HTTP request latency by route template", ("method", "route", "status")
+)
+MCP_TOOL_SECONDS = Histogram("bridge_mcp_tool_duration_seconds", "MCP tool call latency", ("tool", "outcome"))
+ACTION_SECONDS = Histogram("bridge_action_duration_seconds", "actions dispatch latency by command", ("command", "outcome"))
+AI_SECONDS = Histogram("bridge_ai_task_duration_seconds", "AI task latency by task and tier", ("task", "tier"))
+DB_OP_SECONDS = Histogram("bridge_db_op_duration_seconds", "DB executor call latency by repository operation", ("op",))
+DB_EXECUTOR_WAIT_SECONDS = Histogram("bridge_db_executor_wait_seconds", "time DB calls wait for an executor thread")
+DB_POOL_WAIT_SECONDS = Histogram("bridge_db_pool_wait_seconds", "time spent waiting for a pooled connection")
+DB_WRITE_JOB_SECONDS = Histogram("bridge_db_write_job_duration_seconds", "time one write job runs on the writer thread")
+DB_COMMIT_SECONDS = Histogram("bridge_db_commit_duration_seconds", "writer group transaction latency, BEGIN to COMMIT")
+DB_WRITE_GROUP_SIZE = Histogram(
+    "bridge_db_write_group_size", "write jobs committed per transaction", buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)
+)
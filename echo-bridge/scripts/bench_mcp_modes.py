@@ -0,0 +1,92 @@
+"""Compare /mcp latency: proxy to the FastMCP sidecar vs in-process FastMCP.
+
+Starts the FastMCP http_app (the sidecar) and the bridge with uvicorn on local
+ports inside this process, then sends sequential JSON-RPC calls to the bridge's
+POST /mcp with MCP_MODE=proxy and MCP_MODE=inprocess.
+
+usage: python scripts/bench_mcp_modes.py [-n 300] [--method tools/list]
+
+Both servers share one interpreter here, so the proxy numbers include GIL
+contention a separate sidecar process would not have; treat the gap as an
+upper bound on the saving.
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+import httpx
+import uvicorn
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from echo_bridge import main as bridge  # noqa: E402
+from echo_bridge.mcp_setup import mcp as mcp_server  # noqa: E402
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _serve(app, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="on"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def _run(url: str, method: str, n: int) -> list[float]:
+    headers = {"Accept": "application/json, text/event-stream", "Content-Type": "application/json"}
+    params = {"name": "search", "arguments": {"query": "test", "k": 3}} if method == "tools/call" else {}
+    out: list[float] = []
+    with httpx.Client(timeout=30) as client:
+        for i in range(n + 20):
+            body = json.dumps({"jsonrpc": "2.0", "id": i, "method": method, "params": params})
+            t = time.perf_counter()
+            r = client.post(url, headers=headers, content=body)
+            r.raise_for_status()
+            if i >= 20:  # warm-up
+                out.append((time.perf_counter() - t) * 1000)
+    return out
+
+
+def _summary(name: str, xs: list[float]) -> str:
+    xs = sorted(xs)
+    p = lambda q: xs[min(len(xs) - 1, int(len(xs) * q))]  # noqa: E731
+    return f"{name:<10} mean {statistics.mean(xs):7.2f}ms  p50 {p(0.5):7.2f}ms  p99 {p(0.99):7.2f}ms"
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-n", type=int, default=300)
+    ap.add_argument("--method", default="tools/list", choices=["tools/list", "ping", "tools/call"])
+    args = ap.parse_args()
+
+    sidecar_port, bridge_port = _free_port(), _free_port()
+    _serve(mcp_server.http_app(path="/mcp", stateless_http=True), sidecar_port)
+    bridge.BACKEND_MCP_URL = f"http://127.0.0.1:{sidecar_port}/mcp"
+    _serve(bridge.app, bridge_port)
+    url = f"http://127.0.0.1:{bridge_port}/mcp"
+
+    results = {}
+    for mode in ("proxy", "inprocess"):
+        os.environ["MCP_MODE"] = mode
+        results[mode] = _run(url, args.method, args.n)
+    print(f"{args.method}, {args.n} sequential calls")
+    for mode, xs in results.items():
+        print(_summary(mode, xs))
+    saved = statistics.median(results["proxy"]) - statistics.median(results["inprocess"])
+    print(f"in-process saves {saved:.2f}ms at p50")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
 from fastapi.testclient import TestClient
 
 from echo_bridge.main import app, settings
-from echo_bridge.db import get_conn, init_db
+from echo_bridge.db import connection, init_db
 
 
 def test_actions_and_audits(tmp_path):
@@ -78,8 +78,59 @@ def test_actions_and_audits(tmp_path):
     assert r.status_code == 400
 
     # Verify audits written
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT COUNT(*) AS c FROM audits")
-    c = cur.fetchone()["c"]
+    with connection() as conn:
+        c = conn.execute("SELECT COUNT(*) AS c FROM audits").fetchone()["c"]
     assert c >= 4
+
+
+def test_audit_writer_batches_and_backpressure(tmp_path):
+    from echo_bridge.services import audit_service
+    from echo_bridge.services.audit_service import AuditWriter
+
+    init_db(tmp_path / "audit.db")
+    writer = audit_service.configure(batch_size=50, flush_ms=20)
+    writer.start()
+    try:
+        for i in range(120):
+            audit_service.record("test.batch", {"i": i}, {"ok": True})
+        assert audit_service.flush()
+        stats = audit_service.stats()
+        assert stats["written"] == 120 and stats["batches"] <= 10
+        with connection() as conn:
+            count = conn.execute("SELECT COUNT(*) FROM audits WHERE action='test.batch'").fetchone()[0]
+        assert count == 120
+    finally:
+        audit_service.stop()
+
+    # A full queue drops under the drop policy (stand-in thread never drains)
+    import threading
+
+    release = threading.Event()
+    dropper = AuditWriter(max_queue=2, policy="drop")
+    dropper._thread = threading.Thread(target=release.wait, daemon=True)
+    dropper._thread.start()
+    assert [dropper.submit(("a", "{}", "{}", "")) for _ in range(3)] == [True, True, False]
+    assert dropper.stats()["dropped"] == 1
+    release.set()
+
+    # Counters stay exact when many request threads submit at once
+    busy = AuditWriter(max_queue=100000, policy="drop")
+    hold = threading.Event()
+    busy._thread = threading.Thread(target=hold.wait, daemon=True)
+    busy._thread.start()
+    submitters = [
+        threading.Thread(target=lambda: [busy.submit(("a", "{}", "{}", "")) for _ in range(2000)])
+        for _ in range(8)
+    ]
+    for t in submitters:
+        t.start()
+    for t in submitters:
+        t.join()
+    assert busy.stats()["enqueued"] == 16000
+    hold.set()
+
+    # Without a running writer rows are written synchronously
+    audit_service.configure()
+    audit_service.record("test.sync", {}, {})
+    with connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM audits WHERE action='test.sync'").fetchone()[0] == 1
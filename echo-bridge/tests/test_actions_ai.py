@@ -1,7 +1,7 @@
 from fastapi.testclient import TestClient
 
 from echo_bridge.main import app, settings
-from echo_bridge.db import init_db, get_conn
+from echo_bridge.db import connection, init_db
 from echo_bridge.services.memory_service import add_chunks
 
 
@@ -44,7 +44,6 @@ def test_ai_actions_preview_and_confirm(tmp_path):
     )
     assert r.status_code == 200
     # verify there are tag links for chunk 1
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT COUNT(*) AS c FROM chunk_tags WHERE chunk_id=1")
-    assert cur.fetchone()["c"] >= 1
+    with connection() as conn:
+        row = conn.execute("SELECT COUNT(*) AS c FROM chunk_tags WHERE chunk_id=1").fetchone()
+    assert row["c"] >= 1
@@ -1,6 +1,8 @@
-from echo_bridge.ai.embedder import embed, similar
+import pytest
+
+from echo_bridge.ai.embedder import backfill_embeddings, embed, similar
 from echo_bridge.ai.cluster import kmeans_texts
-from echo_bridge.db import init_db, get_conn
+from echo_bridge.db import connection, init_db, write
 
 
 def test_embed_and_similar(tmp_path):
@@ -9,16 +11,14 @@ def test_embed_and_similar(tmp_path):
 
     settings.db_path = tmp_path / "sim.db"
     init_db(settings.db_path)
-    conn = get_conn()
-    cur = conn.cursor()
     data = [
         ("A", None, "alpha beta gamma"),
         ("A", None, "alpha beta"),
         ("A", None, "delta epsilon"),
     ]
-    for s, t, x in data:
-        cur.execute("INSERT INTO chunks(doc_source, doc_title, text) VALUES (?,?,?)", (s, t, x))
-    conn.commit()
+    write(lambda conn: conn.executemany("INSERT INTO chunks(doc_source, doc_title, text) VALUES (?,?,?)", data))
+    # rows written behind the ingest path get their vectors from the startup backfill
+    assert backfill_embeddings() == 3
 
     # similar to first should include second
     sims = similar(1, k=2)
@@ -36,3 +36,145 @@ def test_kmeans_basic():
     labels = kmeans_texts(chunks, k=2, iters=5)
     # Expect 1 & 2 together or 3 & 4 together
     assert labels[1] == labels[2] or labels[3] == labels[4]
+
+
+def test_embeddings_persisted_on_ingest_and_invalidated(tmp_path):
+    from echo_bridge.ai.embedder import EMBEDDER_VERSION, load_matrix, load_vectors
+    from echo_bridge.services.memory_service import add_chunks
+
+    init_db(tmp_path / "emb.db")
+    add_chunks("A", None, ["alpha beta gamma", "alpha beta", "delta epsilon"], None)
+    with connection() as conn:
+        rows = conn.execute("SELECT chunk_id, version FROM embeddings ORDER BY chunk_id").fetchall()
+    assert [r["chunk_id"] for r in rows] == [1, 2, 3]
+    assert all(r["version"] == EMBEDDER_VERSION for r in rows)
+
+    # The matrix is cached until vectors are stored again
+    ids, mat = load_matrix()
+    assert load_matrix()[1] is mat
+    add_chunks("A", None, ["theta iota"], None)
+    ids, mat = load_matrix()
+    assert ids == [1, 2, 3, 4] and len(mat) == 4
+
+    # Changing the text drops the stored vector; the backfill recomputes it
+    write(lambda conn: conn.execute("UPDATE chunks SET text='delta epsilon zeta' WHERE id=1"))
+    with connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM embeddings WHERE chunk_id=1").fetchone()[0] == 0
+    assert backfill_embeddings() == 1
+    vecs = load_vectors()
+    assert set(vecs) == {1, 2, 3, 4}
+    assert similar(1, k=1)[0][0] == 3
+
+
+def test_numpy_and_python_backends_agree(tmp_path, monkeypatch):
+    from echo_bridge.ai import cluster, embedder
+    from echo_bridge.services.memory_service import add_chunks
+
+    if embedder.np is None:
+        pytest.skip("numpy not installed")
+    init_db(tmp_path / "np.db")
+    texts = ["alpha beta gamma", "alpha beta", "delta epsilon", "gamma delta", "beta gamma alpha", "zeta eta"]
+    add_chunks("A", None, texts, None)
+    chunks = {i + 1: t for i, t in enumerate(texts)}
+
+    fast = [cid for cid, _ in similar(1, k=3)]
+    fast_labels = kmeans_texts(chunks, k=2, iters=5)
+    monkeypatch.setattr(embedder, "np", None)
+    monkeypatch.setattr(cluster, "np", None)
+    embedder.invalidate()
+    slow = [cid for cid, _ in similar(1, k=3)]
+    slow_labels = kmeans_texts(chunks, k=2, iters=5)
+    assert fast == slow
+    assert fast_labels == slow_labels
+
+
+def test_ann_index_recall_and_persistence(tmp_path):
+    from echo_bridge.ai import ann
+    from echo_bridge.ai.embedder import load_matrix, top_k
+    from echo_bridge.services.memory_service import add_chunks
+
+    init_db(tmp_path / "ann.db")
+    words = ["alpha", "beta", "gamma", "delta", "epsilon", "zeta", "eta", "theta", "iota", "kappa"]
+    texts = [f"{words[i % 10]} {words[(i * 3) % 10]} {words[(i * 7) % 10]} item{i % 13}" for i in range(120)]
+    add_chunks("T", None, texts, None)
+    ann.reset()
+    ann.configure(exact_below=50, nprobe=64)
+    try:
+        assert ann.get_index() is None  # loading is left to the maintainer
+        ann.maintain()
+        index = ann.get_index()
+        assert index is not None and index.trained
+        # probing every list must reproduce the exact scan
+        ids, mat = load_matrix()
+        exact = top_k(mat[0], ids, mat, 5, exclude=0)
+        approx = ann.similar(ids[0], k=5)
+        assert [round(s, 5) for _, s in approx] == [round(s, 5) for _, s in exact]
+
+        ann.save_index()
+        assert ann.index_path(tmp_path / "ann.db").exists()
+        ann.reset()
+        ann.maintain()
+        assert ann.get_index().trained
+
+        # vectors stored after loading are applied on the next lookup
+        add_chunks("T", None, ["alpha beta gamma item1"], None)
+        assert ann.get_index().vector(121) is not None
+    finally:
+        ann.reset()
+        ann.configure(exact_below=2000, nprobe=8)
+
+
+def test_seeded_chunks_are_embedded(tmp_path):
+    from fastapi.testclient import TestClient
+
+    from echo_bridge.main import app, settings
+
+    settings.db_path = tmp_path / "seed.db"
+    init_db(settings.db_path)
+    r = TestClient(app).post("/seed", headers={"X-Bridge-Key": settings.bridge_key})
+    assert r.status_code == 200 and r.json()["chunks_added"] > 1
+    with connection() as conn:
+        ids = [row[0] for row in conn.execute("SELECT id FROM chunks WHERE doc_source='demo_seed' ORDER BY id")]
+        assert conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] == len(ids)
+    assert similar(ids[0], k=1)
+
+
+def test_ann_lookups_do_not_wait_for_maintenance(tmp_path, monkeypatch):
+    import threading
+    from contextlib import contextmanager
+
+    from echo_bridge.ai import ann
+    from echo_bridge.services.memory_service import add_chunks
+
+    init_db(tmp_path / "ann_lock.db")
+    add_chunks("T", None, [f"alpha beta item{i}" for i in range(20)], None)
+    ann.reset()
+    try:
+        ann.maintain()
+        index = ann.get_index()
+        ids, mat = index._lists[0].view()
+        index.add([(999, mat[0])])  # copy-on-write: a snapshot never changes under a reader
+        assert ids == list(range(1, 21)) and len(mat) == 20
+
+        # a reconcile stuck in its full id scan must not hold up lookups
+        scanning, release = threading.Event(), threading.Event()
+        real = ann.connection
+
+        @contextmanager
+        def slow_connection():
+            if threading.current_thread().name == "reconcile":
+                scanning.set()
+                release.wait(5)
+            with real() as conn:
+                yield conn
+
+        monkeypatch.setattr(ann, "connection", slow_connection)
+        t = threading.Thread(target=ann._reconcile, args=(index,), name="reconcile")
+        t.start()
+        assert scanning.wait(5)
+        assert [cid for cid, _ in ann.similar(1, k=3)] and ann.nearest(mat[1], k=1)[0][0] == 2
+        release.set()
+        t.join(5)
+        assert 999 not in index.ids()  # not in the embeddings table: dropped by the reconcile
+    finally:
+        ann.reset()
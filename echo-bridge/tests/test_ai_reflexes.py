@@ -32,3 +32,86 @@ def test_dedupe_marks_duplicates():
     assert out[1].get("dup_of") == 1
     # third one is similar but below threshold; should remain unique
     assert out[2].get("dup_of") is None
+
+
+def test_analysis_is_shared_and_cached():
+    from echo_bridge.ai.reflexes import analyze, analysis_cache_info
+
+    text = "Fokus und Freude. Das Echo lernt Fokus."
+    doc = analyze(text)
+    assert analyze(text) is doc
+    assert analyze(doc) is doc
+    assert analysis_cache_info()["hits"] >= 1
+    assert doc.sentences == ("Fokus und Freude.", "Das Echo lernt Fokus.")
+    assert doc.tf["fokus"] == 2 and "und" not in doc.tf
+    # passing the analysis or the raw text gives identical results
+    assert keywords(doc, k=3) == keywords(text, k=3)
+    assert summary(doc, max_sents=1) == summary(text, max_sents=1)
+
+
+def _all_pairs_duplicates(bags, threshold):
+    from echo_bridge.ai.reflexes import _cosine
+
+    expected: list[int | None] = []
+    masters: list[int] = []
+    for i, bag in enumerate(bags):
+        hit = next((j for j in masters if _cosine(bag, bags[j]) >= threshold), None)
+        if hit is None:
+            masters.append(i)
+        expected.append(hit)
+    return expected
+
+
+def test_minhash_dedupe_matches_all_pairs_cosine():
+    from collections import Counter
+
+    from echo_bridge.ai.minhash import find_duplicates
+    from echo_bridge.ai.reflexes import analyze
+
+    words = [f"w{i}" for i in range(40)]
+    texts = [" ".join(words[(i * 7) % 40 : (i * 7) % 40 + 8]) for i in range(60)]
+    texts += [t + " extra" for t in texts[:20]] + texts[:10]
+    bags = [analyze(t).tf for t in texts]
+    assert find_duplicates(bags, threshold=0.9) == _all_pairs_duplicates(bags, 0.9)
+    assert find_duplicates([Counter(), Counter()]) == [None, None]
+
+
+def test_lsh_recall_on_repeated_terms():
+    from echo_bridge.ai.minhash import find_duplicates
+    from echo_bridge.ai.reflexes import _cosine, analyze
+
+    # high cosine, low term-set overlap: a dominant repeated term plus two distinct words each
+    texts = []
+    for i in range(50):
+        texts.append(f"alpha{i} " * 20 + f"a{i} b{i}")
+        texts.append(f"alpha{i} " * 20 + f"c{i} d{i}")
+    # a text repeated is an exact cosine duplicate whatever the counts
+    texts += ["gamma delta epsilon", "gamma delta epsilon " * 10]
+    bags = [analyze(t).tf for t in texts]
+    assert _cosine(bags[0], bags[1]) > 0.99
+    expected = _all_pairs_duplicates(bags, 0.9)
+    assert expected[1:100:2] == list(range(0, 100, 2)) and expected[-1] == 100
+    assert find_duplicates(bags, threshold=0.9) == expected
+
+
+def test_dedupe_job_records_dup_of(tmp_path):
+    import json
+
+    from echo_bridge.ai.minhash import dedupe_corpus
+    from echo_bridge.db import connection, init_db
+    from echo_bridge.services.memory_service import add_chunks
+
+    init_db(tmp_path / "dedupe.db")
+    add_chunks("chatgpt", None, ["Hallo Echo, wie geht es dir", "Ganz anders hier", "Hallo Echo, wie geht es dir"], {"k": 1})
+    res = dedupe_corpus(threshold=0.95)
+    assert res == {"scanned": 3, "duplicates": 1, "masters": 2}
+    with connection() as conn:
+        meta = json.loads(conn.execute("SELECT meta_json FROM chunks WHERE id=3").fetchone()[0])
+    assert meta == {"k": 1, "dup_of": 1}
+    # re-running is idempotent
+    assert dedupe_corpus(threshold=0.95)["duplicates"] == 0
+    # masters from earlier batches are read back for verification
+    add_chunks("chatgpt", None, ["Ganz anders hier"], None)
+    assert dedupe_corpus(threshold=0.95, batch_size=1)["duplicates"] == 1
+    with connection() as conn:
+        assert json.loads(conn.execute("SELECT meta_json FROM chunks WHERE id=4").fetchone()[0]) == {"dup_of": 2}
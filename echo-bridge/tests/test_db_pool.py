@@ -0,0 +1,206 @@
+import sqlite3
+import threading
+
+import anyio
+import pytest
+
+from echo_bridge.db import ConnectionPool, DBWriter, PoolTimeout, TransactionLost, after_commit, connection, init_db, pool_stats, write, writer_stats
+from echo_bridge.services import repository
+
+
+def test_pool_reuses_connections_and_applies_pragmas(tmp_path):
+    init_db(tmp_path / "pool.db", pool_size=2)
+
+    with connection() as conn:
+        first = id(conn)
+        assert conn.execute("PRAGMA temp_store").fetchone()[0] == 2  # MEMORY
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+        # nested checkout on the same thread reuses the outer connection
+        with connection() as inner:
+            assert inner is conn
+    with connection() as conn:
+        assert id(conn) == first
+
+    stats = pool_stats()
+    assert stats["created"] == 1
+    assert stats["in_use"] == 0
+    assert stats["checkouts"] == 2
+
+
+def test_pool_is_bounded_and_times_out(tmp_path):
+    init_db(tmp_path / "pool.db")
+    pool = ConnectionPool(tmp_path / "pool.db", size=1, timeout=0.05)
+    held = pool.acquire()
+    errors: list[Exception] = []
+
+    def worker() -> None:
+        try:
+            with pool.connection():
+                pass
+        except Exception as e:  # noqa: BLE001
+            errors.append(e)
+
+    t = threading.Thread(target=worker)
+    t.start()
+    t.join()
+    assert errors and isinstance(errors[0], PoolTimeout)
+    pool.release(held)
+    assert pool.stats()["timeouts"] == 1
+    pool.close()
+
+
+def test_uncommitted_work_is_rolled_back_on_return(tmp_path):
+    init_db(tmp_path / "pool.db")
+    pool = ConnectionPool(tmp_path / "pool.db", size=1)  # writable, unlike the app's pool
+    with pool.connection() as conn:
+        conn.execute("INSERT INTO tags(name) VALUES ('pending')")
+    pool.close()
+    with connection() as c:
+        assert c.execute("SELECT COUNT(*) FROM tags").fetchone()[0] == 0
+
+
+def test_leaks_are_reported(tmp_path):
+    pool = ConnectionPool(tmp_path / "leak.db", size=1, leak_after=0.0)
+    conn = pool.acquire()
+    assert pool.stats()["leaks"] == 1
+    pool.release(conn)
+    pool.close()
+
+
+def test_repository_runs_on_db_executor(tmp_path):
+    init_db(tmp_path / "repo.db")
+    repository.configure(workers=2)
+    repository.stop()
+    before = repository.stats()
+
+    def thread_name() -> str:
+        return threading.current_thread().name
+
+    async def main() -> None:
+        assert await repository.add_chunks("notes", "t", ["alpha beta", "gamma"], {"tags": ["x"]}) == 2
+        hits = await repository.search("alpha", 5)
+        assert len(hits) == 1 and (await repository.get_chunk(hits[0].id)).text == "alpha beta"
+        assert await repository.get_tags_for_chunk(hits[0].id) == ["x"]
+        items, _ = await repository.list_chunks(10)
+        assert len(items) == 2
+        assert (await repository.get_chunk(items[0]["id"])).text == "gamma"
+        assert await repository.recent_sessions() == []
+        assert (await repository.run(thread_name)).startswith("db-executor")
+
+        # the loop stays responsive while a worker is busy
+        ticks = 0
+
+        async def ticker() -> None:
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await anyio.sleep(0.01)
+
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(ticker)
+            await repository.run(threading.Event().wait, 0.2)
+            tg.cancel_scope.cancel()
+        assert ticks >= 5
+
+    try:
+        anyio.run(main)
+        s = repository.stats()
+        assert s["workers"] == 2 and s["active"] == 0 and s["errors"] == before["errors"]
+        assert s["completed"] - before["completed"] == s["submitted"] - before["submitted"] >= 8
+    finally:
+        repository.stop()
+        repository.configure()
+
+
+def test_readers_are_read_only_and_writes_group_commit(tmp_path):
+    init_db(tmp_path / "writer.db", pool_size=2)
+    with connection() as conn:
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("INSERT INTO tags(name) VALUES ('x')")
+
+    start = threading.Barrier(16)
+
+    def worker(i: int) -> None:
+        start.wait()
+        write(lambda conn: conn.execute("INSERT INTO tags(name) VALUES (?)", (f"t{i}",)))
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    with connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM tags").fetchone()[0] == 16
+    stats = writer_stats()
+    assert stats["jobs"] == 16 and stats["groups"] <= 16 and stats["errors"] == 0
+
+
+def test_failed_write_job_is_rolled_back_alone(tmp_path):
+    init_db(tmp_path / "writer.db")
+
+    def bad(conn: sqlite3.Connection) -> None:
+        conn.execute("INSERT INTO tags(name) VALUES ('half')")
+        raise ValueError("boom")
+
+    def nested(conn: sqlite3.Connection) -> int:
+        conn.execute("INSERT INTO tags(name) VALUES ('outer')")
+        conn.commit()  # legacy commit inside a job is deferred to the group
+        try:
+            write(bad)  # runs inline on the writer thread
+        except ValueError:
+            pass
+        with connection() as inner:  # nested reads see the job's own writes
+            return inner.execute("SELECT COUNT(*) FROM tags").fetchone()[0]
+
+    with pytest.raises(ValueError):
+        write(bad)
+    assert write(nested) == 1
+    with connection() as conn:
+        assert [r[0] for r in conn.execute("SELECT name FROM tags")] == ["outer"]
+
+
+def test_job_ending_the_transaction_fails_its_whole_group(tmp_path):
+    from echo_bridge.db import _WriteJob
+
+    init_db(tmp_path / "lost.db")
+    writer = DBWriter(tmp_path / "lost.db")
+
+    def insert(name: str):
+        return lambda conn: conn.execute("INSERT INTO tags(name) VALUES (?)", (name,)) and name
+
+    def abort(conn: sqlite3.Connection) -> None:
+        conn.execute("INSERT INTO tags(name) VALUES ('j2')")
+        conn.execute("ROLLBACK")  # as SQLite does itself on SQLITE_FULL / IOERR
+        raise RuntimeError("disk full")
+
+    jobs = [_WriteJob(insert("j1")), _WriteJob(abort), _WriteJob(insert("j3"))]
+    writer._commit(jobs)
+    writer.stop()
+    assert isinstance(jobs[0].error, TransactionLost) and jobs[0].result is None
+    assert isinstance(jobs[1].error, RuntimeError)
+    assert jobs[2].error is None and jobs[2].result == "j3"
+    with connection() as conn:
+        assert [r[0] for r in conn.execute("SELECT name FROM tags")] == ["j3"]
+
+
+def test_after_commit_hooks_run_only_for_committed_jobs(tmp_path):
+    init_db(tmp_path / "hooks.db")
+    seen: list[str] = []
+
+    def job(name: str, fail: bool = False):
+        def fn(conn: sqlite3.Connection) -> None:
+            conn.execute("INSERT INTO tags(name) VALUES (?)", (name,))
+            after_commit(lambda: seen.append(name))
+            assert name not in seen  # not before COMMIT
+            if fail:
+                raise RuntimeError(name)
+
+        return fn
+
+    write(job("ok"))
+    assert seen == ["ok"]
+    with pytest.raises(RuntimeError):
+        write(job("bad", fail=True))
+    assert seen == ["ok"]
+    after_commit(lambda: seen.append("now"))  # outside a job: runs at once
+    assert seen == ["ok", "now"]
@@ -9,3 +9,220 @@ def test_health_ok():
     assert r.status_code == 200
     body = r.json()
     assert body["status"] == "ok"
+
+
+def test_public_spec_etag_gzip_and_invalidation(tmp_path, monkeypatch):
+    import json
+    import os
+
+    from echo_bridge import main
+
+    spec = tmp_path / "chatgpt_tool_manifest.json"
+    spec.write_text(json.dumps({"api": {"url": "http://localhost:8000/openapi.json"}}), encoding="utf-8")
+    monkeypatch.setattr(main, "public_dir", tmp_path)
+    monkeypatch.setenv("PUBLIC_BASE_URL", "https://a.example")
+    client = TestClient(app)
+
+    r = client.get("/chatgpt_tool_manifest.json", headers={"Accept-Encoding": "identity"})
+    assert r.status_code == 200 and r.headers["content-type"].startswith("application/json")
+    assert r.json()["api"]["url"] == "https://a.example/openapi.json"
+    etag = r.headers["etag"]
+    assert etag.startswith('"') and r.headers["vary"] == "Accept-Encoding"
+
+    r = client.get("/chatgpt_tool_manifest.json", headers={"If-None-Match": etag})
+    assert r.status_code == 304 and r.content == b""
+
+    # the client transparently decodes the precompressed body
+    r = client.get("/chatgpt_tool_manifest.json", headers={"Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip" and r.headers["etag"] != etag
+    assert r.json()["api"]["url"] == "https://a.example/openapi.json"
+    assert client.get("/chatgpt_tool_manifest.json", headers={"If-None-Match": r.headers["etag"]}).status_code == 304
+    # a malformed or zero q disables that coding instead of failing the request
+    for accept in ("gzip;q=abc", "gzip;q=", "gzip;q=0"):
+        r = client.get("/chatgpt_tool_manifest.json", headers={"Accept-Encoding": accept})
+        assert r.status_code == 200 and "content-encoding" not in r.headers
+
+    # PUBLIC_BASE_URL change and file change both produce a new ETag
+    monkeypatch.setenv("PUBLIC_BASE_URL", "https://b.example")
+    r = client.get("/chatgpt_tool_manifest.json", headers={"If-None-Match": etag})
+    assert r.status_code == 200 and r.json()["api"]["url"] == "https://b.example/openapi.json"
+    etag_b = r.headers["etag"]
+    assert etag_b != etag
+    spec.write_text(json.dumps({"api": {"url": "http://localhost:8000/openapi.json"}, "x": 1}), encoding="utf-8")
+    st = spec.stat()
+    os.utime(spec, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    r = client.get("/chatgpt_tool_manifest.json", headers={"If-None-Match": etag_b})
+    assert r.status_code == 200 and r.json()["x"] == 1
+
+
+def test_middleware_cors_and_public_key_guard(monkeypatch):
+    client = TestClient(app)
+
+    r = client.options("/public/openapi.json")
+    assert r.status_code == 204 and r.headers["access-control-allow-credentials"] == "true"
+    r = client.options("/search", headers={"Origin": "https://x.example", "Access-Control-Request-Method": "GET", "Access-Control-Request-Headers": "X-API-Key"})
+    assert r.status_code == 200
+    assert r.headers["access-control-allow-origin"] == "https://x.example"
+    assert r.headers["access-control-allow-headers"] == "X-API-Key"
+
+    r = client.get("/health", headers={"Origin": "https://x.example"})
+    assert r.headers["access-control-allow-origin"] == "*"
+    r = client.get("/chatgpt_tool_manifest.json")
+    assert r.headers["access-control-allow-methods"] == "GET,POST,OPTIONS,PUT,PATCH,DELETE"
+
+    monkeypatch.setenv("REQUIRE_X_API_KEY_FOR_PUBLIC", "1")
+    monkeypatch.setenv("ECHO_BRIDGE_API_KEY", "k")
+    assert client.get("/public/openapi.json").status_code == 401
+    assert client.get("/public/openapi.json", headers={"X-API-Key": "k"}).status_code == 200
+    assert client.options("/mcp").status_code == 200  # preflight is not key-guarded
+    assert client.get("/health").status_code == 200
+
+
+def test_mcp_proxy_uses_shared_backend_client(monkeypatch):
+    import httpx
+
+    from echo_bridge.services import backend_client
+
+    seen = []
+
+    async def frames():
+        yield b"event: message\ndata: {}\n\n"
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request.url.path)
+        return httpx.Response(200, content=frames())
+
+    shared = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(backend_client, "_client", shared)
+    client = TestClient(app)
+    for _ in range(2):
+        r = client.get("/mcp", headers={"Accept": "text/event-stream"})
+        assert r.status_code == 200 and r.text == "event: message\ndata: {}\n\n"
+    assert seen == ["/mcp", "/mcp"]
+    assert backend_client.get_client() is shared and not shared.is_closed
+    assert client.get("/metrics").json()["mcp_backend"]["open"] is True
+
+
+def test_prometheus_metrics_by_route_template(tmp_path):
+    from echo_bridge import telemetry
+    from echo_bridge.db import init_db
+    from echo_bridge.main import settings
+
+    hist = telemetry.Histogram("test_latency_seconds", "test", ("op",), buckets=(0.1, 1.0))
+    for v in (0.05, 0.1, 0.5, 3.0):
+        hist.observe(v, "x")
+    assert hist.snapshot()[("x",)] == ([2, 3, 4], 3.65)
+    text = hist.render()
+    assert 'test_latency_seconds_bucket{op="x",le="0.1"} 2' in text
+    assert 'test_latency_seconds_bucket{op="x",le="+Inf"} 4' in text
+    assert 'test_latency_seconds_count{op="x"} 4' in text
+
+    settings.db_path = tmp_path / "metrics.db"
+    init_db(settings.db_path)
+    client = TestClient(app)
+    key = {"X-Bridge-Key": settings.bridge_key}
+    assert client.get("/chunks/12345").status_code == 404
+    client.post("/actions/run", headers=key, json={"command": "no.such", "args": {}})
+
+    r = client.get("/metrics", headers={"Accept": "text/plain"})
+    assert r.headers["content-type"].startswith("text/plain; version=0.0.4")
+    # route templates, not raw paths, so label cardinality stays bounded
+    assert 'bridge_http_request_duration_seconds_count{method="GET",route="/chunks/{id}",status="404"}' in r.text
+    assert "/chunks/12345" not in r.text
+    assert 'bridge_action_duration_seconds_count{command="unknown",outcome="error"}' in r.text
+    assert "# TYPE bridge_db_writer_queue_depth gauge" in r.text
+    assert "sse" in client.get("/metrics").json()
+
+
+def test_request_profiling_stores_sync_and_async_profiles(tmp_path):
+    import pstats
+
+    from echo_bridge import profiling
+    from echo_bridge.db import init_db
+    from echo_bridge.main import expected_bridge_key, settings
+
+    settings.db_path = tmp_path / "prof.db"
+    init_db(settings.db_path)
+    client = TestClient(app)
+    key = {"X-Bridge-Key": settings.bridge_key}
+    profiling.configure(key=expected_bridge_key, enabled=True, dir=str(tmp_path / "profiles"), keep=2)
+    try:
+        # no key, no profile
+        assert "x-profile-id" not in client.get("/search", params={"q": "x", "profile": "1"}).headers
+
+        r = client.get("/search", params={"q": "alpha", "profile": "1"}, headers=key)
+        async_id = r.headers["x-profile-id"]
+        r = client.get("/health", headers={**key, "X-Profile": "1"})
+        sync_id = r.headers["x-profile-id"]
+
+        listed = client.get("/debug/profiles", headers=key).json()
+        assert [p["id"] for p in listed["profiles"]] == [sync_id, async_id]
+        assert listed["profiles"][1]["route"] == "/search"
+
+        # the DB call ran on a db-executor thread and the sync endpoint on a worker thread
+        stacks = client.get(f"/debug/profiles/{async_id}", params={"format": "collapsed"}, headers=key).text
+        assert "search_page (services/memory_service.py" in stacks
+        assert "health (echo_bridge/main.py" in client.get(f"/debug/profiles/{sync_id}", params={"format": "collapsed"}, headers=key).text
+
+        raw = client.get(f"/debug/profiles/{sync_id}", headers=key)
+        (tmp_path / "dl.pstats").write_bytes(raw.content)
+        assert pstats.Stats(str(tmp_path / "dl.pstats")).total_calls > 0
+        assert "function calls" in client.get(f"/debug/profiles/{sync_id}", params={"format": "text"}, headers=key).text
+
+        client.get("/health", headers={**key, "X-Profile": "1"})
+        assert len(profiling.list_profiles()) == 2  # ring keeps the newest two
+        assert client.get(f"/debug/profiles/{async_id}", headers=key).status_code == 404
+        assert client.get("/debug/profiles", headers={"X-Bridge-Key": "wrong"}).status_code == 401
+    finally:
+        profiling.configure(key=expected_bridge_key)
+
+
+def _spin_for_sampler(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_sampler_counts_busy_threads_and_skips_idle_ones():
+    import threading
+    import time
+
+    from echo_bridge import sampler
+    from echo_bridge.main import settings
+
+    s = sampler.Sampler(hz=100, bucket_secs=1)
+    stop, parked = threading.Event(), threading.Event()
+    busy = threading.Thread(target=_spin_for_sampler, args=(stop,), name="spinner")
+    idle = threading.Thread(target=parked.wait, name="parked")
+    busy.start()
+    idle.start()
+    try:
+        for _ in range(5):
+            s.sample()
+    finally:
+        stop.set()
+        parked.set()
+        busy.join()
+        idle.join()
+    counts = s.counts(window=60, thread="spinner")
+    assert sum(counts.values()) == 5
+    assert all(k.startswith("spinner;") and "_spin_for_sampler (tests/test_health.py:" in k for k in counts)
+    assert s.counts(thread="parked") == {}
+
+    # runtime toggle through the debug endpoints
+    client = TestClient(app)
+    key = {"X-Bridge-Key": settings.bridge_key}
+    sampler.configure(hz=50)
+    try:
+        stats = client.post("/debug/sampler", params={"enabled": "true", "hz": 200}, headers=key).json()
+        assert stats["running"] is True and stats["enabled"] is True
+        deadline = time.monotonic() + 5
+        while sampler.stats()["samples"] < 3 and time.monotonic() < deadline:
+            time.sleep(0.02)
+        body = client.get("/debug/flamegraph", params={"format": "json", "window": 60}, headers=key).json()
+        assert body["stats"]["hz"] == 200 and body["stats"]["samples"] >= 3
+        stats = client.post("/debug/sampler", params={"enabled": "false", "reset": "true"}, headers=key).json()
+        assert stats["running"] is False and stats["enabled"] is False and stats["buckets"] == 0
+        assert not sampler.get_sampler()._labels
+        assert client.get("/debug/flamegraph", headers={"X-Bridge-Key": "wrong"}).status_code == 401
+    finally:
+        sampler.configure()
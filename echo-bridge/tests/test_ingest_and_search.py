@@ -44,3 +44,190 @@ def test_ingest_and_search_flow(tmp_path):
     hits = r.json()["hits"]
     assert len(hits) >= 1
     assert any("Freude" in h["snippet"] for h in hits)
+
+
+def test_bulk_ingest_ndjson(tmp_path):
+    import json
+
+    from echo_bridge.db import connection, init_db
+
+    settings.db_path = tmp_path / "bulk.db"
+    init_db(settings.db_path)
+    client = TestClient(app)
+
+    lines = [json.dumps({"source": "chat", "title": "T", "text": f"Nachricht {i} über Freude", "tags": ["chat", "bulk"]}) for i in range(25)]
+    lines.append("{not json")
+    lines.append(json.dumps({"source": "chat", "texts": ["Zweiter Fokus", "Dritter Fokus"]}))
+    body = "\n".join(lines).encode("utf-8")
+    r = client.post(
+        "/ingest/bulk",
+        params={"batch_size": 10, "defer_fts": True},
+        headers={"X-Bridge-Key": settings.bridge_key, "Content-Type": "application/x-ndjson"},
+        content=body,
+    )
+    assert r.status_code == 200
+    out = r.json()
+    assert out["added"] == 27
+    assert out["skipped"] == 1
+    assert out["errors"][0].startswith("line 26")
+
+    with connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM chunk_tags").fetchone()[0] == 50
+    # FTS populated in deferred mode and the insert trigger restored afterwards
+    r = client.get("/search", params={"q": "Fokus", "k": 5})
+    assert len(r.json()["hits"]) == 2
+    with connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE type='trigger' AND name='chunks_ai'").fetchone()[0] == 1
+
+
+def test_bulk_ingest_rejects_overlong_lines(tmp_path, monkeypatch):
+    import json
+
+    from echo_bridge.db import connection, init_db
+
+    settings.db_path = tmp_path / "bulk_long.db"
+    init_db(settings.db_path)
+    monkeypatch.setattr(settings, "ingest_max_line_bytes", 64)
+    client = TestClient(app)
+    headers = {"X-Bridge-Key": settings.bridge_key, "Content-Type": "application/x-ndjson"}
+
+    short = json.dumps({"source": "chat", "text": "kurz"})
+    for body in (f"{short}\n{'x' * 200}\n{short}", f"{short}\n{'x' * 200}"):  # complete and trailing line
+        r = client.post("/ingest/bulk", headers=headers, content=body.encode("utf-8"))
+        assert r.status_code == 413 and r.json()["detail"].startswith("line 2 exceeds 64 bytes; 1 chunks")
+    with connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0] == 2
+
+
+def test_search_bm25_filters_and_cursor(tmp_path):
+    from echo_bridge.db import init_db, write
+
+    settings.db_path = tmp_path / "filters.db"
+    init_db(settings.db_path)
+    client = TestClient(app)
+    headers = {"X-Bridge-Key": settings.bridge_key}
+    client.post("/ingest/text", headers=headers, json={"source": "journal", "texts": ["Fokus Fokus Fokus heute", "Fokus morgen"], "tags": ["a", "b"]})
+    client.post("/ingest/text", headers=headers, json={"source": "chat", "title": "Fokus", "texts": ["ganz andere Worte", "Fokus hier"], "tags": ["a"]})
+    write(lambda conn: conn.execute("UPDATE chunks SET ts='2020-01-01 00:00:00' WHERE doc_source='chat'"))
+
+    r = client.get("/search", params={"q": "Fokus", "k": 10})
+    hits = r.json()["hits"]
+    assert {h["id"] for h in hits} == {1, 2, 3, 4}  # chunk 3 matches on its title only
+    assert [h["score"] for h in hits] == sorted((h["score"] for h in hits), reverse=True)
+    assert hits[0]["score"] > 0
+
+    assert [h["id"] for h in client.get("/search", params={"q": "Fokus", "source": "journal"}).json()["hits"]] == [1, 2]
+    assert {h["id"] for h in client.get("/search", params=[("q", "Fokus"), ("tag", "a"), ("tag", "b")]).json()["hits"]} == {1, 2}
+    assert {h["id"] for h in client.get("/search", params={"q": "Fokus", "until": "2021-01-01"}).json()["hits"]} == {3, 4}
+    assert {h["id"] for h in client.get("/search", params={"q": "Fokus", "since": "2021-01-01T00:00:00Z"}).json()["hits"]} == {1, 2}
+    # epoch seconds like /soul/timeline; malformed bounds are rejected instead of matching nothing
+    assert {h["id"] for h in client.get("/search", params={"q": "Fokus", "since": "1609459200"}).json()["hits"]} == {1, 2}
+    for bad in ({"since": "garbage"}, {"until": "2021-13-01"}):
+        r = client.get("/search", params={"q": "Fokus", **bad})
+        assert r.status_code == 400 and "invalid timestamp" in r.json()["detail"]
+
+    import asyncio
+
+    from echo_bridge.mcp_setup import echo_search_tool, search_tool
+
+    assert "invalid timestamp" in asyncio.run(search_tool.fn("Fokus", until="garbage"))["error"]
+    assert "invalid timestamp" in asyncio.run(echo_search_tool.fn("Fokus", since="garbage"))["error"]
+    assert {r["id"] for r in asyncio.run(search_tool.fn("Fokus", k=10, until=1609459200))["results"]} == {"3", "4"}
+
+    # keyset pagination walks the same ranking without overlap
+    seen: list[int] = []
+    cursor = None
+    while True:
+        params = {"q": "Fokus", "k": 1, **({"cursor": cursor} if cursor else {})}
+        body = client.get("/search", params=params).json()
+        seen += [h["id"] for h in body["hits"]]
+        cursor = body["next_cursor"]
+        if not cursor:
+            break
+    assert seen == [h["id"] for h in hits]
+    assert client.get("/search", params={"q": "Fokus", "cursor": "!!"}).status_code == 400
+
+    page = client.get("/resources", params={"limit": 3, "source": "journal"}).json()
+    assert [i["id"] for i in page["items"]] == [2, 1] and page["next_cursor"] is None
+    page = client.get("/resources", params={"limit": 3}).json()
+    assert [i["id"] for i in page["items"]] == [4, 3, 2]
+    page = client.get("/resources", params={"limit": 3, "cursor": page["next_cursor"]}).json()
+    assert [i["id"] for i in page["items"]] == [1]
+
+
+def test_fts_index_upgraded_with_title_column(tmp_path):
+    import sqlite3
+
+    from echo_bridge.db import init_db
+    from echo_bridge.services.memory_service import search
+
+    path = tmp_path / "old.db"
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        """
+        CREATE TABLE chunks (id INTEGER PRIMARY KEY AUTOINCREMENT, doc_source TEXT NOT NULL, doc_title TEXT,
+            text TEXT NOT NULL, meta_json TEXT, ts DATETIME DEFAULT CURRENT_TIMESTAMP);
+        CREATE VIRTUAL TABLE chunks_fts USING fts5(text, content='chunks', content_rowid='id');
+        INSERT INTO chunks(doc_source, doc_title, text) VALUES ('s', 'Zitronen', 'gelbe Frucht');
+        """
+    )
+    conn.commit()
+    conn.close()
+    init_db(path)
+    assert [h.id for h in search("Zitronen")] == [1]
+    assert [h.id for h in search("Frucht")] == [1]
+
+
+def test_hybrid_search_fuses_lexical_and_vector(tmp_path):
+    from echo_bridge.db import init_db
+
+    settings.db_path = tmp_path / "hybrid.db"
+    init_db(settings.db_path)
+    client = TestClient(app)
+    headers = {"X-Bridge-Key": settings.bridge_key}
+    texts = ["Garten Rosen Tulpen", "Rosen Tulpen Beet Garten", "Auto Motor Reifen", "Garten"]
+    client.post("/ingest/text", headers=headers, json={"source": "notes", "texts": texts})
+
+    r = client.get("/search", params={"q": "Rosen Tulpen", "k": 4, "mode": "hybrid"})
+    assert r.status_code == 200
+    hits = r.json()["hits"]
+    assert [h["id"] for h in hits][:2] == [1, 2]
+    assert all(h["bm25"] is not None and h["cosine"] is not None for h in hits[:2])
+    assert 3 not in [h["id"] for h in hits]
+    assert [h["score"] for h in hits] == sorted((h["score"] for h in hits), reverse=True)
+
+    assert client.get("/search", params={"q": "Rosen", "mode": "hybrid", "source": "other"}).json()["hits"] == []
+    assert client.get("/search", params={"q": "Rosen", "mode": "fuzzy"}).status_code == 422
+    assert client.get("/search", params={"q": "Rosen", "mode": "hybrid", "cursor": "x"}).status_code == 400
+
+
+def test_search_cache_hits_and_write_invalidation(tmp_path):
+    from echo_bridge.db import init_db
+    from echo_bridge.services import search_cache
+    from echo_bridge.services.actions_service import dispatch
+    from echo_bridge.services.memory_service import SearchFilters, add_chunks, search
+
+    init_db(tmp_path / "cache.db")
+    search_cache.configure(max_entries=2, ttl_secs=60)
+    try:
+        add_chunks("s", None, ["Kaffee am Morgen"], None)
+        before = search_cache.stats()
+        assert [h.id for h in search("Kaffee")] == [1]
+        assert [h.id for h in search("Kaffee!")] == [1]  # same sanitized key
+        stats = search_cache.stats()
+        assert stats["hits"] == before["hits"] + 1 and stats["misses"] == before["misses"] + 1
+
+        add_chunks("s", None, ["Kaffee am Abend"], None)
+        assert {h.id for h in search("Kaffee")} == {1, 2}
+
+        assert search("Kaffee", filters=SearchFilters(tags=("bohne",))) == []
+        dispatch("memory.tag", {"chunk_id": 2, "tags": ["bohne"]})
+        assert [h.id for h in search("Kaffee", filters=SearchFilters(tags=("bohne",)))] == [2]
+
+        search("Morgen")
+        search("Abend")
+        assert search_cache.stats()["evictions"] >= 1
+        client = TestClient(app)
+        assert "search_cache" in client.get("/metrics").json()
+    finally:
+        search_cache.configure(max_entries=512, ttl_secs=60)
@@ -0,0 +1,190 @@
+import anyio
+import httpx
+
+from echo_bridge.services import sse_relay
+
+
+def _scope():
+    return {"type": "http", "method": "GET", "path": "/mcp", "headers": []}
+
+
+async def _backend(chunks, pause=0.0):
+    async def body():
+        for c in chunks:
+            if pause:
+                await anyio.sleep(pause)
+            yield c
+
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, content=body()))
+    client = httpx.AsyncClient(transport=transport)
+    return await client.send(client.build_request("GET", "http://backend/mcp"), stream=True)
+
+
+def test_frame_splitter_keeps_events_whole():
+    s = sse_relay.FrameSplitter(max_frame_bytes=64)
+    assert s.feed(b"data: a") == []
+    assert s.feed(b"\n\ndata: b\r\n\r\ndata: ") == [b"data: a\n\n", b"data: b\r\n\r\n"]
+    assert s.feed(b"x" * 100) == [b"data: " + b"x" * 100]  # oversized partial is passed through
+    assert s.flush() is None
+
+
+def test_relay_sends_heartbeats_for_silent_backend_and_whole_frames():
+    sse_relay.configure(heartbeat_secs=0.05)
+    sent: list[dict] = []
+    closed = []
+
+    async def receive():
+        await anyio.sleep_forever()
+
+    async def send(message):
+        sent.append(message)
+
+    async def main():
+        chunks = [b"event: message\ndata: {\"a\"", b": 1}\n\n"]
+        resp = sse_relay.SSERelayResponse(lambda: _backend(chunks, pause=0.2), on_close=closed.append)
+        await resp(_scope(), receive, send)
+
+    try:
+        anyio.run(main)
+    finally:
+        sse_relay.configure()
+    bodies = [m["body"] for m in sent if m["type"] == "http.response.body"]
+    assert sent[0]["type"] == "http.response.start"
+    assert bodies.count(sse_relay.HEARTBEAT) >= 2
+    assert b"event: message\ndata: {\"a\": 1}\n\n" in bodies
+    assert bodies[-1] == b""
+    assert closed[0].outcome == "completed" and closed[0].frames == 1
+
+
+def test_relay_disconnects_slow_client():
+    sse_relay.configure(heartbeat_secs=0, max_buffer_frames=2, slow_client_secs=0.1)
+    closed = []
+
+    async def receive():
+        await anyio.sleep_forever()
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            await anyio.sleep(10)  # client never drains
+
+    async def main():
+        chunks = [b"data: %d\n\n" % i for i in range(20)]
+        resp = sse_relay.SSERelayResponse(lambda: _backend(chunks), on_close=closed.append)
+        with anyio.fail_after(5):
+            await resp(_scope(), receive, send)
+
+    try:
+        anyio.run(main)
+    finally:
+        sse_relay.configure()
+    assert closed[0].outcome == "slow_client"
+    assert sse_relay.stats()["slow_disconnects"] >= 1
+
+
+def _forward(client, body, stream=None):
+    from echo_bridge.services import mcp_forwarder
+
+    sent: list[dict] = []
+
+    async def send(message):
+        sent.append(message)
+
+    async def receive():
+        await anyio.sleep_forever()
+
+    resp = mcp_forwarder.MCPForwardResponse(client, "http://backend/mcp", {"accept": "application/json"}, body, stream)
+    return resp(_scope(), receive, send), sent
+
+
+def test_forwarder_coalesces_identical_tools_list_calls():
+    import json
+
+    from echo_bridge.services import mcp_forwarder
+
+    calls = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        msg = json.loads(request.content)
+        calls.append(msg)
+        await anyio.sleep(0.1)
+        rid = msg["id"]
+        return httpx.Response(200, json={"jsonrpc": "2.0", "id": rid, "result": {"tools": []}})
+
+    async def main():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        runs = [_forward(client, json.dumps({"jsonrpc": "2.0", "id": i, "method": "tools/list"}).encode()) for i in range(5)]
+        runs.append(_forward(client, b'{"jsonrpc":"2.0","id":9,"method":"tools/call","params":{}}'))
+        async with anyio.create_task_group() as tg:
+            for coro, _ in runs:
+                tg.start_soon(lambda c=coro: c)
+        return [sent for _, sent in runs]
+
+    before = mcp_forwarder.stats()["coalesced"]
+    results = anyio.run(main)
+    assert [c["method"] for c in calls] == ["tools/list", "tools/call"]
+    ids = [json.loads(r[1]["body"])["id"] for r in results[:5]]
+    assert sorted(ids) == [0, 1, 2, 3, 4]
+    assert all(dict(r[0]["headers"]).get(b"server-timing") for r in results)
+    assert mcp_forwarder.stats()["coalesced"] - before == 4
+
+
+def test_forwarder_retries_only_before_body_commit():
+    attempts = []
+
+    def refuse(request: httpx.Request) -> httpx.Response:
+        attempts.append(1)
+        raise httpx.ConnectError("refused", request=request)
+
+    def broken(request: httpx.Request) -> httpx.Response:
+        attempts.append(1)
+        raise httpx.ReadError("reset", request=request)
+
+    from echo_bridge.services import mcp_forwarder
+
+    mcp_forwarder.configure(retries=3, backoff_base=0)
+    try:
+        coro, sent = _forward(httpx.AsyncClient(transport=httpx.MockTransport(refuse)), b'{"jsonrpc":"2.0","id":1,"method":"tools/call"}')
+        anyio.run(lambda: coro)
+        assert len(attempts) == 3 and sent[0]["status"] == 502
+
+        # a non-idempotent call that failed after being sent is not replayed
+        attempts.clear()
+        coro, sent = _forward(httpx.AsyncClient(transport=httpx.MockTransport(broken)), b'{"jsonrpc":"2.0","id":1,"method":"tools/call"}')
+        anyio.run(lambda: coro)
+        assert len(attempts) == 1 and sent[0]["status"] == 502
+    finally:
+        mcp_forwarder.configure()
+
+
+def test_post_mcp_relays_backend_status_and_headers(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from echo_bridge.main import app
+    from echo_bridge.services import backend_client
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(202, headers={"Mcp-Session-Id": "s1"}, content=b"")
+
+    monkeypatch.setattr(backend_client, "_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    r = TestClient(app).post("/mcp", content=b'{"jsonrpc":"2.0","method":"notifications/initialized"}')
+    assert r.status_code == 202 and r.headers["mcp-session-id"] == "s1"
+    assert "ttfb;dur=" in r.headers["server-timing"]
+
+
+def test_post_mcp_in_process_mode(tmp_path, monkeypatch):
+    import json
+
+    from fastapi.testclient import TestClient
+
+    from echo_bridge.main import app, settings
+
+    monkeypatch.setattr(settings, "db_path", tmp_path / "bridge.db")
+    monkeypatch.setattr(settings, "workspace_dir", tmp_path / "ws")
+    monkeypatch.setenv("MCP_MODE", "inprocess")
+    headers = {"Accept": "application/json, text/event-stream", "Content-Type": "application/json"}
+    with TestClient(app) as client:
+        r = client.post("/mcp", headers=headers, content=json.dumps({"jsonrpc": "2.0", "id": 7, "method": "tools/list"}))
+        assert r.status_code == 200
+        assert r.headers["access-control-allow-origin"] == "*" and "ttfb;dur=" in r.headers["server-timing"]
+        payload = json.loads(next(line[5:] for line in r.text.splitlines() if line.startswith("data:"))) if "event-stream" in r.headers["content-type"] else r.json()
+        assert payload["id"] == 7 and any(t["name"] == "search" for t in payload["result"]["tools"])
@@ -9,6 +9,7 @@ from echo_bridge.mcp_fastmcp import mcp
 from echo_bridge.main import settings
 from echo_bridge.db import init_db
 from echo_bridge.services.memory_service import add_chunks
+from echo_bridge.telemetry import MCP_TOOL_SECONDS
 
 
 async def _run_async_test() -> None:
@@ -16,6 +17,8 @@ async def _run_async_test() -> None:
     init_db(settings.db_path)
     add_chunks("test", "hello", ["FastMCP test record"], None)
 
+    before = MCP_TOOL_SECONDS.snapshot().get(("memory_search", "ok"), ([0], 0.0))[0][-1]
+
     # Connect to the in-memory MCP server instance
     async with Client(mcp) as client:
         tools = await client.list_tools()
@@ -27,6 +30,8 @@ async def _run_async_test() -> None:
         # into message content; we assert we received some content back
         assert result.content, "Empty MCP response"
 
+    assert MCP_TOOL_SECONDS.snapshot()[("memory_search", "ok")][0][-1] == before + 1
+
 
 def test_mcp_memory_search_smoke() -> None:
     asyncio.run(_run_async_test())
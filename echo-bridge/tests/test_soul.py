@@ -1,7 +1,7 @@
 from fastapi.testclient import TestClient
 
 from echo_bridge.main import app, settings
-from echo_bridge.db import init_db, get_conn
+from echo_bridge.db import connection, init_db
 from echo_bridge.soul.state import get_soul
 
 
@@ -66,11 +66,102 @@ def test_soul_endpoints_and_policies(tmp_path):
     assert r.json()["ok"] is True
 
     # Verify an audit row exists and soul_mood column is present
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT action, soul_mood FROM audits ORDER BY id DESC LIMIT 1")
-    row = cur.fetchone()
+    with connection() as conn:
+        row = conn.execute("SELECT action, soul_mood FROM audits ORDER BY id DESC LIMIT 1").fetchone()
     assert row is not None
     assert "actions.run:memory.add" in str(row["action"]) or "memory.add" in str(row["action"])  # loose check
     # soul_mood may be empty string if not initialized, but column should exist
     assert "soul_mood" in row.keys()
+
+
+def test_timeline_writer_buffers_rotates_and_tails(tmp_path):
+    import gzip
+    import json
+    import time
+
+    from echo_bridge.soul.state import Soul, SoulConfig
+
+    path = tmp_path / "timeline.jsonl"
+    soul = Soul(
+        SoulConfig(),
+        identity_md="",
+        rituals=[],
+        timeline_path=path,
+        timeline_options={"flush_every": 1000, "flush_secs": 0, "max_bytes": 2000, "keep": 2, "tail_size": 5},
+    )
+    for i in range(10):
+        soul.append_event("test", {"i": i}, {}, consent_checked=True)
+    # buffered: nothing reaches disk before a flush
+    assert not path.exists() or path.stat().st_size == 0
+    assert [e["payload"]["i"] for e in soul.recent_events(3)] == [7, 8, 9]
+    assert len(soul.recent_events(100)) == 5
+
+    for i in range(10, 200):
+        soul.append_event("test", {"i": i, "pad": "x" * 40}, {}, consent_checked=True)
+    soul.close()
+    timeline = soul._timeline
+    deadline = time.time() + 5
+    while any(not p.name.endswith(".gz") for p in timeline.segments()) and time.time() < deadline:
+        time.sleep(0.05)
+    segments = timeline.segments()
+    assert 1 <= len(segments) <= 2 and all(p.name.endswith(".gz") for p in segments)
+    rotated = [json.loads(line) for line in gzip.open(segments[-1], "rt", encoding="utf-8")]
+    current = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert rotated[-1]["payload"]["i"] + 1 == current[0]["payload"]["i"]
+    assert current[-1]["payload"]["i"] == 199
+
+
+def test_timeline_index_queries_and_mood_restore(tmp_path):
+    from echo_bridge.soul.state import Soul, SoulConfig
+    from echo_bridge.soul.timeline import parse_time
+
+    path = tmp_path / "timeline.jsonl"
+    opts = {"flush_secs": 0, "max_bytes": 4000, "keep": 10, "compress": False}
+    soul = Soul(SoulConfig(), identity_md="", rituals=[], timeline_path=path, timeline_options=opts)
+    soul.set_mood("curious", reason="test")
+    for i in range(60):
+        soul.append_event("actions.run:memory.add" if i % 3 == 0 else "actions.run:lesson.plan", {"i": i}, {}, True)
+    soul.set_mood("focused")
+    assert soul._timeline.segments(), "expected at least one rotation"
+
+    latest = soul.timeline(limit=5)
+    assert [e.get("payload", {}).get("i") for e in latest[:-1]] == [56, 57, 58, 59]
+    assert latest[-1]["kind"] == "mood_change"
+
+    adds = soul.timeline(action="actions.run:memory.add", limit=100)
+    assert [e["payload"]["i"] for e in adds] == list(range(0, 60, 3))  # spans rotated segments
+
+    events = soul.timeline(limit=1000)
+    pivot = parse_time(events[30]["ts"])
+    forward = soul.timeline(since=pivot, limit=3)
+    assert forward[0]["ts"] >= events[30]["ts"] and len(forward) == 3
+    assert all(parse_time(e["ts"]) < pivot for e in soul.timeline(until=pivot, limit=1000))
+    soul.close()
+
+    # restart: last mood comes from the index; a deleted index is rebuilt from the file
+    again = Soul(SoulConfig(), identity_md="", rituals=[], timeline_path=path, timeline_options=opts)
+    assert again.get_mood() == "focused"
+    again.close()
+    path.with_suffix(".idx").unlink()
+    rebuilt = Soul(SoulConfig(), identity_md="", rituals=[], timeline_path=path, timeline_options=opts)
+    assert rebuilt.get_mood() == "focused"
+    assert rebuilt.timeline(limit=1)[0]["kind"] == "mood_change"
+    rebuilt.close()
+
+
+def test_soul_timeline_endpoint(tmp_path):
+    from echo_bridge.soul.state import Soul, SoulConfig, init_soul
+
+    soul = Soul(SoulConfig(), identity_md="", rituals=[], timeline_path=tmp_path / "t.jsonl", timeline_options={"flush_secs": 0})
+    init_soul(soul)
+    try:
+        soul.append_event("actions.run:memory.add", {}, {}, True)
+        soul.append_event("actions.run:game.new", {}, {}, True)
+        client = TestClient(app)
+        body = client.get("/soul/timeline", params={"action": "actions.run:game.new"}).json()
+        assert body["count"] == 1 and body["events"][0]["action"] == "actions.run:game.new"
+        assert client.get("/soul/timeline", params={"since": "not-a-date"}).status_code == 400
+        assert client.get("/soul/timeline", params={"since": "2000-01-01T00:00:00Z", "limit": 1}).json()["count"] == 1
+    finally:
+        soul.close()
+        init_soul(None)  # type: ignore[arg-type]
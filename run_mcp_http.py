@@ -1,7 +1,8 @@
 import asyncio
 import os
 import sys
-from typing import Tuple
+import time
+from typing import Any, Tuple
 
 # Ensure echo_bridge package (inside echo-bridge folder) is importable when run from repo root
 repo_root = os.path.dirname(__file__)
@@ -12,7 +13,7 @@ if echo_bridge_dir not in sys.path:
 from echo_bridge.mcp_setup import mcp
 # Ensure the main app module is imported so DB initialization (init_db) runs
 # when the MCP server is started standalone. This sets the internal _DB_PATH
-# used by memory_service.get_conn().
+# used by echo_bridge.db.
 try:
     # Importing has side-effects: load settings and call init_db(path)
     import echo_bridge.main  # type: ignore
@@ -43,6 +44,150 @@ def parse_host_port(argv: list[str]) -> Tuple[str, int]:
     return host, port
 
 
+# Public-port proxy tuning
+HOP_BY_HOP = {"connection", "keep-alive", "proxy-authenticate", "proxy-authorization", "te", "trailer", "transfer-encoding", "upgrade", "host"}
+MIN_CHUNK = 4 * 1024
+MAX_CHUNK = 256 * 1024
+HEALTH_TTL = float(os.environ.get("MCP_PROXY_HEALTH_TTL", "5"))
+
+
+class AdaptiveChunker:
+    """Pick the next read size from how full the previous read was.
+
+    A read that fills the buffer means the backend is ahead of us (bulk
+    transfer), so the size doubles up to MAX_CHUNK; a mostly empty read means
+    we are streaming small messages and it halves back toward MIN_CHUNK.
+    Reads never wait for the buffer to fill, so small SSE events are not delayed.
+    """
+
+    def __init__(self) -> None:
+        self.size = MIN_CHUNK
+
+    def update(self, got: int) -> None:
+        if got >= self.size:
+            self.size = min(self.size * 2, MAX_CHUNK)
+        elif got < self.size // 4:
+            self.size = max(self.size // 2, MIN_CHUNK)
+
+
+def _forward_headers(headers: Any) -> dict[str, str]:
+    return {k: v for k, v in headers.items() if k.lower() not in HOP_BY_HOP}
+
+
+def build_proxy_app(backend_port: int) -> Any:
+    """aiohttp application proxying every path to the FastMCP backend.
+
+    One ClientSession (and its keep-alive connection pool) lives for the whole
+    app; request bodies are streamed to the backend and responses streamed back.
+    """
+    import aiohttp
+    from aiohttp import web
+
+    backend = f"http://127.0.0.1:{backend_port}"
+    state: dict[str, Any] = {"health": None, "health_at": 0.0}
+    health_lock = asyncio.Lock()
+
+    async def session_ctx(app: web.Application):
+        connector = aiohttp.TCPConnector(limit=100, keepalive_timeout=30)
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=5)
+        # auto_decompress off: bytes and Content-Encoding pass through untouched
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout, auto_decompress=False) as session:
+            app["session"] = session
+            yield
+
+    async def relay(request: web.Request, resp: aiohttp.ClientResponse) -> web.StreamResponse:
+        headers = {k: v for k, v in _forward_headers(resp.headers).items() if k.lower() != "content-length"}
+        sr = web.StreamResponse(status=resp.status, headers=headers)
+        await sr.prepare(request)
+        chunker = AdaptiveChunker()
+        while True:
+            chunk = await resp.content.read(chunker.size)
+            if not chunk:
+                break
+            chunker.update(len(chunk))
+            await sr.write(chunk)
+        await sr.write_eof()
+        return sr
+
+    async def proxy_handler(request: web.Request) -> web.StreamResponse:
+        session: aiohttp.ClientSession = request.app["session"]
+        target_url = f"{backend}{request.rel_url}"
+        headers = _forward_headers(request.headers)
+        if request.method == "GET":
+            async with session.get(target_url, headers=headers) as resp:
+                backend_ct = resp.headers.get("Content-Type", "") or ""
+                # If backend already speaks SSE, stream it through
+                if "text/event-stream" in backend_ct:
+                    return await relay(request, resp)
+            # Backend did not return SSE (likely HTML/ngrok landing). Return a small synthetic SSE handshake
+            sr = web.StreamResponse(status=200, headers={"Content-Type": "text/event-stream"})
+            await sr.prepare(request)
+            # Send a single no-op event so clients see the SSE content-type and can proceed
+            await sr.write(b"event: message\ndata: {}\n\n")
+            # keep connection open briefly to behave like an SSE endpoint, then close cleanly
+            try:
+                await asyncio.sleep(0.25)
+            except asyncio.CancelledError:
+                pass
+            await sr.write_eof()
+            return sr
+        # Stream the upload instead of buffering it with request.read()
+        data = request.content.iter_any() if request.body_exists else None
+        async with session.request(request.method, target_url, data=data, headers=headers) as resp:
+            return await relay(request, resp)
+
+    async def probe_backend(session: aiohttp.ClientSession) -> tuple[dict[str, Any], int]:
+        timeout = aiohttp.ClientTimeout(total=5)
+        # First, check whether backend /mcp responds with SSE
+        try:
+            async with session.get(f"{backend}/mcp", headers={"Accept": "text/event-stream"}, timeout=timeout) as resp:
+                ct = resp.headers.get("Content-Type", "") or ""
+                if resp.status == 200 and "text/event-stream" in ct:
+                    try:
+                        snippet = (await resp.content.read(512)).decode("utf-8", errors="replace")
+                    except Exception:
+                        snippet = ""
+                    return {"ok": True, "sse": True, "snippet": snippet}, 200
+        except Exception:
+            pass
+        # Fallback: try to fetch OpenAPI JSON to enumerate paths/tools
+        try:
+            async with session.get(f"{backend}/openapi.json", timeout=timeout) as resp2:
+                if resp2.status == 200:
+                    j = await resp2.json(content_type=None)
+                    return {"ok": True, "sse": False, "paths": sorted(j.get("paths", {}).keys())}, 200
+        except Exception:
+            pass
+        return {"ok": False, "error": "backend unreachable or no usable endpoint found"}, 502
+
+    async def health_handler(request: web.Request) -> web.Response:
+        """Health: probe backend /mcp for SSE; if available return ok and a short snippet.
+
+        This is designed to match ChatGPT activation probes which perform a
+        GET with Accept: text/event-stream. If the backend doesn't speak SSE
+        at /mcp, we try /openapi.json as a fallback to list paths/tools. The
+        probe result is cached for HEALTH_TTL seconds and concurrent hits
+        share one probe.
+        """
+        try:
+            async with health_lock:
+                if state["health"] is None or time.monotonic() - state["health_at"] > HEALTH_TTL:
+                    state["health"] = await probe_backend(request.app["session"])
+                    state["health_at"] = time.monotonic()
+            body, status = state["health"]
+            age = round(time.monotonic() - state["health_at"], 2)
+            return web.json_response({**body, "cached_age_s": age}, status=status)
+        except Exception as e:
+            return web.json_response({"ok": False, "error": str(e)}, status=500)
+
+    app = web.Application()
+    app.cleanup_ctx.append(session_ctx)
+    app.router.add_get('/health', health_handler)
+    # catch-all route so /mcp and related paths are proxied
+    app.router.add_route('*', '/{tail:.*}', proxy_handler)
+    return app
+
+
 if __name__ == "__main__":
     host, port = parse_host_port(sys.argv[1:])
     # To ensure external probes (GET with Accept: text/event-stream) see
@@ -51,7 +196,6 @@ if __name__ == "__main__":
     # which streams responses back to the client. This avoids cases where
     # tunnels or probes receive HTML (ngrok landing) and makes activation
     # more reliable for ChatGPT Developer Tools.
-    import aiohttp
     from aiohttp import web
 
     backend_port = port + 1
@@ -66,98 +210,8 @@ if __name__ == "__main__":
             log_level="info",
         )
 
-    async def proxy_handler(request: web.Request) -> web.StreamResponse:
-        # Build target URL on backend
-        target_url = f"http://127.0.0.1:{backend_port}{request.rel_url}"
-        # Copy headers but let the client control Accept
-        headers = {k: v for k, v in request.headers.items()}
-
-        session_timeout = aiohttp.ClientTimeout(total=None)
-        async with aiohttp.ClientSession(timeout=session_timeout) as session:
-            if request.method == "GET":
-                # Try backend GET first
-                async with session.get(target_url, headers=headers) as resp:
-                    backend_ct = resp.headers.get("Content-Type", "") or ""
-                    # If backend already speaks SSE, stream it through
-                    if "text/event-stream" in backend_ct:
-                        sr = web.StreamResponse(status=resp.status, headers={"Content-Type": backend_ct})
-                        await sr.prepare(request)
-                        async for chunk in resp.content.iter_chunked(1024):
-                            await sr.write(chunk)
-                        await sr.write_eof()
-                        return sr
-                    # Backend did not return SSE (likely HTML/ngrok landing). Return a small synthetic SSE handshake
-                    sr = web.StreamResponse(status=200, headers={"Content-Type": "text/event-stream"})
-                    await sr.prepare(request)
-                    # Send a single no-op event so clients see the SSE content-type and can proceed
-                    await sr.write(b"event: message\n")
-                    await sr.write(b"data: {}\n\n")
-                    # keep connection open briefly to behave like an SSE endpoint, then close cleanly
-                    try:
-                        await asyncio.sleep(0.25)
-                    except asyncio.CancelledError:
-                        pass
-                    await sr.write_eof()
-                    return sr
-            else:
-                body = await request.read()
-                async with session.request(request.method, target_url, data=body, headers=headers) as resp:
-                    sr = web.StreamResponse(status=resp.status, headers={"Content-Type": resp.headers.get("Content-Type", "application/octet-stream")})
-                    await sr.prepare(request)
-                    async for chunk in resp.content.iter_chunked(1024):
-                        await sr.write(chunk)
-                    await sr.write_eof()
-                    return sr
-
     async def start_proxy():
-        app = web.Application()
-        # Health endpoint to inspect backend's OpenAPI and list registered paths/tools
-        async def health_handler(request: web.Request):
-            """Health: probe backend /mcp for SSE; if available return ok and a short snippet.
-
-            This is designed to match ChatGPT activation probes which perform a
-            GET with Accept: text/event-stream. If the backend doesn't speak SSE
-            at /mcp, we try /openapi.json as a fallback to list paths/tools.
-            """
-            backend_mcp = f"http://127.0.0.1:{backend_port}/mcp"
-            backend_openapi = f"http://127.0.0.1:{backend_port}/openapi.json"
-            timeout = aiohttp.ClientTimeout(total=5)
-            try:
-                async with aiohttp.ClientSession(timeout=timeout) as session:
-                    # First, check whether backend /mcp responds with SSE
-                    try:
-                        async with session.get(backend_mcp, headers={"Accept": "text/event-stream"}) as resp:
-                            ct = resp.headers.get("Content-Type", "") or ""
-                            if resp.status == 200 and "text/event-stream" in ct:
-                                # read a small chunk to include as snippet
-                                try:
-                                    chunk = await resp.content.read(512)
-                                    snippet = chunk.decode("utf-8", errors="replace")
-                                except Exception:
-                                    snippet = ""
-                                return web.json_response({"ok": True, "sse": True, "snippet": snippet})
-                    except Exception:
-                        # ignore and fall back to openapi
-                        pass
-
-                    # Fallback: try to fetch OpenAPI JSON to enumerate paths/tools
-                    try:
-                        async with session.get(backend_openapi) as resp2:
-                            if resp2.status == 200:
-                                j = await resp2.json()
-                                paths = sorted(list(j.get("paths", {}).keys()))
-                                return web.json_response({"ok": True, "sse": False, "paths": paths})
-                    except Exception:
-                        pass
-
-                return web.json_response({"ok": False, "error": "backend unreachable or no usable endpoint found"}, status=502)
-            except Exception as e:
-                return web.json_response({"ok": False, "error": str(e)}, status=500)
-
-        app.router.add_get('/health', health_handler)
-        # catch-all route so /mcp and related paths are proxied
-        app.router.add_route('*', '/{tail:.*}', proxy_handler)
-        runner = web.AppRunner(app)
+        runner = web.AppRunner(build_proxy_app(backend_port))
         await runner.setup()
         site = web.TCPSite(runner, host, port)
         await site.start()
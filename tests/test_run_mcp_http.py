@@ -0,0 +1,137 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+aiohttp = pytest.importorskip("aiohttp")
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+# Make sure the repository root is on sys.path so `run_mcp_http` can be imported
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import run_mcp_http as proxy
+
+BIG = bytes(range(256)) * 4096  # 1 MiB
+
+
+def _backend(calls: dict) -> web.Application:
+    """Stub FastMCP backend recording what the proxy sent it."""
+
+    async def mcp_post(request: web.Request) -> web.Response:
+        calls["post_content_length"] = request.headers.get("Content-Length")
+        received = 0
+        async for chunk in request.content.iter_any():
+            received += len(chunk)
+        calls["post_received"] = received
+        return web.Response(body=BIG, content_type="application/octet-stream", headers={"X-Received": str(received)})
+
+    async def mcp_get(request: web.Request) -> web.StreamResponse:
+        calls["get"] = calls.get("get", 0) + 1
+        sr = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await sr.prepare(request)
+        await sr.write(b"event: message\ndata: {\"n\": 1}\n\n")
+        await asyncio.sleep(0.05)
+        await sr.write(b"event: message\ndata: {\"n\": 2}\n\n")
+        await sr.write_eof()
+        return sr
+
+    async def landing(request: web.Request) -> web.Response:
+        return web.Response(text="<html>tunnel landing page</html>", content_type="text/html")
+
+    app = web.Application()
+    app.router.add_post("/mcp", mcp_post)
+    app.router.add_get("/mcp", mcp_get)
+    app.router.add_get("/landing", landing)
+    return app
+
+
+async def _with_proxy(test, calls: dict) -> None:
+    async with TestServer(_backend(calls)) as backend:
+        async with TestClient(TestServer(proxy.build_proxy_app(backend.port))) as client:
+            await test(client)
+
+
+def test_adaptive_chunker_grows_on_full_reads_and_shrinks_on_small_ones():
+    c = proxy.AdaptiveChunker()
+    assert c.size == proxy.MIN_CHUNK
+    for _ in range(20):
+        c.update(c.size)
+    assert c.size == proxy.MAX_CHUNK
+    c.update(proxy.MAX_CHUNK // 2)  # between a quarter and full: unchanged
+    assert c.size == proxy.MAX_CHUNK
+    c.update(10)
+    assert c.size == proxy.MAX_CHUNK // 2
+    for _ in range(20):
+        c.update(10)
+    assert c.size == proxy.MIN_CHUNK
+
+
+def test_post_body_is_streamed_both_ways():
+    calls: dict = {}
+
+    async def upload():
+        for _ in range(16):
+            yield b"x" * 65536
+            await asyncio.sleep(0)
+
+    async def test(client: TestClient) -> None:
+        resp = await client.post("/mcp", data=upload(), headers={"Content-Type": "application/json"})
+        assert resp.status == 200
+        assert resp.headers["X-Received"] == str(16 * 65536)
+        assert await resp.read() == BIG
+
+    asyncio.run(_with_proxy(test, calls))
+    # forwarded chunked instead of being buffered into one Content-Length body
+    assert calls["post_content_length"] is None
+    assert calls["post_received"] == 16 * 65536
+
+
+def test_sse_is_passed_through_and_non_sse_gets_a_handshake():
+    calls: dict = {}
+
+    async def test(client: TestClient) -> None:
+        resp = await client.get("/mcp", headers={"Accept": "text/event-stream"})
+        assert resp.status == 200 and resp.headers["Content-Type"].startswith("text/event-stream")
+        assert await resp.read() == b"event: message\ndata: {\"n\": 1}\n\nevent: message\ndata: {\"n\": 2}\n\n"
+
+        resp = await client.get("/landing")
+        assert resp.headers["Content-Type"].startswith("text/event-stream")
+        assert await resp.read() == b"event: message\ndata: {}\n\n"
+
+    asyncio.run(_with_proxy(test, calls))
+
+
+def test_health_probe_is_cached_for_the_ttl(monkeypatch):
+    calls: dict = {}
+
+    async def test(client: TestClient) -> None:
+        monkeypatch.setattr(proxy, "HEALTH_TTL", 60.0)
+        bodies = await asyncio.gather(*(client.get("/health") for _ in range(5)))
+        for resp in bodies:
+            body = await resp.json()
+            assert resp.status == 200 and body["ok"] is True and body["sse"] is True
+            assert body["snippet"].startswith("event: message")
+        assert calls["get"] == 1  # concurrent hits share one probe
+
+        monkeypatch.setattr(proxy, "HEALTH_TTL", 0.0)
+        await asyncio.sleep(0.01)
+        await client.get("/health")
+        assert calls["get"] == 2
+
+    asyncio.run(_with_proxy(test, calls))
+
+
+def test_health_reports_unreachable_backend():
+    async def test() -> None:
+        async with TestServer(web.Application()) as dead:
+            port = dead.port
+        # backend server closed: nothing listens on the port any more
+        async with TestClient(TestServer(proxy.build_proxy_app(port))) as client:
+            resp = await client.get("/health")
+            assert resp.status == 502 and (await resp.json())["ok"] is False
+
+    asyncio.run(test())